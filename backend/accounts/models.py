@@ -17,6 +17,8 @@ class User(AbstractUser):
     user_type = models.CharField(max_length=20, choices=USER_TYPE_CHOICES, default='student')
     email = models.EmailField(_('email address'), unique=True)
     profile_picture = models.ImageField(upload_to='profile_pictures/', null=True, blank=True)
+    # Resized variants of profile_picture, see courses/images.py
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     bio = models.TextField(max_length=500, blank=True)
     learning_preferences = models.JSONField(default=dict, blank=True)
     notification_settings = models.JSONField(default=dict, blank=True)
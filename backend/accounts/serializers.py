@@ -1,13 +1,19 @@
 from rest_framework import serializers
+from courses.images import srcset
 from .models import User
 
 class UserSerializer(serializers.ModelSerializer):
+    profile_picture_srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = User
         fields = [
             'id', 'username', 'email', 'first_name', 'last_name', 
-            'user_type', 'profile_picture', 'bio', 'date_of_birth', 
+            'user_type', 'profile_picture', 'profile_picture_srcset', 'bio', 'date_of_birth', 
             'phone_number', 'address', 'points', 'badges',
             'learning_preferences', 'preferred_language', 'timezone'
         ]
-        read_only_fields = ['id', 'username', 'email', 'user_type', 'points', 'badges'] 
\ No newline at end of file
+        read_only_fields = ['id', 'username', 'email', 'user_type', 'points', 'badges']
+
+    def get_profile_picture_srcset(self, obj):
+        return srcset(obj, 'profile_picture', self.context.get('request'))
@@ -0,0 +1,166 @@
+"""
+Recompute the analytics tables of one course from enrollments and progress.
+
+Enrollment and progress changes queue refresh_course_analytics on the
+job queue, at low priority and a little delayed, so that a burst of
+changes to one course coalesces into a single run. Each run is a handful
+of grouped queries followed by one upsert per table, whatever the number
+of students.
+
+Enrollment signals schedule the refresh themselves. Progress rows carry
+no course, so the views that record progress call schedule_refresh with
+the course they already have, instead of a signal looking it up on
+every save.
+"""
+from datetime import timedelta
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Avg, Count, Q, Sum
+from django.utils import timezone
+
+REFRESH_DELAY = 60
+
+# Days without activity before an unfinished student counts as at risk
+MEDIUM_RISK_DAYS = 7
+HIGH_RISK_DAYS = 14
+
+
+def schedule_refresh(course_id):
+    from courses import jobs
+
+    if course_id is None:
+        return None
+    return jobs.enqueue(
+        refresh_course_analytics,
+        priority=jobs.PRIORITY_LOW,
+        delay=REFRESH_DELAY,
+        key=f'analytics:course:{course_id}',
+        course_id=course_id,
+    )
+
+
+def _percentage(part, whole):
+    return round(part * 100.0 / whole, 2) if whole else 0.0
+
+
+def risk_level(completion, last_accessed, now):
+    if completion >= 100:
+        return 'low'
+    idle = now - last_accessed
+    if idle >= timedelta(days=HIGH_RISK_DAYS):
+        return 'high'
+    if idle >= timedelta(days=MEDIUM_RISK_DAYS):
+        return 'medium'
+    return 'low'
+
+
+def refresh_course_analytics(course_id):
+    """Background job: rebuild the course's analytics rows. Returns the number of students covered."""
+    from .models import ContentAnalytics, CourseAnalytics, StudentAnalytics
+
+    Course = apps.get_model('courses', 'Course')
+    Lesson = apps.get_model('courses', 'Lesson')
+    Enrollment = apps.get_model('enrollments', 'Enrollment')
+    Progress = apps.get_model('enrollments', 'Progress')
+
+    if not Course.objects.filter(pk=course_id).exists():
+        return 0
+
+    now = timezone.now()
+    lesson_ids = list(Lesson.objects.filter(section__module__course_id=course_id).values_list('id', flat=True))
+    enrollments = list(
+        Enrollment.objects.filter(course_id=course_id).values('id', 'user_id', 'status', 'last_accessed')
+    )
+    progress = Progress.objects.filter(enrollment__course_id=course_id)
+
+    per_enrollment = {
+        row['enrollment_id']: row for row in progress.values('enrollment_id').annotate(
+            opened=Count('id'),
+            completed=Count('id', filter=Q(completed=True)),
+            time=Sum('time_spent'),
+        )
+    }
+    scores = {}
+    for enrollment_id, lesson_id, score in progress.filter(score__isnull=False).values_list(
+        'enrollment_id', 'lesson_id', 'score'
+    ):
+        scores.setdefault(enrollment_id, {})[str(lesson_id)] = score
+
+    students = []
+    for enrollment in enrollments:
+        row = per_enrollment.get(enrollment['id'], {})
+        completion = _percentage(row.get('completed', 0), len(lesson_ids))
+        students.append(StudentAnalytics(
+            student_id=enrollment['user_id'],
+            course_id=course_id,
+            time_spent=row.get('time') or 0,
+            completion_percentage=completion,
+            quiz_scores=scores.get(enrollment['id'], {}),
+            engagement_score=_percentage(row.get('opened', 0), len(lesson_ids)),
+            risk_level=risk_level(completion, enrollment['last_accessed'], now),
+        ))
+
+    per_lesson = {
+        row['lesson_id']: row for row in progress.values('lesson_id').annotate(
+            views=Count('id'),
+            completed=Count('id', filter=Q(completed=True)),
+            time=Avg('time_spent'),
+        )
+    }
+    lessons = [
+        ContentAnalytics(
+            lesson_id=lesson_id,
+            views=per_lesson.get(lesson_id, {}).get('views', 0),
+            completion_rate=_percentage(per_lesson.get(lesson_id, {}).get('completed', 0), len(enrollments)),
+            average_time_spent=round(per_lesson.get(lesson_id, {}).get('time') or 0),
+        )
+        for lesson_id in lesson_ids
+    ]
+
+    total = len(enrollments)
+    course = CourseAnalytics(
+        course_id=course_id,
+        total_enrollments=total,
+        active_students=sum(1 for enrollment in enrollments if enrollment['status'] == 'active'),
+        completion_rate=_percentage(
+            sum(1 for enrollment in enrollments if enrollment['status'] == 'completed'), total
+        ),
+        average_grade=round(progress.aggregate(grade=Avg('score'))['grade'] or 0, 2),
+        average_time_spent=round(sum(student.time_spent for student in students) / total) if total else 0,
+        student_engagement_score=round(
+            sum(student.engagement_score for student in students) / total, 2
+        ) if total else 0.0,
+    )
+
+    with transaction.atomic():
+        CourseAnalytics.objects.bulk_create(
+            [course],
+            update_conflicts=True,
+            unique_fields=['course'],
+            update_fields=[
+                'total_enrollments', 'active_students', 'completion_rate', 'average_grade',
+                'average_time_spent', 'student_engagement_score', 'last_updated',
+            ],
+        )
+        StudentAnalytics.objects.filter(course_id=course_id).exclude(
+            student_id__in=[enrollment['user_id'] for enrollment in enrollments]
+        ).delete()
+        StudentAnalytics.objects.bulk_create(
+            students,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['student', 'course'],
+            update_fields=[
+                'time_spent', 'completion_percentage', 'quiz_scores',
+                'engagement_score', 'risk_level', 'last_updated',
+            ],
+        )
+        ContentAnalytics.objects.bulk_create(
+            lessons,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['lesson'],
+            update_fields=['views', 'completion_rate', 'average_time_spent', 'last_updated'],
+        )
+    return total
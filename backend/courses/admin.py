@@ -23,6 +23,9 @@ class ModuleAdmin(admin.ModelAdmin):
     list_filter = ['course']
     search_fields = ['title', 'description']
     ordering = ['course', 'order']
+    # The blob itself is never shown; a select of blobs would load every PDF
+    exclude = ['pdf_blob']
+    readonly_fields = ['has_pdf', 'pdf_size', 'pdf_checksum']
 
 class SectionInline(admin.TabularInline):
     model = Section
@@ -0,0 +1,175 @@
+"""
+Copying whole courses, e.g. to start a new term.
+
+clone_courses() copies each course with its modules, sections, lessons,
+quizzes, assignments and files, plus its tags and course and section
+prerequisites. Each level is one read and one bulk_create, however big
+the courses are. New primary keys come back from the insert, and the
+next level's foreign keys are remapped in memory.
+
+Files are shared, not copied. Each copy adds one reference to a
+content-addressed PDF or section file. Thumbnails, covers and their
+resized variants point at the same files; images.py leaves variants
+alone while another row still uses their original. The one exception is
+module PDFs kept in the database: each module owns its blob row, so
+blobs are copied. Each copy is an INSERT ... SELECT inside the database,
+so the bytes never pass through Python.
+
+Bulk inserts skip save() and signals. The clones' stats, seat counters,
+search index entries and suggestion cache are therefore brought up to
+date here.
+"""
+from django.db import connection, transaction
+from django.db.models import FileField
+from django.utils import timezone
+
+from . import contentstore
+
+
+def _values(instance, exclude=()):
+    """Field values of `instance` for building a copy, with files by name"""
+    values = {}
+    for field in instance._meta.concrete_fields:
+        if field.primary_key or field.name in exclude:
+            continue
+        value = getattr(instance, field.attname)
+        values[field.attname] = value.name if isinstance(field, FileField) else value
+    return values
+
+
+def _copies(rows, **remap):
+    """
+    Unsaved copies of `rows`, keyed by the original's pk. Each keyword maps
+    a foreign key attname to a {old id: new id} dict; ids missing from the
+    dict are kept.
+    """
+    copies = {}
+    now = timezone.now()
+    for row in rows:
+        values = _values(row)
+        for attname, mapping in remap.items():
+            values[attname] = mapping.get(values[attname], values[attname])
+        if 'created_at' in values:
+            values['created_at'] = now
+        copies[row.pk] = type(row)(**values)
+    return copies
+
+
+def _insert(model, copies):
+    """Insert `copies` ({old pk: instance}) and return {old pk: new pk}"""
+    instances = list(copies.values())
+    if connection.features.can_return_rows_from_bulk_insert:
+        model.objects.bulk_create(instances)
+    else:
+        # Without RETURNING the new keys are unknown after a bulk insert
+        for instance in instances:
+            instance.save_base(raw=True, force_insert=True)
+    return {old: instance.pk for old, instance in copies.items()}
+
+
+def _copy_blobs(model, pks):
+    """Copy the blob rows `pks` of `model` with one INSERT ... SELECT each; returns {old pk: new pk}"""
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    data = quote(model._meta.get_field('data').column)
+    created_at = quote(model._meta.get_field('created_at').column)
+    pk = quote(model._meta.pk.column)
+    returning = f' RETURNING {pk}' if connection.features.can_return_columns_from_insert else ''
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+
+    mapping = {}
+    with connection.cursor() as cursor:
+        for old in pks:
+            cursor.execute(
+                f'INSERT INTO {table} ({data}, {created_at}) '
+                f'SELECT {data}, %s FROM {table} WHERE {pk} = %s{returning}',
+                [now, old],
+            )
+            mapping[old] = cursor.fetchone()[0] if returning else cursor.lastrowid
+    return mapping
+
+
+def _copy_through(through, source_field, target_field, mapping, target_mapping=None):
+    """Copy the M2M rows of the originals in `mapping` onto their copies"""
+    target_mapping = target_mapping or {}
+    rows = through.objects.filter(**{f'{source_field}__in': list(mapping)}).values_list(
+        source_field, target_field
+    )
+    through.objects.bulk_create([
+        through(**{
+            source_field: mapping[source_id],
+            target_field: target_mapping.get(target_id, target_id),
+        })
+        for source_id, target_id in rows
+    ])
+
+
+def clone_courses(course_ids, instructor=None, title_format='{title} (copy)', version=None):
+    """
+    Copy the given courses as unpublished drafts and return {old id: new id}.
+    Prerequisites between courses cloned together point at the copies.
+    """
+    from .models import (
+        Assignment, Course, CourseStats, File, Lesson, Module, ModulePdf, Quiz, Section
+    )
+    from .search import index_courses
+    from .seats import reconcile
+    from .suggest import bump_version
+
+    with transaction.atomic():
+        courses = list(Course.objects.filter(pk__in=course_ids))
+        if not courses:
+            return {}
+        copies = _copies(courses)
+        for course in courses:
+            copy = copies[course.pk]
+            copy.title = title_format.format(title=course.title)[:200]
+            copy.is_published = False
+            copy.is_featured = False
+            copy.status = 'draft'
+            if version:
+                copy.version = version
+            if instructor is not None:
+                copy.instructor_id = instructor.pk
+        course_map = _insert(Course, copies)
+
+        _copy_through(Course.tags.through, 'course_id', 'coursetag_id', course_map)
+        _copy_through(
+            Course.prerequisites.through, 'from_course_id', 'to_course_id', course_map, course_map
+        )
+
+        modules = list(Module.objects.filter(course_id__in=course_map))
+        blob_map = _copy_blobs(ModulePdf, {module.pdf_blob_id for module in modules if module.pdf_blob_id})
+        module_map = _insert(Module, _copies(modules, course_id=course_map, pdf_blob_id=blob_map))
+
+        sections = list(Section.objects.filter(module_id__in=module_map))
+        section_map = _insert(Section, _copies(sections, module_id=module_map))
+        _copy_through(
+            Section.prerequisites.through, 'from_section_id', 'to_section_id', section_map, section_map
+        )
+
+        lesson_map = _insert(
+            Lesson, _copies(Lesson.objects.filter(section_id__in=section_map), section_id=section_map)
+        )
+        _insert(Quiz, _copies(Quiz.objects.filter(lesson_id__in=lesson_map), lesson_id=lesson_map))
+        _insert(
+            Assignment, _copies(Assignment.objects.filter(lesson_id__in=lesson_map), lesson_id=lesson_map)
+        )
+        files = list(File.objects.filter(section_id__in=section_map))
+        _insert(File, _copies(files, section_id=section_map))
+
+        # The copies reference the same stored objects as the originals
+        contentstore.acquire(
+            [module.pdf_file.name for module in modules]
+            + [section.pdf_file.name for section in sections]
+            + [file.file.name for file in files]
+        )
+
+        new_ids = list(course_map.values())
+        CourseStats.rebuild(course_ids=new_ids)
+        reconcile(new_ids)
+        index_courses(
+            'c.id IN ({})'.format(', '.join(['%s'] * len(new_ids))), new_ids
+        )
+        bump_version()
+    return course_map
@@ -0,0 +1,116 @@
+"""
+Validators for conditional GETs on the catalog and course APIs.
+
+The catalog's validator is a version kept in the database
+(courses/versions.py), so every process answers with the same one. It is
+bumped whenever a published course, a category, or the review/enrollment
+stats shown in the list change. A single course's validator comes from one
+primary-key query over the course and its stats row. It combines
+Course.updated_at, CourseStats.updated_at (reviews and enrollments) and
+CourseStats.content_updated_at (modules, sections and lessons, deletes
+included). Responses that include per-user progress also fold in a
+count subquery for the requesting user and vary on credentials.
+"""
+import hashlib
+from datetime import datetime
+
+from django.db.models import F, Func, IntegerField, OuterRef, Subquery
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from . import versions
+
+CATALOG_VERSION_NAME = 'courses:catalog'
+
+
+def touch_catalog():
+    versions.bump(CATALOG_VERSION_NAME)
+
+
+def catalog_modified():
+    """(version, timestamp) of the catalog's last change"""
+    version, updated_at = versions.current(CATALOG_VERSION_NAME)
+    return version, updated_at.timestamp()
+
+
+class Validators:
+    def __init__(self, etag, last_modified=None, per_user=False):
+        self.etag = quote_etag(etag)
+        self.last_modified = int(last_modified) if last_modified is not None else None
+        self.per_user = per_user
+
+    def not_modified(self, request):
+        """A 304 (or 412) response if the request's preconditions say so, else None"""
+        response = get_conditional_response(
+            request, etag=self.etag, last_modified=self.last_modified
+        )
+        if response is not None:
+            self.apply(response)
+        return response
+
+    def apply(self, response):
+        response['ETag'] = self.etag
+        if self.last_modified is not None:
+            response['Last-Modified'] = http_date(self.last_modified)
+        if self.per_user:
+            patch_vary_headers(response, ['Authorization', 'Cookie'])
+        return response
+
+
+def catalog_validators():
+    version, modified = catalog_modified()
+    return Validators(f'catalog-{version}', modified)
+
+
+def _count(queryset):
+    return Subquery(
+        queryset.order_by().annotate(total=Func(F('pk'), function='COUNT')).values('total')[:1],
+        output_field=IntegerField()
+    )
+
+
+def user_lesson_progress(user):
+    """Per-course count of lessons the user completed (CourseSerializer.progress)"""
+    from .models import UserProgress
+    return _count(UserProgress.objects.filter(user=user, lesson__section__module__course=OuterRef('pk')))
+
+
+def user_section_progress(user):
+    """Per-course count of completed Progress rows (SectionSerializer.completed)"""
+    from enrollments.models import Progress
+    return _count(Progress.objects.filter(
+        enrollment__user=user,
+        enrollment__course=OuterRef('pk'),
+        enrollment__status='active',
+        completed=True
+    ))
+
+
+def course_validators(request, course_id, user_marker=None):
+    """
+    Validators for one course's detail or outline response, or None when
+    the course does not exist. `user_marker` builds a per-course subquery
+    for authenticated users whose responses include their own progress.
+    """
+    from .models import Course
+
+    queryset = Course.objects.filter(pk=course_id)
+    fields = ['updated_at', 'stats__updated_at', 'stats__content_updated_at']
+    per_user = user_marker is not None and request.user.is_authenticated
+    if per_user:
+        queryset = queryset.annotate(user_marker=user_marker(request.user))
+        fields.append('user_marker')
+    row = queryset.values_list(*fields).first()
+    if row is None:
+        return None
+
+    timestamps = [value for value in row[:3] if value is not None]
+    last_modified = max(timestamps).timestamp()
+    parts = [str(course_id)] + [
+        value.isoformat() if isinstance(value, datetime) else str(value) for value in row
+    ]
+    if per_user:
+        parts.append(f'user:{request.user.pk}')
+    etag = hashlib.md5('|'.join(parts).encode('utf-8')).hexdigest()
+    # A timestamp can't describe per-user changes, so those rely on the ETag
+    return Validators(etag, None if per_user else last_modified, per_user)
@@ -0,0 +1,197 @@
+"""
+Content-addressed, deduplicating storage for course PDFs and files.
+
+Uploads to a ContentAddressedFileField are hashed with SHA-256, reading
+fixed-size chunks, and stored once under objects/<aa>/<bb>/<sha256><ext>.
+A StoredObject row per digest records the path and the number of model
+fields pointing at it. Identical uploads to different modules, sections
+or courses share one physical file. The field keeps the reference counts
+in step as rows are saved, changed and deleted, and the
+reclaim_stored_objects command deletes objects nobody references any more.
+"""
+import hashlib
+import os
+from collections import Counter
+
+from django.apps import apps
+from django.core.files import File as DjangoFile
+from django.db.models import F, FileField, signals
+from django.db.models.fields.files import FieldFile
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+PREFIX = 'objects/'
+CHUNK_SIZE = 64 * 1024
+
+
+def _stored_objects():
+    return apps.get_model('courses', 'StoredObject').objects
+
+
+def is_stored_path(name):
+    return bool(name) and name.startswith(PREFIX)
+
+
+def object_path(digest, name):
+    extension = os.path.splitext(name or '')[1].lower()[:10]
+    return f'{PREFIX}{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+
+def hash_file(content, chunk_size=CHUNK_SIZE):
+    """SHA-256 hex digest and size of a Django File, read chunk by chunk"""
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in content.chunks(chunk_size):
+        digest.update(chunk)
+        size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def put(content, name, storage):
+    """
+    Store `content` under its digest unless an identical object exists,
+    and return its StoredObject. References are counted separately, when
+    the row that points at the object is saved.
+    """
+    if not isinstance(content, DjangoFile):
+        content = DjangoFile(content, name=name)
+    digest, size = hash_file(content)
+    stored, created = _stored_objects().get_or_create(
+        sha256=digest, defaults={'path': object_path(digest, name), 'size': size}
+    )
+    if not created:
+        # Keep a just re-used object out of reach of a concurrent reclaim
+        _stored_objects().filter(pk=stored.pk).update(updated_at=timezone.now())
+    if created or not storage.exists(stored.path):
+        saved_path = storage.save(stored.path, content)
+        if saved_path != stored.path:
+            # Another upload of the same bytes won the race
+            storage.delete(saved_path)
+    return stored
+
+
+def _adjust(paths, sign):
+    counts = Counter(path for path in paths if is_stored_path(path))
+    by_amount = {}
+    for path, count in counts.items():
+        by_amount.setdefault(count, []).append(path)
+    for count, amount_paths in by_amount.items():
+        _stored_objects().filter(path__in=amount_paths).update(
+            ref_count=Greatest(F('ref_count') + sign * count, 0),
+            updated_at=timezone.now(),
+        )
+
+
+def acquire(paths):
+    """Add one reference per occurrence of each stored path in `paths`"""
+    _adjust(paths, 1)
+
+
+def release(paths):
+    """Drop one reference per occurrence of each stored path in `paths`"""
+    _adjust(paths, -1)
+
+
+def content_addressed_fields():
+    """(model, field) pairs of every ContentAddressedFileField"""
+    for model in apps.get_models():
+        for field in model._meta.concrete_fields:
+            if isinstance(field, ContentAddressedFileField):
+                yield model, field
+
+
+def recount():
+    """Recompute every reference count from the rows that point at objects"""
+    counts = Counter()
+    for model, field in content_addressed_fields():
+        counts.update(
+            model._default_manager.filter(**{f'{field.attname}__startswith': PREFIX})
+            .values_list(field.attname, flat=True).iterator()
+        )
+    for stored in _stored_objects().only('id', 'path', 'ref_count').iterator():
+        if stored.ref_count != counts[stored.path]:
+            _stored_objects().filter(pk=stored.pk).update(ref_count=counts[stored.path])
+
+
+class ContentAddressedFieldFile(FieldFile):
+    def save(self, name, content, save=True):
+        stored = put(content, name, self.storage)
+        self.name = stored.path
+        setattr(self.instance, self.field.attname, self.name)
+        self._committed = True
+        if save:
+            self.instance.save()
+
+    save.alters_data = True
+
+    def delete(self, save=True):
+        if not is_stored_path(self.name):
+            return super().delete(save)
+        # Other rows may share the object, so only the reference goes;
+        # the count drops when the instance is saved
+        if hasattr(self, '_file'):
+            self.close()
+            del self.file
+        self.name = None
+        setattr(self.instance, self.field.attname, self.name)
+        self._committed = False
+        if save:
+            self.instance.save()
+
+    delete.alters_data = True
+
+
+class ContentAddressedFileField(FileField):
+    """
+    FileField whose uploads go through the content-addressed store. The
+    stored path remembered when the instance is loaded is compared with
+    the saved one to move references from the old object to the new.
+    """
+    attr_class = ContentAddressedFieldFile
+
+    def contribute_to_class(self, cls, name, **kwargs):
+        super().contribute_to_class(cls, name, **kwargs)
+        if not cls._meta.abstract:
+            signals.post_init.connect(self._remember_path, sender=cls)
+            signals.pre_save.connect(self._load_path, sender=cls)
+            signals.post_save.connect(self._update_references, sender=cls)
+            signals.post_delete.connect(self._drop_reference, sender=cls)
+
+    def _current_path(self, instance):
+        value = instance.__dict__.get(self.attname)
+        return getattr(value, 'name', value) or ''
+
+    def _saved_paths(self, instance):
+        return instance.__dict__.setdefault('_stored_paths', {})
+
+    def _remember_path(self, instance, **kwargs):
+        # Deferred fields are looked up only if they are assigned and saved.
+        # New instances start with no reference whatever they were built with.
+        if self.attname in instance.__dict__:
+            self._saved_paths(instance)[self.attname] = self._current_path(instance)
+
+    def _load_path(self, instance, raw=False, **kwargs):
+        saved = self._saved_paths(instance)
+        if raw or self.attname in saved or self.attname not in instance.__dict__:
+            return
+        if not instance._state.adding:
+            saved[self.attname] = type(instance)._default_manager.filter(pk=instance.pk).values_list(
+                self.attname, flat=True
+            ).first() or ''
+
+    def _update_references(self, instance, created=False, raw=False, update_fields=None, **kwargs):
+        if raw or self.attname not in instance.__dict__:
+            return
+        if update_fields is not None and self.name not in update_fields:
+            return
+        saved = self._saved_paths(instance)
+        old_path = '' if created else saved.get(self.attname, '')
+        new_path = self._current_path(instance)
+        if old_path != new_path:
+            release([old_path])
+            acquire([new_path])
+        saved[self.attname] = new_path
+
+    def _drop_reference(self, instance, **kwargs):
+        saved = self._saved_paths(instance)
+        release([saved.get(self.attname, self._current_path(instance))])
@@ -0,0 +1,258 @@
+"""
+Range-aware delivery of module PDFs.
+
+PDF.js fetches a document in byte ranges, so it can render the first
+pages before the rest has arrived. serve_pdf() answers:
+
+- single and multi-range requests with 206 (multipart/byteranges when
+  there are several ranges), and 416 when no range is satisfiable;
+- If-Range and If-None-Match, checked against a strong ETag built from
+  the PDF's SHA-256.
+
+The whole document is never held in memory. File-backed PDFs go out
+through FileResponse (sendfile where the server supports it) or are
+read chunk by chunk for ranges. Under COURSE_PDF_SENDFILE_MODE they are
+handed to the front proxy with X-Accel-Redirect or X-Sendfile instead.
+Database blobs are read with SUBSTR, one fixed-size slice at a time.
+"""
+import re
+import secrets
+from urllib.parse import quote
+
+from django.conf import settings
+from django.db.models.functions import Substr
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+CHUNK_SIZE = 256 * 1024
+MAX_RANGES = 16
+PDF_CONTENT_TYPE = 'application/pdf'
+
+_RANGE_SPEC = re.compile(r'^(\d*)-(\d*)$')
+
+
+class BlobSource:
+    """A PDF stored in the ModulePdf table"""
+
+    def __init__(self, blob_id, size, etag, filename, content_type):
+        self.blob_id = blob_id
+        self.size = size
+        self.etag = etag
+        self.filename = filename
+        self.content_type = content_type
+
+    def read(self, start, end):
+        from .models import ModulePdf
+
+        position = start
+        while position <= end:
+            length = min(CHUNK_SIZE, end - position + 1)
+            # SUBSTR is 1-based
+            chunk = ModulePdf.objects.filter(pk=self.blob_id).annotate(
+                chunk=Substr('data', position + 1, length)
+            ).values_list('chunk', flat=True).first()
+            if not chunk:
+                return
+            yield bytes(chunk)
+            position += len(chunk)
+
+
+class FileSource:
+    """A PDF kept in file storage"""
+
+    def __init__(self, storage, name, size, etag, filename, content_type):
+        self.storage = storage
+        self.name = name
+        self.size = size
+        self.etag = etag
+        self.filename = filename
+        self.content_type = content_type
+
+    def read(self, start, end):
+        with self.storage.open(self.name, 'rb') as pdf:
+            pdf.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = pdf.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    return
+                remaining -= len(chunk)
+                yield chunk
+
+    def local_path(self):
+        try:
+            return self.storage.path(self.name)
+        except NotImplementedError:
+            return None
+
+
+def module_pdf_source(module):
+    """The source serve_pdf() reads a module's PDF from, or None if it has none"""
+    filename = module.pdf_filename or f'module_{module.id}.pdf'
+    content_type = module.pdf_content_type or PDF_CONTENT_TYPE
+    if module.pdf_blob_id:
+        return BlobSource(
+            module.pdf_blob_id, module.pdf_size, module.pdf_checksum, filename, content_type
+        )
+    if module.pdf_file:
+        storage = module.pdf_file.storage
+        name = module.pdf_file.name
+        size = module.pdf_size or storage.size(name)
+        # Files stored before content addressing have no checksum yet
+        etag = module.pdf_checksum or f'{name}-{size}'
+        return FileSource(storage, name, size, etag, filename, content_type)
+    return None
+
+
+def parse_ranges(header, size):
+    """
+    The (start, end) byte ranges of a Range header, merged and sorted.
+    None means the header should be ignored (malformed, not bytes, or too
+    many ranges), and an empty list means nothing in it is satisfiable.
+    """
+    unit, _, specs = header.partition('=')
+    if unit.strip().lower() != 'bytes' or not specs:
+        return None
+
+    ranges = []
+    for spec in specs.split(','):
+        match = _RANGE_SPEC.match(spec.strip())
+        if not match or match.groups() == ('', ''):
+            return None
+        first, last = match.groups()
+        if first == '':
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length == 0:
+                continue
+            start, end = max(size - length, 0), size - 1
+        else:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+            if last and int(last) < start:
+                return None
+        if start < size:
+            ranges.append((start, end))
+
+    ranges.sort()
+    merged = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    if len(merged) > MAX_RANGES:
+        return None
+    return merged
+
+
+def _if_range_matches(request, etag):
+    if_range = request.headers.get('If-Range')
+    # Only a strong ETag can validate a range; dates and weak tags fall back to 200
+    return if_range is None or if_range.strip() == etag
+
+
+def _disposition(filename):
+    plain = filename.replace('\\', '').replace('"', '')
+    return f"inline; filename=\"{plain}\"; filename*=UTF-8''{quote(filename)}"
+
+
+def _common_headers(response, source, etag):
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Content-Disposition'] = _disposition(source.filename)
+    return response
+
+
+def _sendfile_response(source):
+    mode = getattr(settings, 'COURSE_PDF_SENDFILE_MODE', None)
+    if not isinstance(source, FileSource) or not mode:
+        return None
+    response = HttpResponse(content_type=source.content_type)
+    if mode == 'x-accel-redirect':
+        prefix = getattr(settings, 'COURSE_PDF_ACCEL_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(source.name)
+        return response
+    if mode == 'x-sendfile':
+        path = source.local_path()
+        if path:
+            response['X-Sendfile'] = path
+            return response
+    return None
+
+
+def _part_header(source, boundary, start, end):
+    return (
+        f'--{boundary}\r\n'
+        f'Content-Type: {source.content_type}\r\n'
+        f'Content-Range: bytes {start}-{end}/{source.size}\r\n\r\n'
+    ).encode('ascii')
+
+
+def _multipart(source, ranges, boundary):
+    for start, end in ranges:
+        yield _part_header(source, boundary, start, end)
+        yield from source.read(start, end)
+        yield b'\r\n'
+    yield f'--{boundary}--\r\n'.encode('ascii')
+
+
+def _multipart_length(source, ranges, boundary):
+    length = len(f'--{boundary}--\r\n')
+    for start, end in ranges:
+        length += len(_part_header(source, boundary, start, end)) + (end - start + 1) + 2
+    return length
+
+
+def serve_pdf(request, source):
+    etag = quote_etag(source.etag)
+
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        return _common_headers(response, source, etag)
+
+    # The front proxy does its own Range handling
+    response = _sendfile_response(source)
+    if response is not None:
+        return _common_headers(response, source, etag)
+
+    ranges = None
+    range_header = request.headers.get('Range')
+    if range_header and _if_range_matches(request, etag):
+        ranges = parse_ranges(range_header, source.size)
+
+    if ranges == []:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{source.size}'
+        return _common_headers(response, source, etag)
+
+    if not ranges:
+        if isinstance(source, FileSource):
+            response = FileResponse(
+                source.storage.open(source.name, 'rb'), content_type=source.content_type
+            )
+        else:
+            response = StreamingHttpResponse(
+                source.read(0, source.size - 1), content_type=source.content_type
+            )
+        response['Content-Length'] = str(source.size)
+        return _common_headers(response, source, etag)
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        response = StreamingHttpResponse(
+            source.read(start, end), status=206, content_type=source.content_type
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{source.size}'
+        response['Content-Length'] = str(end - start + 1)
+        return _common_headers(response, source, etag)
+
+    boundary = secrets.token_hex(16)
+    response = StreamingHttpResponse(
+        _multipart(source, ranges, boundary),
+        status=206,
+        content_type=f'multipart/byteranges; boundary={boundary}'
+    )
+    response['Content-Length'] = str(_multipart_length(source, ranges, boundary))
+    return _common_headers(response, source, etag)
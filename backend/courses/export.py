@@ -0,0 +1,94 @@
+"""
+Streaming export of the published course catalog as NDJSON or CSV.
+
+Rows come from a values() projection joined to instructor and category and
+are read with .iterator(), so memory stays flat however large the catalog
+grows. Each row carries the same keys as CourseListView's JSON output.
+"""
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+CHUNK_SIZE = 2000
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+COLUMNS = (
+    'id', 'title', 'description', 'thumbnail', 'thumbnail_url', 'cover_image',
+    'instructor', 'category', 'difficulty', 'price', 'duration_in_weeks',
+    'created_at', 'updated_at',
+)
+
+_PROJECTION = (
+    'id', 'title', 'description', 'thumbnail', 'cover_image', 'instructor__username',
+    'category__name', 'difficulty', 'price', 'duration_in_weeks', 'created_at', 'updated_at',
+)
+
+
+def requested_format(request):
+    """The export format asked for by ?format= or the Accept header, if any"""
+    export_format = request.GET.get('format')
+    if export_format in FORMATS:
+        return export_format
+    accept = request.headers.get('Accept', '')
+    for name, content_type in FORMATS.items():
+        if accept.startswith(content_type):
+            return name
+    return None
+
+
+def catalog_rows(queryset, chunk_size=CHUNK_SIZE):
+    from .models import Course
+
+    thumbnail_storage = Course._meta.get_field('thumbnail').storage
+    cover_storage = Course._meta.get_field('cover_image').storage
+    for row in queryset.values(*_PROJECTION).iterator(chunk_size=chunk_size):
+        thumbnail = thumbnail_storage.url(row['thumbnail']) if row['thumbnail'] else None
+        yield {
+            'id': row['id'],
+            'title': row['title'],
+            'description': row['description'],
+            'thumbnail': thumbnail,
+            'thumbnail_url': thumbnail,
+            'cover_image': cover_storage.url(row['cover_image']) if row['cover_image'] else None,
+            'instructor': row['instructor__username'],
+            'category': row['category__name'],
+            'difficulty': row['difficulty'],
+            'price': str(row['price']),
+            'duration_in_weeks': row['duration_in_weeks'],
+            'created_at': row['created_at'].isoformat(),
+            'updated_at': row['updated_at'].isoformat(),
+        }
+
+
+def _ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to csv.writer's caller"""
+    def write(self, value):
+        return value
+
+
+def _csv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(COLUMNS)
+    for row in rows:
+        yield writer.writerow([row[column] for column in COLUMNS])
+
+
+def catalog_response(queryset, export_format):
+    rows = catalog_rows(queryset)
+    lines = _csv_lines(rows) if export_format == 'csv' else _ndjson_lines(rows)
+    response = StreamingHttpResponse(lines, content_type=FORMATS[export_format])
+    filename = f"courses-{timezone.now():%Y%m%d}.{export_format}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
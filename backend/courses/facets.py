@@ -0,0 +1,123 @@
+"""
+Faceted counts for the course catalog filters.
+
+All facets come from one grouped query over published courses matching the
+search text, keyed by (category, difficulty, language, free). Each facet's
+counts are then summed in Python over the rows that match every *other*
+active filter, so selecting a difficulty still shows the counts for the
+remaining difficulties. Results are cached per normalized filter key under
+a version number that course and category changes bump. The version is
+kept in the database (courses/versions.py), so a change made in one
+process invalidates the cached facets of every other process.
+"""
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db.models import BooleanField, Case, Count, Q, Value, When
+
+from . import versions
+
+VERSION_NAME = 'courses:facets'
+CACHE_TIMEOUT = 60 * 10
+
+FILTER_PARAMS = ('search', 'category', 'difficulty', 'language', 'price')
+PRICE_VALUES = ('free', 'paid')
+
+_FREE = Case(
+    When(Q(is_free=True) | Q(price=0), then=Value(True)),
+    default=Value(False),
+    output_field=BooleanField()
+)
+
+
+def bump_version():
+    versions.bump(VERSION_NAME)
+
+
+def current_version():
+    return versions.current(VERSION_NAME)[0]
+
+
+def normalize_filters(params):
+    """Reduce request parameters to the canonical filters facets depend on"""
+    filters = {}
+    for name in FILTER_PARAMS:
+        value = ' '.join((params.get(name) or '').split())
+        if name != 'search':
+            value = value.lower()
+        if name == 'price' and value not in PRICE_VALUES:
+            value = ''
+        filters[name] = value
+    return filters
+
+
+def _row_matches(row, filters, skip):
+    if skip != 'category' and filters['category'] and (row['category__name'] or '').lower() != filters['category']:
+        return False
+    if skip != 'difficulty' and filters['difficulty'] and row['difficulty'] != filters['difficulty']:
+        return False
+    if skip != 'language' and filters['language'] and (row['language'] or '').lower() != filters['language']:
+        return False
+    if skip != 'price' and filters['price'] and row['free'] != (filters['price'] == 'free'):
+        return False
+    return True
+
+
+def compute_facets(filters):
+    from .models import Course
+    from . import search as course_search
+
+    queryset = Course.objects.filter(is_published=True)
+    if filters['search']:
+        ranked_ids = course_search.search_course_ids(filters['search'])
+        if ranked_ids is not None:
+            queryset = queryset.filter(id__in=ranked_ids)
+        else:
+            queryset = queryset.filter(course_search.substring_filter(filters['search']))
+
+    rows = list(
+        queryset.annotate(free=_FREE)
+        .values('category_id', 'category__name', 'difficulty', 'language', 'free')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+
+    categories = {}
+    difficulties = {}
+    languages = {}
+    prices = dict.fromkeys(PRICE_VALUES, 0)
+    total = 0
+    for row in rows:
+        if _row_matches(row, filters, None):
+            total += row['count']
+        if _row_matches(row, filters, 'category'):
+            entry = categories.setdefault(
+                row['category_id'], {'id': row['category_id'], 'name': row['category__name'], 'count': 0}
+            )
+            entry['count'] += row['count']
+        if _row_matches(row, filters, 'difficulty'):
+            difficulties[row['difficulty']] = difficulties.get(row['difficulty'], 0) + row['count']
+        if _row_matches(row, filters, 'language'):
+            languages[row['language']] = languages.get(row['language'], 0) + row['count']
+        if _row_matches(row, filters, 'price'):
+            prices['free' if row['free'] else 'paid'] += row['count']
+
+    return {
+        'total': total,
+        'category': sorted(categories.values(), key=lambda entry: entry['name'] or ''),
+        'difficulty': [{'value': value, 'count': count} for value, count in sorted(difficulties.items())],
+        'language': [{'value': value, 'count': count} for value, count in sorted(languages.items())],
+        'price': [{'value': value, 'count': prices[value]} for value in PRICE_VALUES],
+    }
+
+
+def get_facets(params):
+    filters = normalize_filters(params)
+    digest = hashlib.sha1(json.dumps(filters, sort_keys=True).encode('utf-8')).hexdigest()
+    key = f'courses:facets:{current_version()}:{digest}'
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(filters)
+        cache.set(key, facets, CACHE_TIMEOUT)
+    return facets
@@ -0,0 +1,179 @@
+"""
+Resized WebP/JPEG derivatives of uploaded images.
+
+Course thumbnails and covers and user profile pictures are served at
+upload resolution, often several megabytes. When one of them changes, a
+job on the background queue renders downscaled variants at a few fixed widths and
+stores them next to the original, e.g. course_thumbnails/intro.w320.webp.
+The variants are recorded in the row's image_variants JSON, keyed by
+field and tagged with the original's name. The map becomes stale the
+moment the original is replaced, and it is rebuilt on the next run.
+Serializers read the map with srcset(), so rendering needs no extra
+queries.
+"""
+import os
+from io import BytesIO
+
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.utils import timezone
+
+# (app label, model name) -> {image field: widths}
+DERIVATIVE_WIDTHS = {
+    ('courses', 'course'): {
+        'thumbnail': (320, 640, 960),
+        'cover_image': (640, 1280, 1920),
+    },
+    ('accounts', 'user'): {
+        'profile_picture': (64, 128, 256),
+    },
+}
+
+FORMATS = (
+    ('webp', 'WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+    ('jpeg', 'JPEG', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+
+def image_fields(model):
+    return DERIVATIVE_WIDTHS.get((model._meta.app_label, model._meta.model_name), {})
+
+
+def is_stale(instance, field_name):
+    """Whether the field's variants were built from something other than its current file"""
+    name = getattr(instance, field_name).name or ''
+    recorded = (instance.image_variants or {}).get(field_name, {})
+    return recorded.get('source', '') != name
+
+
+def variant_name(name, width, extension):
+    root, _ = os.path.splitext(name)
+    return f'{root}.w{width}.{extension}'
+
+
+def _render(image, width, pil_format, options):
+    from PIL import Image
+
+    resized = image.copy()
+    resized.thumbnail((width, width * 10), Image.LANCZOS)
+    if pil_format == 'JPEG' and resized.mode != 'RGB':
+        rgba = resized.convert('RGBA')
+        resized = Image.new('RGB', rgba.size, (255, 255, 255))
+        resized.paste(rgba, mask=rgba.getchannel('A'))
+    elif pil_format == 'WEBP' and resized.mode not in ('RGB', 'RGBA'):
+        resized = resized.convert('RGBA')
+    buffer = BytesIO()
+    resized.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def build_variants(field_file, widths):
+    """Render and store the variants of one image, returning its map entry"""
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    entry = {'source': field_file.name}
+    storage = field_file.storage
+    try:
+        with storage.open(field_file.name, 'rb') as original:
+            image = Image.open(original)
+            image = ImageOps.exif_transpose(image)
+            image.load()
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as e:
+        print(f"Could not read image {field_file.name}: {str(e)}")
+        return entry
+
+    # Never upscale; an image smaller than every width gets one variant at its own size
+    targets = [width for width in widths if width < image.width] or [image.width]
+    for extension, pil_format, _, options in FORMATS:
+        entry[extension] = {}
+        for width in targets:
+            name = variant_name(field_file.name, width, extension)
+            if storage.exists(name):
+                storage.delete(name)
+            entry[extension][str(width)] = storage.save(
+                name, ContentFile(_render(image, width, pil_format, options))
+            )
+    return entry
+
+
+def _remove_variants(storage, entry):
+    for extension, _, _, _ in FORMATS:
+        for name in (entry or {}).get(extension, {}).values():
+            storage.delete(name)
+
+
+def _is_shared(model, pk, field_name, name):
+    """Whether another row (e.g. a cloned course) still uses the image `name`"""
+    return bool(name) and model._default_manager.filter(**{field_name: name}).exclude(pk=pk).exists()
+
+
+def generate_derivatives(app_label, model_name, pk, force=False):
+    """
+    Bring the variants of every image field of one row up to date. Returns
+    the number of fields that were (re)built.
+    """
+    model = apps.get_model(app_label, model_name)
+    fields = image_fields(model)
+    instance = model._default_manager.filter(pk=pk).only('pk', 'image_variants', *fields).first()
+    if instance is None:
+        return 0
+
+    variants = dict(instance.image_variants or {})
+    rebuilt = 0
+    for field_name, widths in fields.items():
+        if not force and not is_stale(instance, field_name):
+            continue
+        field_file = getattr(instance, field_name)
+        previous = variants.pop(field_name, None)
+        if previous and not _is_shared(model, pk, field_name, previous.get('source')):
+            _remove_variants(field_file.storage, previous)
+        if field_file:
+            variants[field_name] = build_variants(field_file, widths)
+        rebuilt += 1
+
+    if rebuilt:
+        updates = {'image_variants': variants}
+        is_course = (app_label, model_name) == ('courses', 'course')
+        if is_course:
+            # Let conditional GETs and the catalog see the new srcsets
+            updates['updated_at'] = timezone.now()
+        model._default_manager.filter(pk=pk).update(**updates)
+        if is_course:
+            from .conditional import touch_catalog
+            touch_catalog()
+    return rebuilt
+
+
+def schedule_derivatives(instance):
+    """Queue derivative generation for `instance`; it runs once the current transaction commits"""
+    from . import jobs
+
+    app_label, model_name = instance._meta.app_label, instance._meta.model_name
+    jobs.enqueue(
+        generate_derivatives,
+        key=f'images:{app_label}.{model_name}:{instance.pk}',
+        app_label=app_label,
+        model_name=model_name,
+        pk=instance.pk,
+    )
+
+
+def srcset(instance, field_name, request=None):
+    """
+    {mime type: srcset string} for an image field, or None while its
+    variants are missing or stale. Serializers use it for <picture> sources.
+    """
+    if not getattr(instance, field_name) or is_stale(instance, field_name):
+        return None
+    entry = instance.image_variants[field_name]
+    storage = getattr(instance, field_name).storage
+    sources = {}
+    for extension, _, mime_type, _ in FORMATS:
+        candidates = []
+        for width, name in sorted(entry.get(extension, {}).items(), key=lambda item: int(item[0])):
+            url = storage.url(name)
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            candidates.append(f'{url} {width}w')
+        if candidates:
+            sources[mime_type] = ', '.join(candidates)
+    return sources or None
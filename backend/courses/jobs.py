@@ -0,0 +1,262 @@
+"""
+A small background job queue kept in the database.
+
+Work that need not finish inside a request is written to the Job table
+with enqueue() and run by `manage.py run_worker`. There is no broker,
+so the queue runs on a single box next to the web server. The worker is
+a long-running process of its own and has to be started and supervised
+alongside the web server (a second systemd unit, Procfile entry or
+container); without it, queued jobs simply wait. Running workers touch a
+heartbeat row, so requests can tell with workers_alive() whether anyone
+will pick their job up and do urgent work themselves otherwise.
+
+- A job names a function by dotted path and carries JSON keyword
+  arguments. Whatever the function returns is stored as its result.
+- Higher priority runs first, then the earliest run_at.
+- A claimed job is leased for the visibility timeout. If its worker dies,
+  another worker claims it again once the lease has run out.
+- A job that raises is retried with exponential backoff until it has used
+  max_attempts. After that it stays failed with its last error.
+- A job enqueued with a key is dropped while another job with that key is
+  still queued, so bursts of triggers coalesce into one run. A partial
+  unique index on the key of queued jobs makes this hold for enqueues
+  that race each other too.
+
+Claims use SELECT ... FOR UPDATE SKIP LOCKED where the database supports
+it, so workers never wait on each other's rows. Elsewhere, SQLite
+included, a conditional UPDATE on the job's status and attempt count
+decides which worker wins.
+"""
+import os
+import random
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import versions
+
+PRIORITY_HIGH = 10
+PRIORITY_NORMAL = 0
+PRIORITY_LOW = -10
+
+BACKOFF_BASE = 10
+BACKOFF_MAX = 60 * 60
+
+# The heartbeat is the updated_at of this CacheVersion row
+HEARTBEAT_NAME = 'courses:job-workers'
+
+
+def visibility_timeout():
+    return timedelta(seconds=getattr(settings, 'JOB_VISIBILITY_TIMEOUT', 300))
+
+
+def heartbeat_timeout():
+    return getattr(settings, 'JOB_WORKER_HEARTBEAT_TIMEOUT', 30)
+
+
+def heartbeat():
+    versions.bump(HEARTBEAT_NAME)
+
+
+def workers_alive():
+    """Whether some worker polled the queue within the heartbeat timeout"""
+    from .models import CacheVersion
+
+    beat = CacheVersion.objects.filter(name=HEARTBEAT_NAME).values_list('updated_at', flat=True).first()
+    return beat is not None and (timezone.now() - beat).total_seconds() < heartbeat_timeout()
+
+
+def worker_name(index=0):
+    return f'{socket.gethostname()}:{os.getpid()}:{index}'
+
+
+def job_name(func):
+    if isinstance(func, str):
+        return func
+    return f'{func.__module__}.{func.__qualname__}'
+
+
+def enqueue(func, priority=PRIORITY_NORMAL, delay=0, max_attempts=5, key='', **kwargs):
+    """
+    Queue `func` (a function or its dotted path) to be called with
+    `kwargs` by a worker. The job becomes visible when the surrounding
+    transaction commits. Returns the Job, or None if `key` coalesced it
+    into a job that is already waiting.
+    """
+    from .models import Job
+
+    name = job_name(func)
+    # Saves the failed insert in the common case; the unique index settles races
+    if key and Job.objects.filter(key=key, status='queued').exists():
+        return None
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            return Job.objects.create(
+                name=name,
+                kwargs=kwargs,
+                key=key,
+                priority=priority,
+                max_attempts=max_attempts,
+                run_at=now + timedelta(seconds=delay),
+                created_at=now,
+                updated_at=now,
+            )
+    except IntegrityError:
+        if not key:
+            raise
+        return None
+
+
+def backoff(attempts):
+    """Seconds to wait before retry number `attempts`, with some jitter"""
+    delay = min(BACKOFF_BASE * 2 ** max(attempts - 1, 0), BACKOFF_MAX)
+    return delay + random.uniform(0, delay / 10)
+
+
+def _claimable(now):
+    from .models import Job
+
+    # Queued jobs that are due, and running jobs whose lease has expired
+    return Job.objects.filter(
+        Q(status='queued', run_at__lte=now) | Q(status='running', locked_until__lt=now)
+    ).order_by('-priority', 'run_at', 'id')
+
+
+def _lease(job, worker, now):
+    """Lease `job` to `worker` unless another worker changed it first"""
+    from .models import Job
+
+    if job.status == 'running' and job.attempts >= job.max_attempts:
+        # Its last attempt never reported back
+        Job.objects.filter(pk=job.pk, status='running', attempts=job.attempts).update(
+            status='failed', last_error='Timed out', locked_until=None,
+            finished_at=now, updated_at=now
+        )
+        return False
+
+    leased = Job.objects.filter(pk=job.pk, status=job.status, attempts=job.attempts).update(
+        status='running',
+        attempts=F('attempts') + 1,
+        locked_by=worker,
+        locked_until=now + visibility_timeout(),
+        updated_at=now,
+    )
+    if leased:
+        job.status = 'running'
+        job.attempts += 1
+        job.locked_by = worker
+    return bool(leased)
+
+
+def claim(worker):
+    """Lease the next due job to `worker` and return it, or None if there is none"""
+    while True:
+        now = timezone.now()
+        if connection.features.has_select_for_update_skip_locked:
+            with transaction.atomic():
+                job = _claimable(now).select_for_update(skip_locked=True).first()
+                leased = job is not None and _lease(job, worker, now)
+        else:
+            # SQLite cannot lock rows; the conditional UPDATE alone picks the winner
+            job = _claimable(now).first()
+            leased = job is not None and _lease(job, worker, now)
+        if job is None:
+            return None
+        if leased:
+            return job
+
+
+def execute(job, worker, close_connections=True):
+    """
+    Run a claimed job and record its outcome, unless its lease was lost
+    meanwhile. Workers drop stale connections after each job; callers
+    running a job inside a request pass close_connections=False.
+    """
+    from .models import Job
+
+    try:
+        result = import_string(job.name)(**job.kwargs)
+    except Exception as e:
+        print(f"Job {job.pk} ({job.name}) failed on attempt {job.attempts}: {str(e)}")
+        now = timezone.now()
+        outcome = {'last_error': traceback.format_exc(), 'locked_until': None, 'updated_at': now}
+        if job.attempts >= job.max_attempts:
+            outcome.update(status='failed', finished_at=now)
+        else:
+            outcome.update(status='queued', run_at=now + timedelta(seconds=backoff(job.attempts)))
+    else:
+        now = timezone.now()
+        outcome = {
+            'status': 'done', 'result': result, 'locked_until': None,
+            'finished_at': now, 'updated_at': now,
+        }
+    finally:
+        if close_connections:
+            close_old_connections()
+
+    leased = Job.objects.filter(pk=job.pk, status='running', locked_by=worker, attempts=job.attempts)
+    try:
+        with transaction.atomic():
+            updated = leased.update(**outcome)
+    except IntegrityError:
+        # A job with the same key was queued meanwhile and takes over the retry
+        outcome.update(status='failed', finished_at=outcome['updated_at'])
+        updated = leased.update(**outcome)
+    job.status = outcome['status'] if updated else job.status
+    return bool(updated)
+
+
+def run_inline(job):
+    """
+    Lease one particular queued job to this process and run it now, for a
+    request that cannot wait for a worker. Returns False if the job is not
+    due or a worker took it first.
+    """
+    now = timezone.now()
+    if job.status != 'queued' or job.run_at > now:
+        return False
+    worker = worker_name('inline')
+    if not _lease(job, worker, now):
+        return False
+    execute(job, worker, close_connections=False)
+    return True
+
+
+def work(worker, stop, poll_interval=1.0, burst=False):
+    """
+    Claim and run jobs until `stop` (a threading or multiprocessing Event)
+    is set. With `burst`, return as soon as no job is due. Returns the
+    number of jobs run.
+    """
+    processed = 0
+    last_beat = None
+    while not stop.is_set():
+        try:
+            # A few beats per timeout, so one late beat does not look like a dead worker
+            if last_beat is None or time.monotonic() - last_beat >= heartbeat_timeout() / 3:
+                heartbeat()
+                last_beat = time.monotonic()
+            job = claim(worker)
+            if job is not None:
+                execute(job, worker)
+                processed += 1
+                continue
+            close_old_connections()
+            if burst:
+                break
+        except Exception as e:
+            # The lease of a job caught halfway simply runs out
+            print(f"Error in worker {worker}: {str(e)}")
+            close_old_connections()
+        stop.wait(poll_interval)
+    close_old_connections()
+    return processed
+
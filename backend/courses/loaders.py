@@ -0,0 +1,114 @@
+"""
+Request-scoped batch loaders for the per-user fields of course serializers.
+
+Serializer method fields like SectionSerializer.completed used to run
+their own queries for every object they rendered. Instead, list
+serializers prime a loader with the IDs of everything they are about to
+render. The first load() then resolves every pending ID of that kind in
+one query and memoizes the results. The loaders live in the serializer
+context, so one tree shares them and a new render starts fresh.
+"""
+from django.apps import apps
+from django.db.models import Count, F
+
+CONTEXT_KEY = 'progress_loaders'
+
+
+class BatchLoader:
+    """Collect keys, then resolve all pending keys with one batch call"""
+
+    def __init__(self, batch_fn, default):
+        self.batch_fn = batch_fn
+        self.default = default
+        self.pending = set()
+        self.results = {}
+
+    def prime(self, keys):
+        self.pending.update(key for key in keys if key not in self.results)
+
+    def load(self, key):
+        if key not in self.results:
+            keys = self.pending | {key}
+            self.pending = set()
+            found = self.batch_fn(keys)
+            for pending_key in keys:
+                self.results[pending_key] = found.get(pending_key, self.default)
+        return self.results[key]
+
+
+class ProgressLoaders:
+    def __init__(self, user):
+        self.user = user
+        self.lesson_completed = BatchLoader(self._load_lesson_completed, False)
+        self.section_completed = BatchLoader(self._load_section_completed, False)
+        self.course_progress = BatchLoader(self._load_course_progress, (0, 0))
+
+    def _load_lesson_completed(self, lesson_ids):
+        UserProgress = apps.get_model('courses', 'UserProgress')
+        return dict.fromkeys(
+            UserProgress.objects.filter(user=self.user, lesson_id__in=lesson_ids)
+            .values_list('lesson_id', flat=True),
+            True
+        )
+
+    def _load_section_completed(self, section_ids):
+        Lesson = apps.get_model('courses', 'Lesson')
+        Progress = apps.get_model('enrollments', 'Progress')
+
+        lessons = {}
+        for section_id, lesson_id in Lesson.objects.filter(
+            section_id__in=section_ids
+        ).values_list('section_id', 'id'):
+            lessons.setdefault(section_id, set()).add(lesson_id)
+
+        # Only progress under an active enrollment in the section's own course counts
+        completed = set(Progress.objects.filter(
+            enrollment__user=self.user,
+            enrollment__status='active',
+            enrollment__course=F('lesson__section__module__course'),
+            lesson__section_id__in=section_ids,
+            completed=True
+        ).values_list('lesson_id', flat=True))
+
+        return {
+            section_id: lesson_ids <= completed
+            for section_id, lesson_ids in lessons.items()
+        }
+
+    def _load_course_progress(self, course_ids):
+        Lesson = apps.get_model('courses', 'Lesson')
+        UserProgress = apps.get_model('courses', 'UserProgress')
+
+        totals = dict(
+            Lesson.objects.filter(section__module__course_id__in=course_ids)
+            .values('section__module__course_id').annotate(total=Count('id'))
+            .values_list('section__module__course_id', 'total')
+        )
+        completed = dict(
+            UserProgress.objects.filter(user=self.user, lesson__section__module__course_id__in=course_ids)
+            .values('lesson__section__module__course_id').annotate(total=Count('id'))
+            .values_list('lesson__section__module__course_id', 'total')
+        )
+        return {
+            course_id: (completed.get(course_id, 0), total)
+            for course_id, total in totals.items()
+        }
+
+
+def get_loaders(context):
+    """The progress loaders for a serializer tree, or None for anonymous requests"""
+    request = context.get('request')
+    if not request or not request.user.is_authenticated:
+        return None
+    loaders = context.get(CONTEXT_KEY)
+    if loaders is None or loaders.user != request.user:
+        loaders = context[CONTEXT_KEY] = ProgressLoaders(request.user)
+    return loaders
+
+
+def prefetched(instance, name):
+    """Related objects already prefetched on `instance`, or None"""
+    cache = getattr(instance, '_prefetched_objects_cache', {})
+    if name in cache:
+        return cache[name]
+    return None
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from courses.recommendations import CHUNK_SIZE, TOP_N, build_recommendations
+
+class Command(BaseCommand):
+    help = 'Rebuilds the "students also enrolled in" course recommendations from enrollments'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top-n',
+            type=int,
+            default=TOP_N,
+            help='Number of neighbours stored per course'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help='Number of courses whose co-enrollments are computed per query'
+        )
+        parser.add_argument(
+            '--min-shared',
+            type=int,
+            default=1,
+            help='Minimum number of shared students for two courses to be related'
+        )
+
+    def handle(self, *args, **options):
+        count = build_recommendations(
+            top_n=options['top_n'],
+            chunk_size=options['chunk_size'],
+            min_shared=options['min_shared']
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully stored {count} course recommendations')
+        )
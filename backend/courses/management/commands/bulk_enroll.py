@@ -0,0 +1,67 @@
+import sys
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.models import Course
+from enrollments import bulk
+
+class Command(BaseCommand):
+    help = 'Enrolls a cohort in a course from a CSV or JSON list of usernames or emails'
+
+    def add_arguments(self, parser):
+        parser.add_argument('course_id', type=int, help='ID of the course to enroll the students in')
+        parser.add_argument('path', help="CSV or JSON file with one username or email per row, or - for stdin")
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'json'],
+            help='Format of the list (default: from the file extension)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=bulk.BATCH_SIZE,
+            help='Rows resolved and inserted together'
+        )
+        parser.add_argument(
+            '--report',
+            choices=['csv', 'ndjson'],
+            help='Write one line per row in this format, instead of only the summary'
+        )
+
+    def handle(self, *args, **options):
+        course = Course.objects.filter(pk=options['course_id']).first()
+        if course is None:
+            raise CommandError(f"No course with ID {options['course_id']}")
+        source_format = options['format'] or bulk.input_format('', options['path'])
+        if source_format is None:
+            raise CommandError('Cannot tell the format of the list; pass --format')
+
+        source = sys.stdin.buffer if options['path'] == '-' else open(options['path'], 'rb')
+        counts = Counter()
+        try:
+            outcomes = bulk.enroll_stream(
+                course, bulk.read_identifiers(source, source_format), batch_size=options['batch_size']
+            )
+            if options['report']:
+                outcomes = self._counted(outcomes, counts)
+                for line in bulk.report_lines(outcomes, options['report']):
+                    self.stdout.write(line, ending='')
+            else:
+                for outcome in outcomes:
+                    counts[outcome['status']] += 1
+        finally:
+            if source is not sys.stdin.buffer:
+                source.close()
+
+        summary = ', '.join(f'{status}: {count}' for status, count in sorted(counts.items()))
+        self.stderr.write(summary or 'No rows')
+        self.stderr.write(self.style.SUCCESS(
+            f"Successfully enrolled {counts['enrolled']} students in {course.title}"
+        ))
+
+    @staticmethod
+    def _counted(outcomes, counts):
+        for outcome in outcomes:
+            counts[outcome['status']] += 1
+            yield outcome
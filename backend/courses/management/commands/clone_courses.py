@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from courses.cloning import clone_courses
+
+class Command(BaseCommand):
+    help = 'Copies courses, with their modules, sections, lessons and files, as new drafts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('course_ids', nargs='+', type=int, help='IDs of the courses to copy')
+        parser.add_argument(
+            '--instructor',
+            help='Username of the instructor who owns the copies (default: the original instructors)'
+        )
+        parser.add_argument(
+            '--title-format',
+            default='{title} (copy)',
+            help='Title of each copy; {title} is replaced by the original title'
+        )
+        parser.add_argument(
+            '--course-version',
+            help='Version to give the copies'
+        )
+
+    def handle(self, *args, **options):
+        instructor = None
+        if options['instructor']:
+            instructor = User.objects.filter(username=options['instructor']).first()
+            if instructor is None:
+                raise CommandError(f"No user named {options['instructor']}")
+
+        course_map = clone_courses(
+            options['course_ids'],
+            instructor=instructor,
+            title_format=options['title_format'],
+            version=options['course_version'],
+        )
+        for old_id, new_id in sorted(course_map.items()):
+            self.stdout.write(f'Course {old_id} -> {new_id}')
+        missing = set(options['course_ids']) - set(course_map)
+        if missing:
+            self.stdout.write(self.style.WARNING(f'No such courses: {sorted(missing)}'))
+        self.stdout.write(self.style.SUCCESS(f'Successfully cloned {len(course_map)} courses'))
@@ -0,0 +1,25 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from courses.images import DERIVATIVE_WIDTHS, generate_derivatives, is_stale
+
+class Command(BaseCommand):
+    help = 'Generates resized variants of existing course thumbnails, covers and profile pictures'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Rebuild variants even where they are up to date'
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        for (app_label, model_name), fields in DERIVATIVE_WIDTHS.items():
+            model = apps.get_model(app_label, model_name)
+            queryset = model._default_manager.only('pk', 'image_variants', *fields).order_by('pk')
+            for instance in queryset.iterator(chunk_size=500):
+                if options['force'] or any(is_stale(instance, name) for name in fields):
+                    total += generate_derivatives(app_label, model_name, instance.pk, force=options['force'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully generated derivatives for {total} images')
+        )
@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from courses.models import Job
+
+class Command(BaseCommand):
+    help = 'Deletes finished background jobs older than the given age'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=7,
+            help='Delete done and failed jobs that finished more than this many days ago'
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        deleted, _ = Job.objects.filter(status__in=['done', 'failed'], finished_at__lt=cutoff).delete()
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully deleted {deleted} finished jobs')
+        )
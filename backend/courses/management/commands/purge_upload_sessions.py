@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from courses.models import UploadSession
+from courses.uploads import discard
+
+class Command(BaseCommand):
+    help = 'Removes chunked upload sessions, and their partial files, that have been idle too long'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours',
+            type=int,
+            default=24,
+            help='Remove sessions not written to for this many hours'
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        stale = UploadSession.objects.filter(updated_at__lt=cutoff)
+        count = 0
+        for session in stale.only('id').iterator():
+            discard(session)
+            count += 1
+        stale.delete()
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully removed {count} upload sessions')
+        )
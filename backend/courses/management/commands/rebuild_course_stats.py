@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from courses.models import CourseStats
+
+class Command(BaseCommand):
+    help = 'Rebuilds the denormalized course stats (ratings, students, lessons) from scratch'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--course',
+            type=int,
+            action='append',
+            dest='course_ids',
+            help='Only rebuild stats for this course ID (can be repeated)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of stats rows written per bulk upsert'
+        )
+
+    def handle(self, *args, **options):
+        count = CourseStats.rebuild(
+            course_ids=options['course_ids'],
+            batch_size=options['batch_size']
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully rebuilt stats for {count} courses')
+        )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+from courses import search
+
+class Command(BaseCommand):
+    help = 'Creates the course full-text search index if needed and rebuilds it from scratch'
+
+    def handle(self, *args, **options):
+        if not search.create_index():
+            raise CommandError('The course search index requires SQLite with FTS5')
+        count = search.rebuild_index()
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully indexed {count} courses')
+        )
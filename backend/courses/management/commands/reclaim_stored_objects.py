@@ -0,0 +1,57 @@
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from courses import contentstore
+from courses.models import StoredObject
+
+class Command(BaseCommand):
+    help = 'Deletes content-addressed files that no module, section or file references any more'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-minutes',
+            type=int,
+            default=60,
+            help='Only reclaim objects unreferenced and untouched for at least this long'
+        )
+        parser.add_argument(
+            '--recount',
+            action='store_true',
+            help='Recompute every reference count from the database first'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would be reclaimed without deleting anything'
+        )
+
+    def handle(self, *args, **options):
+        if options['recount']:
+            contentstore.recount()
+
+        cutoff = timezone.now() - timedelta(minutes=options['grace_minutes'])
+        candidates = StoredObject.objects.filter(ref_count=0, updated_at__lt=cutoff)
+
+        reclaimed = 0
+        reclaimed_bytes = 0
+        for stored in candidates.only('id', 'path', 'size').iterator():
+            if options['dry_run']:
+                self.stdout.write(f'Would reclaim {stored.path} ({stored.size} bytes)')
+            else:
+                # Re-check in the delete itself, in case an upload just re-used it
+                deleted, _ = StoredObject.objects.filter(
+                    pk=stored.pk, ref_count=0, updated_at__lt=cutoff
+                ).delete()
+                if not deleted:
+                    continue
+                default_storage.delete(stored.path)
+            reclaimed += 1
+            reclaimed_bytes += stored.size
+
+        verb = 'Would reclaim' if options['dry_run'] else 'Successfully reclaimed'
+        self.stdout.write(
+            self.style.SUCCESS(f'{verb} {reclaimed} stored objects ({reclaimed_bytes} bytes)')
+        )
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from courses import seats
+
+class Command(BaseCommand):
+    help = (
+        'Recounts the free seats of capped courses from their enrollments and moves '
+        'waitlisted students into freed seats; meant to run periodically, e.g. from cron'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--course',
+            type=int,
+            action='append',
+            dest='course_ids',
+            help='Only reconcile this course ID (can be repeated)'
+        )
+        parser.add_argument(
+            '--exact',
+            action='store_true',
+            help=(
+                'Also raise counters to the recount, e.g. to recover leaked seats; '
+                'only safe while no enrollments are being made'
+            )
+        )
+
+    def handle(self, *args, **options):
+        count = seats.reconcile(course_ids=options['course_ids'], exact=options['exact'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully reconciled seats for {count} courses')
+        )
@@ -0,0 +1,87 @@
+import multiprocessing
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from courses import jobs
+
+def _run_process(index, stop, poll_interval, burst):
+    # Children must not reuse the parent's database connections
+    connections.close_all()
+    # The parent turns SIGINT/SIGTERM into `stop`, so the current job can finish
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    jobs.work(jobs.worker_name(index), stop, poll_interval, burst)
+
+class Command(BaseCommand):
+    help = 'Runs background jobs from the database queue until interrupted'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=2,
+            help='Number of jobs to run at the same time'
+        )
+        parser.add_argument(
+            '--processes',
+            action='store_true',
+            help='Run each worker in its own process instead of a thread'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Seconds an idle worker waits before looking for jobs again'
+        )
+        parser.add_argument(
+            '--burst',
+            action='store_true',
+            help='Exit once no job is due instead of waiting for more'
+        )
+
+    def handle(self, *args, **options):
+        count = max(options['workers'], 1)
+        poll_interval = options['poll_interval']
+        burst = options['burst']
+
+        if options['processes']:
+            stop = multiprocessing.Event()
+            connections.close_all()
+            workers = [
+                multiprocessing.Process(
+                    target=_run_process, args=(index, stop, poll_interval, burst), daemon=True
+                )
+                for index in range(count)
+            ]
+        else:
+            stop = threading.Event()
+            workers = [
+                threading.Thread(
+                    target=jobs.work,
+                    args=(jobs.worker_name(index), stop, poll_interval, burst),
+                    name=f'job-worker-{index}',
+                    daemon=True,
+                )
+                for index in range(count)
+            ]
+
+        # Let running jobs finish on SIGTERM or Ctrl-C
+        signal.signal(signal.SIGTERM, lambda *args: stop.set())
+        kind = 'processes' if options['processes'] else 'threads'
+        self.stdout.write(f'Starting {count} job worker {kind}')
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                while worker.is_alive():
+                    worker.join(0.5)
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping after the current jobs finish')
+            stop.set()
+            for worker in workers:
+                worker.join()
+
+        self.stdout.write(self.style.SUCCESS('Successfully stopped job workers'))
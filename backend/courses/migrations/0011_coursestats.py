@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Avg, Count, F, Sum
+
+
+def populate_course_stats(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    CourseStats = apps.get_model('courses', 'CourseStats')
+    Review = apps.get_model('courses', 'Review')
+    Lesson = apps.get_model('courses', 'Lesson')
+    Enrollment = apps.get_model('enrollments', 'Enrollment')
+
+    ratings = {
+        row['course_id']: row
+        for row in Review.objects.values('course_id').annotate(avg=Avg('rating'), count=Count('id'))
+    }
+    students = dict(
+        Enrollment.objects.filter(status='active').values('course_id')
+        .annotate(count=Count('id')).values_list('course_id', 'count')
+    )
+    lessons = {
+        row['course']: row
+        for row in Lesson.objects.filter(section__module__isnull=False)
+        .values(course=F('section__module__course_id'))
+        .annotate(count=Count('id'), duration=Sum('duration'))
+    }
+
+    CourseStats.objects.bulk_create([
+        CourseStats(
+            course_id=course_id,
+            average_rating=round(ratings.get(course_id, {}).get('avg') or 0, 2),
+            rating_count=ratings.get(course_id, {}).get('count', 0),
+            active_students=students.get(course_id, 0),
+            lesson_count=lessons.get(course_id, {}).get('count', 0),
+            total_duration=lessons.get(course_id, {}).get('duration') or 0,
+        )
+        for course_id in Course.objects.values_list('id', flat=True)
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0010_course_is_free'),
+        ('enrollments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('average_rating', models.FloatField(default=0.0)),
+                ('rating_count', models.PositiveIntegerField(default=0)),
+                ('active_students', models.PositiveIntegerField(default=0)),
+                ('lesson_count', models.PositiveIntegerField(default=0)),
+                ('total_duration', models.PositiveIntegerField(default=0, help_text='Duration in minutes')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='courses.course')),
+            ],
+            options={
+                'verbose_name_plural': 'Course stats',
+            },
+        ),
+        migrations.RunPython(populate_course_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+from django.db import migrations
+
+# Kept inline so the migration does not depend on the current courses.search
+CREATE_INDEX_SQL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS courses_course_fts USING fts5("
+    "title, description, instructor, category, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+)
+
+FILL_INDEX_SQL = """
+    INSERT INTO courses_course_fts (rowid, title, description, instructor, category)
+    SELECT c.id,
+           c.title,
+           c.description,
+           TRIM(u.username || ' ' || COALESCE(u.first_name, '') || ' ' || COALESCE(u.last_name, '')),
+           COALESCE(cat.name, '')
+    FROM courses_course c
+    JOIN accounts_user u ON u.id = c.instructor_id
+    LEFT JOIN courses_category cat ON cat.id = c.category_id
+"""
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_INDEX_SQL)
+    schema_editor.execute("DELETE FROM courses_course_fts")
+    schema_editor.execute(FILL_INDEX_SQL)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS courses_course_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0012_course_catalog_cursor_idx'),
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:30
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0013_course_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coursestats',
+            name='content_updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text='Last time a module, section or lesson of the course changed or was removed'),
+        ),
+    ]
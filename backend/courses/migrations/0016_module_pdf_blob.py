@@ -0,0 +1,89 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:50
+
+import hashlib
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+# PDFs can be several MB each, so only a few are held in memory at a time
+CHUNK_SIZE = 20
+
+
+def move_pdf_blobs(apps, schema_editor):
+    Module = apps.get_model('courses', 'Module')
+    ModulePdf = apps.get_model('courses', 'ModulePdf')
+
+    module_ids = list(
+        Module.objects.filter(pdf_binary__isnull=False).order_by('id').values_list('id', flat=True)
+    )
+    for start in range(0, len(module_ids), CHUNK_SIZE):
+        chunk = module_ids[start:start + CHUNK_SIZE]
+        for module_id, data in Module.objects.filter(id__in=chunk).values_list('id', 'pdf_binary'):
+            data = bytes(data or b'')
+            if not data:
+                continue
+            blob = ModulePdf.objects.create(data=data)
+            Module.objects.filter(pk=module_id).update(
+                pdf_blob=blob,
+                has_pdf=True,
+                pdf_size=len(data),
+                pdf_checksum=hashlib.sha256(data).hexdigest(),
+            )
+
+
+def restore_pdf_blobs(apps, schema_editor):
+    Module = apps.get_model('courses', 'Module')
+    ModulePdf = apps.get_model('courses', 'ModulePdf')
+
+    module_ids = list(
+        Module.objects.filter(pdf_blob__isnull=False).order_by('id').values_list('id', flat=True)
+    )
+    for start in range(0, len(module_ids), CHUNK_SIZE):
+        chunk = module_ids[start:start + CHUNK_SIZE]
+        for module_id, blob_id in Module.objects.filter(id__in=chunk).values_list('id', 'pdf_blob_id'):
+            data = ModulePdf.objects.filter(pk=blob_id).values_list('data', flat=True).first()
+            Module.objects.filter(pk=module_id).update(pdf_binary=data)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0015_courserecommendation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModulePdf',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.BinaryField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='module',
+            name='has_pdf',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='module',
+            name='pdf_checksum',
+            field=models.CharField(blank=True, default='', help_text='SHA-256 of the stored PDF', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='module',
+            name='pdf_size',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='module',
+            name='pdf_blob',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='module', to='courses.modulepdf'),
+        ),
+        migrations.RunPython(move_pdf_blobs, restore_pdf_blobs),
+        migrations.RemoveField(
+            model_name='module',
+            name='pdf_binary',
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:00
+
+import courses.contentstore
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0016_module_pdf_blob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredObject',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('path', models.CharField(max_length=255, unique=True)),
+                ('size', models.PositiveBigIntegerField()),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='file',
+            name='file',
+            field=courses.contentstore.ContentAddressedFileField(upload_to='section_files/'),
+        ),
+        migrations.AlterField(
+            model_name='module',
+            name='pdf_file',
+            field=courses.contentstore.ContentAddressedFileField(blank=True, null=True, upload_to='module_pdfs/'),
+        ),
+        migrations.AlterField(
+            model_name='section',
+            name='pdf_file',
+            field=courses.contentstore.ContentAddressedFileField(blank=True, null=True, upload_to='course_pdfs/'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:00
+
+from django.db import migrations, models
+
+
+def number_lessons(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    Lesson = apps.get_model('courses', 'Lesson')
+
+    # Existing lessons are numbered in outline order, course by course
+    lessons = Lesson.objects.filter(section__module__isnull=False).order_by(
+        'section__module__course_id', 'section__module__order', 'section__order', 'order', 'id'
+    ).values_list('id', 'section__module__course_id')
+    counts = {}
+    numbered = []
+    for lesson_id, course_id in lessons.iterator():
+        numbered.append(Lesson(id=lesson_id, ordinal=counts.get(course_id, 0)))
+        counts[course_id] = counts.get(course_id, 0) + 1
+    Lesson.objects.bulk_update(numbered, ['ordinal'], batch_size=500)
+    Course.objects.bulk_update(
+        [Course(id=course_id, lesson_ordinals=count) for course_id, count in counts.items()],
+        ['lesson_ordinals'],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0020_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='lesson_ordinals',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='ordinal',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(number_lessons, migrations.RunPython.noop),
+    ]
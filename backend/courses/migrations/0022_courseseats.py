@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_seats(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    CourseSeats = apps.get_model('courses', 'CourseSeats')
+    Enrollment = apps.get_model('enrollments', 'Enrollment')
+
+    capped = dict(Course.objects.filter(max_students__gt=0).values_list('id', 'max_students'))
+    holding = dict(
+        Enrollment.objects.filter(course_id__in=list(capped), status__in=['active', 'pending'])
+        .values('course_id').annotate(count=Count('id')).values_list('course_id', 'count')
+    )
+    CourseSeats.objects.bulk_create(
+        [
+            CourseSeats(course_id=course_id, seats_left=max(max_students - holding.get(course_id, 0), 0))
+            for course_id, max_students in capped.items()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0021_lesson_ordinal'),
+        ('enrollments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseSeats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seats_left', models.PositiveIntegerField(default=0)),
+                ('reconciled_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='seats', to='courses.course')),
+            ],
+            options={
+                'verbose_name_plural': 'Course seats',
+            },
+        ),
+        migrations.RunPython(count_seats, migrations.RunPython.noop),
+    ]
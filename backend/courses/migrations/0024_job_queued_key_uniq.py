@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:30
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def drop_duplicate_queued_jobs(apps, schema_editor):
+    Job = apps.get_model('courses', 'Job')
+
+    # Racing enqueues may have queued a key twice; the earliest job stays
+    queued = Job.objects.filter(status='queued').exclude(key='')
+    keep = queued.values('key').annotate(first=Min('id')).values_list('first', flat=True)
+    queued.exclude(id__in=list(keep)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0023_cacheversion'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_queued_jobs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='job',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'queued'), models.Q(('key', ''), _negated=True)), fields=('key',), name='job_queued_key_uniq'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:50
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def fill_rating_total(apps, schema_editor):
+    CourseStats = apps.get_model('courses', 'CourseStats')
+    Review = apps.get_model('courses', 'Review')
+
+    # Ratings are applied as deltas from now on, so the running sum starts from the stored reviews
+    totals = Review.objects.values('course_id').annotate(total=Sum('rating')).values_list('course_id', 'total')
+    for course_id, total in totals:
+        CourseStats.objects.filter(course_id=course_id).update(rating_total=total or 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0025_paymentorder'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coursestats',
+            name='rating_total',
+            field=models.PositiveIntegerField(default=0, help_text='Sum of all ratings'),
+        ),
+        migrations.RunPython(fill_rating_total, migrations.RunPython.noop),
+    ]
@@ -1,11 +1,23 @@
+import hashlib
+import os
+import uuid
+
 from django.db import models
 from django.conf import settings
 from django.utils.text import slugify
 from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models import Avg, Case, Count, ExpressionWrapper, F, Sum, Value, When
+from django.db.models.functions import Greatest, Round
+from django.db.models.lookups import GreaterThan
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
 from django.dispatch import receiver
+from django.apps import apps
+
+from . import contentstore
+from .contentstore import ContentAddressedFileField
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
@@ -78,6 +90,10 @@ class Course(models.Model):
     duration_in_weeks = models.IntegerField(default=1)
     cover_image = models.ImageField(upload_to='course_covers/', null=True, blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    # Resized variants of thumbnail and cover_image, see courses/images.py
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    # Lesson ordinals handed out so far, see enrollments/completion.py
+    lesson_ordinals = models.PositiveIntegerField(default=0, editable=False)
     
     class Meta:
         ordering = ['-created_at']
@@ -86,6 +102,7 @@ class Course(models.Model):
             models.Index(fields=['instructor']),
             models.Index(fields=['is_published']),
             models.Index(fields=['difficulty_level']),
+            models.Index(fields=['is_published', '-created_at', '-id'], name='course_catalog_cursor_idx'),
         ]
     
     def __str__(self):
@@ -103,6 +120,145 @@ class Course(models.Model):
             pass  # Analytics don't exist, which is fine
         super().delete(*args, **kwargs)
 
+    @classmethod
+    def allocate_lesson_ordinals(cls, course_id, count=1):
+        """
+        Reserve `count` new lesson ordinals for the course and return them as
+        a range. Ordinals are never handed out twice, even after deletes.
+        """
+        with transaction.atomic():
+            cls.objects.filter(pk=course_id).update(lesson_ordinals=models.F('lesson_ordinals') + count)
+            end = cls.objects.filter(pk=course_id).values_list('lesson_ordinals', flat=True).first()
+        if end is None:
+            return range(0)
+        return range(end - count, end)
+
+class StoredObject(models.Model):
+    """
+    One physical file in the content-addressed store, shared by every
+    module, section and file whose upload had the same SHA-256.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    path = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.path} ({self.ref_count} refs)"
+
+class UploadSession(models.Model):
+    """A resumable chunked upload of a module/section PDF or section file, see courses/uploads.py"""
+    TARGETS = (
+        ('module', 'Module PDF'),
+        ('section', 'Section PDF'),
+        ('file', 'Section file'),
+    )
+    STATUSES = (
+        ('open', 'Open'),
+        ('complete', 'Complete'),
+        ('aborted', 'Aborted'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='upload_sessions')
+    target = models.CharField(max_length=10, choices=TARGETS)
+    target_id = models.PositiveIntegerField()
+    file_type = models.CharField(max_length=10, default='pdf')
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    sha256 = models.CharField(max_length=64, blank=True, default='')
+    received = models.PositiveBigIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUSES, default='open')
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size})"
+
+class Job(models.Model):
+    """A unit of background work run by the run_worker command, see courses/jobs.py"""
+    STATUSES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+
+    name = models.CharField(max_length=200, help_text='Dotted path of the function to run')
+    kwargs = models.JSONField(default=dict, blank=True)
+    key = models.CharField(max_length=200, blank=True, default='', db_index=True,
+                           help_text='Queued jobs with the same key are coalesced')
+    priority = models.SmallIntegerField(default=0, help_text='Higher runs first')
+    status = models.CharField(max_length=10, choices=STATUSES, default='queued')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    locked_until = models.DateTimeField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-priority', 'run_at', 'id']
+        indexes = [
+            models.Index(fields=['status', '-priority', 'run_at'], name='job_claim_idx'),
+        ]
+        constraints = [
+            # At most one queued job per key, however many requests enqueue at once
+            models.UniqueConstraint(
+                fields=['key'],
+                condition=models.Q(status='queued') & ~models.Q(key=''),
+                name='job_queued_key_uniq',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+class PaymentOrder(models.Model):
+    """
+    A Razorpay order, stored as soon as Razorpay has created it so that a
+    retried order job reuses it, see courses/payments.py
+    """
+    receipt = models.CharField(max_length=40, unique=True)
+    order_id = models.CharField(max_length=100, unique=True)
+    course = models.ForeignKey('Course', on_delete=models.CASCADE, related_name='payment_orders')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='payment_orders')
+    amount = models.PositiveIntegerField(help_text='In paise')
+    currency = models.CharField(max_length=3, default='INR')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.order_id} ({self.receipt})"
+
+class CacheVersion(models.Model):
+    """
+    Version of a cache built from course data, shared by every process, see
+    courses/versions.py
+    """
+    name = models.CharField(max_length=50, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+class ModulePdf(models.Model):
+    """
+    PDF bytes stored in the database for a module. They live in their own
+    table so that loading modules never pulls the binary into memory.
+    """
+    data = models.BinaryField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Module PDF {self.pk}"
+
 class Module(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='modules')
     title = models.CharField(max_length=200)
@@ -125,11 +281,14 @@ class Module(models.Model):
     video_id = models.CharField(max_length=100, blank=True, null=True, help_text="YouTube video ID for embedding")
     
     # Fields for PDF content
-    pdf_file = models.FileField(upload_to='module_pdfs/', blank=True, null=True)
+    pdf_file = ContentAddressedFileField(upload_to='module_pdfs/', blank=True, null=True)
     pdf_url = models.URLField(max_length=500, blank=True, null=True)
     
-    # Field for storing PDF directly in database
-    pdf_binary = models.BinaryField(blank=True, null=True)
+    # PDF stored directly in the database, in a separate blob table
+    pdf_blob = models.OneToOneField(ModulePdf, on_delete=models.SET_NULL, blank=True, null=True, related_name='module')
+    has_pdf = models.BooleanField(default=False)
+    pdf_size = models.PositiveIntegerField(default=0)
+    pdf_checksum = models.CharField(max_length=64, blank=True, default='', help_text="SHA-256 of the stored PDF")
     pdf_filename = models.CharField(max_length=255, blank=True, null=True)
     pdf_content_type = models.CharField(max_length=100, blank=True, null=True, default='application/pdf')
     
@@ -145,7 +304,7 @@ class Module(models.Model):
         Override save to handle file handling and keep content_type updated
         """
         # Update content type based on available content
-        if self.pdf_file or self.pdf_url or self.pdf_binary:
+        if self.pdf_file or self.pdf_url or self.has_pdf:
             if self.video_url or self.video_id:
                 self.content_type = 'both'
             else:
@@ -153,20 +312,25 @@ class Module(models.Model):
         elif self.video_url or self.video_id:
             self.content_type = 'video'
             
-        # If PDF file is uploaded, set the URL for convenience
-        # and save binary data to pdf_binary field
-        if self.pdf_file and not self.pdf_url:
-            need_url_update = True
+        # A newly uploaded PDF goes to the content-addressed store once;
+        # it replaces any copy kept in the database
+        if self.pdf_file and not self.pdf_file._committed:
+            stored = contentstore.put(self.pdf_file.file, self.pdf_file.name, self.pdf_file.storage)
+            self.pdf_filename = os.path.basename(self.pdf_file.name)
+            self.pdf_file = stored.path
+            if self.pdf_blob_id:
+                ModulePdf.objects.filter(pk=self.pdf_blob_id).delete()
+                self.pdf_blob = None
+            self.has_pdf = True
+            self.pdf_size = stored.size
+            self.pdf_checksum = stored.sha256
+        elif not self.pdf_file and not self.pdf_blob_id:
+            self.has_pdf = False
+            self.pdf_size = 0
+            self.pdf_checksum = ''
             
-            # Read the binary data from the file and store it in the pdf_binary field
-            try:
-                self.pdf_file.seek(0)  # Go to the start of the file
-                self.pdf_binary = self.pdf_file.read()  # Read the binary data
-                self.pdf_filename = self.pdf_file.name  # Store the filename
-            except Exception as e:
-                print(f"Error reading PDF file: {str(e)}")
-        else:
-            need_url_update = False
+        # If PDF file is uploaded, set the URL for convenience
+        need_url_update = bool(self.pdf_file and not self.pdf_url)
             
         # Save the model first to ensure file is saved
         super().save(*args, **kwargs)
@@ -181,12 +345,40 @@ class Module(models.Model):
             except Exception as e:
                 print(f"Error updating PDF URL: {str(e)}")
     
+    def set_pdf_data(self, data, filename=None, content_type=None):
+        """
+        Store `data` as the module's PDF blob and refresh has_pdf, pdf_size
+        and pdf_checksum. The blob row is written at once; the module's own
+        fields are persisted by the next save().
+        """
+        if filename:
+            self.pdf_filename = filename
+        if content_type:
+            self.pdf_content_type = content_type
+        if not data:
+            if self.pdf_blob_id:
+                ModulePdf.objects.filter(pk=self.pdf_blob_id).delete()
+            self.pdf_blob = None
+            self.has_pdf = False
+            self.pdf_size = 0
+            self.pdf_checksum = ''
+            return
+        data = bytes(data)
+        # Overwrite the existing blob in place; create one if there is none
+        if not (self.pdf_blob_id and ModulePdf.objects.filter(pk=self.pdf_blob_id).update(data=data)):
+            self.pdf_blob = ModulePdf.objects.create(data=data)
+        self.has_pdf = True
+        self.pdf_size = len(data)
+        self.pdf_checksum = hashlib.sha256(data).hexdigest()
+
     def get_pdf_data(self):
         """
         Return the PDF binary data, either from the database or from the file
         """
-        if self.pdf_binary:
-            return self.pdf_binary
+        if self.has_pdf and self.pdf_blob_id:
+            data = ModulePdf.objects.filter(pk=self.pdf_blob_id).values_list('data', flat=True).first()
+            if data is not None:
+                return bytes(data)
         elif self.pdf_file:
             try:
                 self.pdf_file.open('rb')
@@ -249,7 +441,7 @@ class Section(models.Model):
     pdf_url = models.URLField(max_length=500, blank=True, null=True)
     
     # Add field for storing PDF files directly
-    pdf_file = models.FileField(upload_to='course_pdfs/', blank=True, null=True)
+    pdf_file = ContentAddressedFileField(upload_to='course_pdfs/', blank=True, null=True)
     video_id = models.CharField(max_length=100, blank=True, null=True, help_text="YouTube video ID for embedding")
 
     class Meta:
@@ -317,6 +509,8 @@ class Lesson(models.Model):
     allow_download = models.BooleanField(default=False)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
+    # Bit position in Enrollment.completion_bitmap, unique within the course
+    ordinal = models.PositiveIntegerField(null=True, blank=True, editable=False)
 
     class Meta:
         ordering = ['order']
@@ -325,6 +519,15 @@ class Lesson(models.Model):
     def __str__(self):
         return f"{self.section.title} - {self.title}"
 
+    def save(self, *args, **kwargs):
+        if self.ordinal is None:
+            course_id = _lesson_course_id(self)
+            if course_id is not None:
+                ordinals = Course.allocate_lesson_ordinals(course_id)
+                if ordinals:
+                    self.ordinal = ordinals[0]
+        super().save(*args, **kwargs)
+
 class Quiz(models.Model):
     lesson = models.OneToOneField(Lesson, on_delete=models.CASCADE, related_name='quiz')
     title = models.CharField(max_length=200)
@@ -386,6 +589,13 @@ class Review(models.Model):
     def __str__(self):
         return f"{self.user.username}'s review for {self.course.title}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The course's rating total moves by the change of a loaded rating
+        instance._loaded_rating = instance.__dict__.get('rating')
+        return instance
+
 class CourseTag(models.Model):
     name = models.CharField(max_length=50, unique=True)
     description = models.TextField(blank=True)
@@ -409,7 +619,7 @@ class File(models.Model):
     )
     
     section = models.ForeignKey(Section, on_delete=models.CASCADE, related_name='files')
-    file = models.FileField(upload_to='section_files/')
+    file = ContentAddressedFileField(upload_to='section_files/')
     file_type = models.CharField(max_length=10, choices=FILE_TYPES, default='pdf')
     name = models.CharField(max_length=255, blank=True)
     description = models.TextField(blank=True)
@@ -444,6 +654,422 @@ class UserProgress(models.Model):
     def __str__(self):
         return f"{self.user.username}'s progress on {self.lesson.title}"
 
+class CourseStats(models.Model):
+    """
+    Denormalized per-course counters read by the catalog and detail views.
+    Rating and student counters move with F() deltas in one UPDATE when a
+    Review or Enrollment is created, deleted or changes its rating or
+    status, so concurrent writes never overwrite each other. Lesson
+    counters are re-aggregated when a Lesson changes. rebuild() recounts
+    everything from the source tables to repair drift.
+    """
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, related_name='stats')
+    average_rating = models.FloatField(default=0.0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_total = models.PositiveIntegerField(default=0, help_text='Sum of all ratings')
+    active_students = models.PositiveIntegerField(default=0)
+    lesson_count = models.PositiveIntegerField(default=0)
+    total_duration = models.PositiveIntegerField(default=0, help_text='Duration in minutes')
+    updated_at = models.DateTimeField(auto_now=True)
+    content_updated_at = models.DateTimeField(
+        default=timezone.now,
+        help_text='Last time a module, section or lesson of the course changed or was removed'
+    )
+
+    class Meta:
+        verbose_name_plural = 'Course stats'
+
+    def __str__(self):
+        return f"Stats for {self.course.title}"
+
+    @staticmethod
+    def lesson_values(course_id):
+        result = Lesson.objects.filter(section__module__course_id=course_id).aggregate(
+            count=Count('id'), duration=Sum('duration')
+        )
+        return {
+            'lesson_count': result['count'],
+            'total_duration': result['duration'] or 0,
+        }
+
+    @classmethod
+    def refresh(cls, course_id, values):
+        """
+        Write freshly aggregated counters for one course. Only existing rows
+        are updated so a cascading course delete never recreates them.
+        """
+        if course_id is None:
+            return
+        with transaction.atomic():
+            cls.objects.filter(course_id=course_id).update(
+                updated_at=timezone.now(), **values(course_id)
+            )
+
+    @classmethod
+    def add(cls, course_id, **deltas):
+        """
+        Move counters of one course by `deltas` in a single UPDATE.
+        average_rating follows rating_count and rating_total.
+        """
+        deltas = {name: delta for name, delta in deltas.items() if delta}
+        if course_id is None or not deltas:
+            return
+        values = {
+            name: Greatest(F(name) + delta, Value(0)) for name, delta in deltas.items()
+        }
+        if 'rating_count' in deltas or 'rating_total' in deltas:
+            count = F('rating_count') + deltas.get('rating_count', 0)
+            total = F('rating_total') + deltas.get('rating_total', 0)
+            values['average_rating'] = Case(
+                When(GreaterThan(count, 0), then=Round(
+                    ExpressionWrapper(total * 1.0 / count, output_field=models.FloatField()), 2
+                )),
+                default=Value(0.0),
+                output_field=models.FloatField(),
+            )
+        cls.objects.filter(course_id=course_id).update(updated_at=timezone.now(), **values)
+
+    @classmethod
+    def touch_content(cls, course_id):
+        if course_id is not None:
+            cls.objects.filter(course_id=course_id).update(content_updated_at=timezone.now())
+
+    @classmethod
+    def rebuild(cls, course_ids=None, batch_size=500):
+        """
+        Recompute stats for the given courses (or all of them) with one grouped
+        query per counter group and upsert the results in batches.
+        """
+        Enrollment = apps.get_model('enrollments', 'Enrollment')
+        courses = Course.objects.all()
+        reviews = Review.objects.all()
+        enrollments = Enrollment.objects.filter(status='active')
+        lessons = Lesson.objects.filter(section__module__isnull=False)
+        if course_ids is not None:
+            courses = courses.filter(id__in=course_ids)
+            reviews = reviews.filter(course_id__in=course_ids)
+            enrollments = enrollments.filter(course_id__in=course_ids)
+            lessons = lessons.filter(section__module__course_id__in=course_ids)
+
+        ratings = {
+            row['course_id']: row for row in
+            reviews.values('course_id').annotate(avg=Avg('rating'), count=Count('id'), total=Sum('rating'))
+        }
+        students = dict(
+            enrollments.values('course_id').annotate(count=Count('id')).values_list('course_id', 'count')
+        )
+        lesson_totals = {
+            row['course']: row for row in
+            lessons.values(course=models.F('section__module__course_id')).annotate(
+                count=Count('id'), duration=Sum('duration')
+            )
+        }
+
+        now = timezone.now()
+        stats = []
+        for course_id in courses.values_list('id', flat=True).iterator():
+            rating = ratings.get(course_id, {})
+            lesson = lesson_totals.get(course_id, {})
+            stats.append(cls(
+                course_id=course_id,
+                average_rating=round(rating.get('avg') or 0, 2),
+                rating_count=rating.get('count', 0),
+                rating_total=rating.get('total') or 0,
+                active_students=students.get(course_id, 0),
+                lesson_count=lesson.get('count', 0),
+                total_duration=lesson.get('duration') or 0,
+                updated_at=now,
+            ))
+
+        with transaction.atomic():
+            cls.objects.bulk_create(
+                stats,
+                batch_size=batch_size,
+                update_conflicts=True,
+                unique_fields=['course'],
+                update_fields=[
+                    'average_rating', 'rating_count', 'rating_total', 'active_students',
+                    'lesson_count', 'total_duration', 'updated_at',
+                ],
+            )
+        return len(stats)
+
+class CourseSeats(models.Model):
+    """
+    Free seats of a course with max_students set, taken and given back with
+    conditional UPDATEs by courses/seats.py and reconciled periodically
+    against the course's active and pending enrollments.
+    """
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, related_name='seats')
+    seats_left = models.PositiveIntegerField(default=0)
+    reconciled_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'Course seats'
+
+    def __str__(self):
+        return f"{self.seats_left} seats left in {self.course.title}"
+
+class CourseRecommendation(models.Model):
+    """
+    Precomputed "students also enrolled in" neighbours of a course, ranked by
+    the cosine similarity of their enrollment sets. Rebuilt in bulk by the
+    build_course_recommendations command.
+    """
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='recommendations')
+    recommended_course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='recommended_by')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ['course', 'rank']
+        unique_together = ('course', 'rank')
+
+    def __str__(self):
+        return f"{self.course_id} -> {self.recommended_course_id} ({self.score:.3f})"
+
+def get_course_stats(course):
+    """Return the course's stats row, or None if it has not been built yet"""
+    try:
+        return course.stats
+    except CourseStats.DoesNotExist:
+        return None
+
+def _lesson_course_id(lesson):
+    # Also used for files, which hang off a section the same way
+    return Section.objects.filter(pk=lesson.section_id).values_list(
+        'module__course_id', flat=True
+    ).first()
+
+def _section_course_id(section):
+    return Module.objects.filter(pk=section.module_id).values_list('course_id', flat=True).first()
+
+@receiver(post_save, sender=Course)
+def create_course_stats(sender, instance, created, **kwargs):
+    if created and not kwargs.get('raw'):
+        CourseStats.objects.get_or_create(course=instance)
+
+@receiver(post_save, sender=Review)
+def update_course_rating_stats(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        CourseStats.add(instance.course_id, rating_count=1, rating_total=instance.rating)
+        changed = True
+    else:
+        change = instance.rating - getattr(instance, '_loaded_rating', instance.rating)
+        CourseStats.add(instance.course_id, rating_total=change)
+        changed = change != 0
+    instance._loaded_rating = instance.rating
+    # The catalog shows ratings only, so edits to a review's text leave it as it is
+    if changed:
+        from .conditional import touch_catalog
+        touch_catalog()
+
+@receiver(post_delete, sender=Review)
+def update_course_rating_stats_on_delete(sender, instance, **kwargs):
+    CourseStats.add(
+        instance.course_id, rating_count=-1,
+        rating_total=-getattr(instance, '_loaded_rating', instance.rating)
+    )
+    from .conditional import touch_catalog
+    touch_catalog()
+
+# Registered before release_course_seat, which moves _loaded_status on
+@receiver(post_save, sender='enrollments.Enrollment')
+def update_course_student_stats(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and 'status' not in update_fields):
+        return
+    was_active = not created and getattr(instance, '_loaded_status', None) == 'active'
+    change = (instance.status == 'active') - was_active
+    # Progress saves and other status changes leave the catalog's student count as it is
+    if change:
+        CourseStats.add(instance.course_id, active_students=change)
+        from .conditional import touch_catalog
+        touch_catalog()
+
+@receiver(post_delete, sender='enrollments.Enrollment')
+def update_course_student_stats_on_delete(sender, instance, **kwargs):
+    if instance.status == 'active':
+        CourseStats.add(instance.course_id, active_students=-1)
+        from .conditional import touch_catalog
+        touch_catalog()
+
+@receiver(post_save, sender='enrollments.Enrollment')
+@receiver(post_delete, sender='enrollments.Enrollment')
+def schedule_enrollment_analytics(sender, instance, raw=False, **kwargs):
+    if not raw:
+        from analytics.refresh import schedule_refresh
+        schedule_refresh(instance.course_id)
+
+@receiver(post_save, sender='enrollments.Enrollment')
+def release_course_seat(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    from .seats import HOLDING_STATUSES, release
+    if raw or (update_fields is not None and 'status' not in update_fields):
+        return
+    was_holding = getattr(instance, '_loaded_status', None) in HOLDING_STATUSES
+    if not created and was_holding and instance.status not in HOLDING_STATUSES:
+        release(instance.course_id)
+    instance._loaded_status = instance.status
+
+@receiver(post_delete, sender='enrollments.Enrollment')
+def release_course_seat_on_delete(sender, instance, **kwargs):
+    from .seats import HOLDING_STATUSES, release
+    if instance.status in HOLDING_STATUSES:
+        release(instance.course_id)
+
+@receiver(post_save, sender=Lesson)
+def update_course_lesson_stats(sender, instance, **kwargs):
+    course_id = _lesson_course_id(instance)
+    CourseStats.refresh(course_id, CourseStats.lesson_values)
+    CourseStats.touch_content(course_id)
+
+@receiver(pre_delete, sender=Lesson)
+def remember_lesson_course(sender, instance, **kwargs):
+    # The section may be gone by post_delete when a whole module is removed
+    instance._stats_course_id = _lesson_course_id(instance)
+
+@receiver(post_delete, sender=Lesson)
+def update_course_lesson_stats_on_delete(sender, instance, **kwargs):
+    course_id = getattr(instance, '_stats_course_id', None)
+    CourseStats.refresh(course_id, CourseStats.lesson_values)
+    CourseStats.touch_content(course_id)
+
+@receiver(post_save, sender=Lesson)
+def count_enrollment_lessons(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        from enrollments.completion import lessons_changed
+        lessons_changed(_lesson_course_id(instance), 1)
+
+@receiver(post_delete, sender=Lesson)
+def count_enrollment_lessons_on_delete(sender, instance, **kwargs):
+    from enrollments.completion import lessons_changed, schedule_sync
+    course_id = getattr(instance, '_stats_course_id', None)
+    lessons_changed(course_id, -1)
+    # Completions of the deleted lesson still count until the recount
+    schedule_sync(course_id)
+
+@receiver(post_save, sender=Module)
+@receiver(post_delete, sender=Module)
+def touch_course_content_for_module(sender, instance, **kwargs):
+    CourseStats.touch_content(instance.course_id)
+
+@receiver(post_delete, sender=Module)
+def delete_module_pdf_blob(sender, instance, **kwargs):
+    if instance.pdf_blob_id:
+        ModulePdf.objects.filter(pk=instance.pdf_blob_id).delete()
+
+@receiver(post_save, sender=Section)
+def touch_course_content_for_section(sender, instance, **kwargs):
+    CourseStats.touch_content(_section_course_id(instance))
+
+@receiver(pre_delete, sender=Section)
+def remember_section_course(sender, instance, **kwargs):
+    instance._stats_course_id = _section_course_id(instance)
+
+@receiver(post_delete, sender=Section)
+def touch_course_content_for_deleted_section(sender, instance, **kwargs):
+    CourseStats.touch_content(getattr(instance, '_stats_course_id', None))
+
+@receiver(post_save, sender=File)
+def touch_course_content_for_file(sender, instance, **kwargs):
+    CourseStats.touch_content(_lesson_course_id(instance))
+
+@receiver(pre_delete, sender=File)
+def remember_file_course(sender, instance, **kwargs):
+    instance._stats_course_id = _lesson_course_id(instance)
+
+@receiver(post_delete, sender=File)
+def touch_course_content_for_deleted_file(sender, instance, **kwargs):
+    CourseStats.touch_content(getattr(instance, '_stats_course_id', None))
+
+@receiver(m2m_changed, sender=Course.tags.through)
+def touch_course_content_for_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        for course_id in pk_set or []:
+            CourseStats.touch_content(course_id)
+    else:
+        CourseStats.touch_content(instance.pk)
+
+@receiver(post_save, sender=Course)
+def update_course_search_index(sender, instance, **kwargs):
+    if not kwargs.get('raw'):
+        from .search import index_course
+        index_course(instance.pk)
+
+@receiver(post_delete, sender=Course)
+def remove_course_from_search_index(sender, instance, **kwargs):
+    from .search import remove_course
+    remove_course(instance.pk)
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+@receiver(post_save, sender=Category)
+def invalidate_course_suggestions(sender, **kwargs):
+    from .suggest import bump_version
+    bump_version()
+
+@receiver(pre_save, sender=Course)
+def remember_course_publish_state(sender, instance, **kwargs):
+    # Also remembers the seat cap, from the same query
+    previous = Course.objects.filter(pk=instance.pk).values_list(
+        'is_published', 'max_students'
+    ).first() if instance.pk else None
+    instance._was_published = bool(previous and previous[0])
+    instance._previous_max_students = previous[1] if previous else None
+
+@receiver(post_save, sender=Course)
+def reconcile_course_seats(sender, instance, raw=False, **kwargs):
+    previous = getattr(instance, '_previous_max_students', None)
+    if not raw and instance.max_students != previous:
+        from .seats import resize
+        resize(instance, previous)
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def invalidate_published_catalog(sender, instance, **kwargs):
+    # Only published courses are listed and counted, so drafts can change freely
+    if instance.is_published or getattr(instance, '_was_published', False):
+        from .facets import bump_version
+        from .conditional import touch_catalog
+        bump_version()
+        touch_catalog()
+
+@receiver(post_save, sender=Category)
+def invalidate_category_catalog(sender, instance, created, **kwargs):
+    if not created:
+        from .facets import bump_version
+        from .conditional import touch_catalog
+        bump_version()
+        touch_catalog()
+
+@receiver(post_save, sender=Category)
+def update_category_search_index(sender, instance, created, **kwargs):
+    if not created and not kwargs.get('raw'):
+        from .search import index_category
+        index_category(instance.pk)
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def update_instructor_search_index(sender, instance, created, **kwargs):
+    if not created and not kwargs.get('raw'):
+        from .search import index_instructor
+        index_instructor(instance.pk)
+
+@receiver(post_save, sender=Course)
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def schedule_image_derivatives(sender, instance, raw=False, update_fields=None, **kwargs):
+    from .images import image_fields, is_stale, schedule_derivatives
+    fields = set(image_fields(sender))
+    if raw or instance.get_deferred_fields() & (fields | {'image_variants'}):
+        return
+    if update_fields is not None and not fields & set(update_fields):
+        return
+    if any(is_stale(instance, name) for name in fields):
+        schedule_derivatives(instance)
+
 @receiver(post_save, sender=Section)
 def update_pdf_url(sender, instance, created, **kwargs):
     """
@@ -0,0 +1,224 @@
+"""
+Cached module -> section -> lesson tree of a course.
+
+build_outline() loads the whole tree in four queries: modules, sections,
+lessons and files, each a values() projection in display order. The result
+is plain data with storage-relative URLs, cached under the course's
+content version (CourseStats.content_updated_at). Signals bump that
+version whenever a module, section, lesson or file is saved or deleted.
+Views turn the cached tree into their own response shapes with the
+formatters below, so request-specific parts like absolute URLs and
+per-user completion never end up in the cache.
+"""
+from urllib.parse import parse_qs, urlparse
+
+from django.core.cache import cache
+
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def youtube_video_id(url):
+    """Extract the video ID from a YouTube watch, short or embed URL"""
+    if not url:
+        return None
+    if 'youtube.com/watch' in url:
+        return parse_qs(urlparse(url).query).get('v', [None])[0]
+    if 'youtu.be/' in url:
+        return url.split('youtu.be/')[1].split('?')[0]
+    if 'youtube.com/embed/' in url:
+        return url.split('youtube.com/embed/')[1].split('?')[0]
+    return None
+
+
+def outline_version(course_id):
+    from .models import CourseStats
+    updated_at = CourseStats.objects.filter(course_id=course_id).values_list(
+        'content_updated_at', flat=True
+    ).first()
+    return updated_at.timestamp() if updated_at else None
+
+
+MODULE_FIELDS = (
+    'id', 'title', 'description', 'order', 'content_type', 'video_url',
+    'video_id', 'pdf_url', 'pdf_file', 'has_pdf'
+)
+SECTION_FIELDS = (
+    'id', 'module_id', 'title', 'description', 'order', 'content_type',
+    'video_url', 'video_id', 'pdf_url', 'pdf_file'
+)
+
+
+def assemble_outline(course_id, module_rows, section_rows):
+    """
+    The outline built from module and section rows (MODULE_FIELDS and
+    SECTION_FIELDS dicts, in display order), with lessons and files loaded
+    for it.
+    """
+    from .models import File, Lesson, Module, Section
+
+    module_storage = Module._meta.get_field('pdf_file').storage
+    section_storage = Section._meta.get_field('pdf_file').storage
+    file_storage = File._meta.get_field('file').storage
+
+    modules = []
+    modules_by_id = {}
+    for row in module_rows:
+        module = {
+            'id': row['id'],
+            'title': row['title'],
+            'description': row['description'],
+            'order': row['order'],
+            'content_type': row['content_type'],
+            'video_url': row['video_url'],
+            'video_id': row['video_id'] or youtube_video_id(row['video_url']),
+            'pdf_url': row['pdf_url'],
+            'pdf_file_url': module_storage.url(row['pdf_file']) if row['pdf_file'] else None,
+            'has_pdf_binary': row['has_pdf'],
+            'sections': [],
+        }
+        modules.append(module)
+        modules_by_id[module['id']] = module
+
+    sections_by_id = {}
+    for row in section_rows:
+        section = {
+            'id': row['id'],
+            'title': row['title'],
+            'description': row['description'],
+            'order': row['order'],
+            'content_type': row['content_type'],
+            'video_url': row['video_url'],
+            'video_id': row['video_id'] or youtube_video_id(row['video_url']),
+            'pdf_url': row['pdf_url'],
+            'pdf_file_url': section_storage.url(row['pdf_file']) if row['pdf_file'] else None,
+            'lessons': [],
+            'files': [],
+        }
+        modules_by_id[row['module_id']]['sections'].append(section)
+        sections_by_id[section['id']] = section
+
+    for row in Lesson.objects.filter(section__module__course_id=course_id).order_by('order', 'id').values(
+        'id', 'section_id', 'title', 'order', 'content_type', 'duration'
+    ):
+        sections_by_id[row.pop('section_id')]['lessons'].append(row)
+
+    for row in File.objects.filter(section__module__course_id=course_id).order_by('id').values(
+        'id', 'section_id', 'name', 'file_type', 'file'
+    ):
+        sections_by_id[row['section_id']]['files'].append({
+            'id': row['id'],
+            'name': row['name'],
+            'file_type': row['file_type'],
+            'url': file_storage.url(row['file']) if row['file'] else None,
+        })
+
+    return modules
+
+
+def build_outline(course_id):
+    from .models import Module, Section
+
+    return assemble_outline(
+        course_id,
+        Module.objects.filter(course_id=course_id).order_by('order', 'id').values(*MODULE_FIELDS),
+        Section.objects.filter(module__course_id=course_id).order_by('order', 'id').values(*SECTION_FIELDS),
+    )
+
+
+def _cache_key(course_id, version):
+    return f'courses:outline:{course_id}:{version}'
+
+
+def store_outline(course_id, outline):
+    """Cache an outline that was just built under the course's current content version"""
+    version = outline_version(course_id)
+    if version is not None:
+        cache.set(_cache_key(course_id, version), outline, CACHE_TIMEOUT)
+
+
+def get_outline(course_id):
+    """The course's outline, from the cache when its content version matches"""
+    version = outline_version(course_id)
+    if version is None:
+        return build_outline(course_id)
+    key = _cache_key(course_id, version)
+    outline = cache.get(key)
+    if outline is None:
+        outline = build_outline(course_id)
+        cache.set(key, outline, CACHE_TIMEOUT)
+    return outline
+
+
+def absolute_url(request, url):
+    if not url:
+        return None
+    if url.startswith('http'):
+        return url
+    return request.build_absolute_uri(url)
+
+
+def section_summary(section, request):
+    """The section shape shared by the course detail and instructor endpoints"""
+    return {
+        'id': section['id'],
+        'title': section['title'],
+        'description': section['description'],
+        'order': section['order'],
+        'content_type': section['content_type'],
+        'video_url': section['video_url'],
+        'video_id': section['video_id'],
+        'pdf_url': absolute_url(request, section['pdf_file_url'] or section['pdf_url']),
+        'has_pdf_file': bool(section['pdf_file_url']),
+    }
+
+
+def module_summaries(outline, request):
+    return [{
+        'id': module['id'],
+        'title': module['title'],
+        'description': module['description'],
+        'order': module['order'],
+        'sections': [section_summary(section, request) for section in module['sections']],
+    } for module in outline]
+
+
+def content_modules(outline, request, completed_lesson_ids=frozenset()):
+    """
+    The ModuleSerializer/SectionSerializer shape, with each section marked
+    completed once every one of its lessons is in `completed_lesson_ids`.
+    """
+    modules = []
+    for module in outline:
+        pdf_file_url = absolute_url(request, module['pdf_file_url'])
+        sections = []
+        for section in module['sections']:
+            section_file_url = absolute_url(request, section['pdf_file_url'])
+            lesson_ids = [lesson['id'] for lesson in section['lessons']]
+            sections.append({
+                'id': section['id'],
+                'title': section['title'],
+                'description': section['description'],
+                'order': section['order'],
+                'content_type': section['content_type'],
+                'video_url': section['video_url'],
+                'video_id': section['video_id'],
+                'pdf_url': section['pdf_url'] or section_file_url,
+                'pdf_file_url': section_file_url,
+                'completed': bool(lesson_ids) and all(
+                    lesson_id in completed_lesson_ids for lesson_id in lesson_ids
+                ),
+            })
+        modules.append({
+            'id': module['id'],
+            'title': module['title'],
+            'description': module['description'],
+            'order': module['order'],
+            'content_type': module['content_type'],
+            'video_url': module['video_url'],
+            'video_id': module['video_id'],
+            'pdf_url': module['pdf_url'] or pdf_file_url,
+            'pdf_file_url': pdf_file_url,
+            'has_pdf_binary': module['has_pdf_binary'],
+            'sections': sections,
+        })
+    return modules
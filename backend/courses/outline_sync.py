@@ -0,0 +1,297 @@
+"""
+Set-based saving of the outline submitted by the instructor course editor.
+
+sync_outline() loads a course's modules and sections once and diffs the
+submitted outline against them. It then applies the changes level by
+level inside one atomic block: a single delete, bulk_update and
+bulk_create for modules, then the same for sections. Only rows that
+actually changed are written. Rows whose order changes are first moved
+past every order in use. A swap or shift can then never trip the unique
+(course, order) and (module, order) constraints halfway through.
+
+Bulk writes skip save() and signals, so their side effects are repeated
+here: section PDF URLs and content types, content-addressed reference
+counts and the course's content version. The refreshed outline is
+assembled from the same in-memory rows and cached.
+"""
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.db.models.fields.files import FieldFile
+from django.utils import timezone
+
+from . import contentstore
+from . import jobs
+from . import outline as course_outline
+
+
+def _pk(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _assign(instance, values):
+    """Set attributes on `instance` and return the names of those that changed"""
+    changed = set()
+    for name, value in values.items():
+        current = getattr(instance, name)
+        if isinstance(current, FieldFile):
+            current = current.name
+        if current != value:
+            setattr(instance, name, value)
+            changed.add(name)
+    return changed
+
+
+def _finish_section(section, pdf_changed):
+    """What Section.save() does after writing: derive pdf_url and content_type from the file"""
+    changed = set()
+    if not section.pdf_file:
+        return changed
+    if pdf_changed or not section.pdf_url:
+        changed |= _assign(section, {'pdf_url': section.pdf_file.url})
+    if section.content_type != 'pdf':
+        changed |= _assign(section, {'content_type': 'both' if section.video_url else 'pdf'})
+    return changed
+
+
+def _row(instance, fields):
+    row = {}
+    for name in fields:
+        value = getattr(instance, name)
+        row[name] = value.name if isinstance(value, FieldFile) else value
+    return row
+
+
+class _Uploads:
+    """The section PDFs sent with the outline, stored on first use"""
+
+    def __init__(self, pdf_uploads, pdf_files, storage):
+        self.pdf_uploads = pdf_uploads
+        self.pdf_files = pdf_files
+        self.storage = storage
+        self.paths = {}
+
+    def _store(self, file_key):
+        if file_key not in self.paths:
+            upload = self.pdf_files[file_key]
+            self.paths[file_key] = contentstore.put(upload, upload.name, self.storage).path
+        return self.paths[file_key]
+
+    def path_for(self, pdf_key, fallback=False):
+        """
+        The stored path of the upload whose metadata carries `pdf_key`.
+        With `fallback`, a key without metadata takes the first upload.
+        """
+        for meta in self.pdf_uploads:
+            if meta.get('pdfKey') == pdf_key:
+                file_key = f"section_pdf_{meta.get('pdfIndex')}"
+                return self._store(file_key) if file_key in self.pdf_files else None
+        if fallback and self.pdf_files:
+            return self._store(sorted(self.pdf_files, key=lambda key: int(key.rsplit('_', 1)[1]))[0])
+        return None
+
+
+def delete_files(paths):
+    """Background job: remove files that nothing references any more"""
+    for path in paths:
+        default_storage.delete(path)
+
+
+def _make_room(model, instances, original_orders, orders_in_use):
+    """
+    Move rows whose order is about to change past every order in use, so
+    the final orders can be written in any sequence.
+    """
+    moved = [instance.pk for instance in instances if instance.order != original_orders[instance.pk]]
+    if moved:
+        offset = max(orders_in_use) + 1
+        model.objects.filter(pk__in=moved).update(order=F('order') + offset)
+
+
+def _create(model, instances, parent):
+    """bulk_create, looking primary keys up by (parent, order) where the database cannot return them"""
+    model.objects.bulk_create(instances)
+    missing = [instance for instance in instances if instance.pk is None]
+    if missing:
+        pks = {
+            (parent_id, order): pk for pk, parent_id, order in model.objects.filter(
+                **{f'{parent}__in': {getattr(instance, parent) for instance in missing}}
+            ).values_list('pk', parent, 'order')
+        }
+        for instance in missing:
+            instance.pk = pks[(getattr(instance, parent), instance.order)]
+
+
+def sync_outline(course, modules_data, pdf_uploads=(), pdf_files=None):
+    """
+    Make the course's modules and sections match `modules_data`, the
+    editor's JSON outline, and return the refreshed outline. Modules
+    missing from it are deleted. So are the sections missing from a
+    module whose entry lists its sections.
+    """
+    from .models import CourseStats, Module, Section
+
+    uploads = _Uploads(pdf_uploads, pdf_files or {}, Section._meta.get_field('pdf_file').storage)
+    now = timezone.now()
+
+    with transaction.atomic():
+        modules = {module.pk: module for module in Module.objects.filter(course=course)}
+        sections = {section.pk: section for section in Section.objects.filter(module__course=course)}
+        module_orders = {pk: module.order for pk, module in modules.items()}
+        section_orders = {pk: section.order for pk, section in sections.items()}
+        sections_by_module = {}
+        for section in sections.values():
+            sections_by_module.setdefault(section.module_id, {})[section.pk] = section
+
+        kept_modules = {}
+        new_modules = []
+        changed_modules = {}
+        removed_sections = set()
+        new_sections = []
+        changed_sections = {}
+        acquired = []
+        released = []
+
+        for module_data in modules_data:
+            module = modules.get(_pk(module_data.get('id')))
+            if module is not None:
+                changed = _assign(module, {
+                    'title': module_data.get('title', module.title),
+                    'description': module_data.get('description', module.description),
+                    'order': module_data.get('order', module.order),
+                })
+                if changed:
+                    changed_modules.setdefault(module.pk, set()).update(changed)
+                kept_modules[module.pk] = module
+            else:
+                module = Module(
+                    course=course,
+                    title=module_data.get('title', 'Untitled Module'),
+                    description=module_data.get('description', ''),
+                    order=module_data.get('order', 1)
+                )
+                new_modules.append(module)
+
+            if not isinstance(module_data.get('sections'), list):
+                continue
+
+            current = sections_by_module.get(module.pk, {}) if module.pk else {}
+            listed = set()
+            for section_data in module_data['sections']:
+                pdf_key = section_data.get('pdf_key')
+                has_new_pdf = section_data.get('has_new_pdf', False)
+                section = current.get(_pk(section_data.get('id')))
+
+                if section is None:
+                    section = Section(
+                        module=module,
+                        title=section_data.get('title', 'Untitled Section'),
+                        description=section_data.get('description', ''),
+                        order=section_data.get('order', 1),
+                        content_type=section_data.get('content_type', 'video'),
+                        video_url=section_data.get('video_url', ''),
+                        video_id=section_data.get('video_id', ''),
+                        pdf_url=section_data.get('pdf_url', '')
+                    )
+                    path = uploads.path_for(pdf_key) if has_new_pdf and pdf_key else None
+                    if path:
+                        section.pdf_file = path
+                        acquired.append(path)
+                    _finish_section(section, False)
+                    new_sections.append(section)
+                    continue
+
+                values = {
+                    'title': section_data.get('title', section.title),
+                    'description': section_data.get('description', section.description),
+                    'order': section_data.get('order', section.order),
+                    'content_type': section_data.get('content_type', section.content_type),
+                    'video_url': section_data.get('video_url', section.video_url),
+                    'video_id': section_data.get('video_id', section.video_id),
+                }
+                pdf_changed = False
+                if has_new_pdf and pdf_key:
+                    path = uploads.path_for(pdf_key, fallback=True)
+                    if path:
+                        values['pdf_file'] = path
+                        values['content_type'] = 'both' if values['video_url'] else 'pdf'
+                        pdf_changed = True
+                elif not has_new_pdf:
+                    values['pdf_url'] = section_data.get('pdf_url', section.pdf_url)
+
+                old_path = section.pdf_file.name
+                changed = _assign(section, values) | _finish_section(section, pdf_changed)
+                if 'pdf_file' in changed:
+                    released.append(old_path)
+                    acquired.append(section.pdf_file.name)
+                if changed:
+                    changed_sections.setdefault(section.pk, set()).update(changed)
+                listed.add(section.pk)
+
+            removed_sections |= set(current) - listed
+
+        removed_modules = set(modules) - set(kept_modules)
+        removed_sections = {
+            pk for pk in removed_sections if sections[pk].module_id not in removed_modules
+        }
+
+        # Modules: one delete, one update, one insert
+        if removed_modules:
+            Module.objects.filter(pk__in=removed_modules).delete()
+        updated = [kept_modules[pk] for pk in changed_modules]
+        _make_room(
+            Module, updated, module_orders,
+            [module_orders[pk] for pk in kept_modules] + [module.order for module in updated]
+        )
+        for module in updated:
+            module.updated_at = now
+        if updated:
+            Module.objects.bulk_update(
+                updated, set().union(*changed_modules.values()) | {'updated_at'}
+            )
+        _create(Module, new_modules, 'course_id')
+
+        # Sections: the same; bulk_create picks up the keys of the new modules
+        if removed_sections:
+            Section.objects.filter(pk__in=removed_sections).delete()
+        kept_sections = [
+            section for section in sections.values()
+            if section.pk not in removed_sections and section.module_id not in removed_modules
+        ]
+        updated = [sections[pk] for pk in changed_sections]
+        _make_room(
+            Section, updated, section_orders,
+            [section_orders[section.pk] for section in kept_sections] + [section.order for section in updated]
+        )
+        for section in updated:
+            section.updated_at = now
+        if updated:
+            Section.objects.bulk_update(
+                updated, set().union(*changed_sections.values()) | {'updated_at'}
+            )
+        _create(Section, new_sections, 'module_id')
+
+        contentstore.release(released)
+        contentstore.acquire(acquired)
+        legacy_files = [path for path in released if path and not contentstore.is_stored_path(path)]
+        if legacy_files:
+            # Files saved before content addressing belong to this section alone
+            jobs.enqueue(delete_files, priority=jobs.PRIORITY_LOW, paths=legacy_files)
+
+        if removed_modules or removed_sections or changed_modules or changed_sections or new_modules or new_sections:
+            CourseStats.touch_content(course.pk)
+
+    module_rows = sorted(
+        (_row(module, course_outline.MODULE_FIELDS) for module in [*kept_modules.values(), *new_modules]),
+        key=lambda row: (row['order'], row['id'])
+    )
+    section_rows = sorted(
+        (_row(section, course_outline.SECTION_FIELDS) for section in [*kept_sections, *new_sections]),
+        key=lambda row: (row['order'], row['id'])
+    )
+    outline = course_outline.assemble_outline(course.pk, module_rows, section_rows)
+    course_outline.store_outline(course.pk, outline)
+    return outline
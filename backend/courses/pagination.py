@@ -0,0 +1,176 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class CourseCursorPagination(BasePagination):
+    """
+    Keyset pagination for the public course catalog, ordered by
+    (-created_at, -id). The cursor stores the boundary row's key, so every
+    page is a single indexed range scan no matter how deep it is.
+
+    Ranked search results (annotated with `search_rank`) keep their best
+    match first order; their cursor holds an offset into the ranking.
+
+    Pages are always returned unless COURSE_CATALOG_LEGACY_UNPAGINATED is
+    on. That flag, kept for old clients until the next release, limits
+    pagination to requests that send `cursor` or `page_size`.
+    """
+    page_size = 20
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+    rank_annotation = 'search_rank'
+
+    def is_requested(self, request):
+        if not getattr(settings, 'COURSE_CATALOG_LEGACY_UNPAGINATED', False):
+            return True
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def encode_payload(self, payload):
+        return base64.urlsafe_b64encode(json.dumps(payload).encode('ascii')).decode('ascii')
+
+    def decode_payload(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            return json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, course, reverse):
+        return self.encode_payload([course.created_at.isoformat(), course.id, int(reverse)])
+
+    def decode_cursor(self, request):
+        payload = self.decode_payload(request)
+        if payload is None:
+            return None
+        try:
+            created_at, pk, reverse = payload
+            created_at = parse_datetime(created_at)
+            if created_at is None:
+                raise ValueError
+            return created_at, int(pk), bool(reverse)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def decode_offset(self, request):
+        payload = self.decode_payload(request)
+        if payload is None:
+            return 0
+        if not isinstance(payload, dict) or not isinstance(payload.get('offset'), int) or payload['offset'] < 0:
+            raise NotFound(self.invalid_cursor_message)
+        return payload['offset']
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_requested(request):
+            return None
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.offset = None
+        if self.rank_annotation in queryset.query.annotations:
+            return self.paginate_ranked(queryset, request)
+
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor[2])
+
+        if cursor is None:
+            queryset = queryset.order_by('-created_at', '-id')
+        elif reverse:
+            created_at, pk, _ = cursor
+            queryset = queryset.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+            ).order_by('created_at', 'id')
+        else:
+            created_at, pk, _ = cursor
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+            ).order_by('-created_at', '-id')
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        # Walking backwards always leaves the cursor row ahead of us, and
+        # walking forwards always leaves it behind us.
+        self.has_next = has_more if not reverse else cursor is not None
+        self.has_previous = has_more if reverse else cursor is not None
+        self.page = results
+        return results
+
+    def paginate_ranked(self, queryset, request):
+        """
+        Offset pages over a ranked search. A keyset on the rank would need
+        float equality on bm25 scores; search results are small enough
+        that the offset costs little.
+        """
+        self.offset = self.decode_offset(request)
+        results = list(queryset[self.offset:self.offset + self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.has_previous = self.offset > 0
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.offset is not None:
+            cursor = self.encode_payload({'offset': self.offset + self.page_size})
+        else:
+            cursor = self.encode_cursor(self.page[-1], False)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.offset is not None:
+            if self.offset <= self.page_size:
+                return remove_query_param(url, self.cursor_query_param)
+            cursor = self.encode_payload({'offset': self.offset - self.page_size})
+            return replace_query_param(url, self.cursor_query_param, cursor)
+        if not self.page:
+            return remove_query_param(url, self.cursor_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[0], True))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
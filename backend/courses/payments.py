@@ -0,0 +1,141 @@
+"""
+Razorpay order creation, run on the background job queue.
+
+Creating an order is a round trip to Razorpay's API that can take
+seconds or time out. create_payment_order only validates the request and
+queues create_razorpay_order. The client then polls
+payment_order_status until the job has stored the order as its result.
+
+A job can be retried after Razorpay created its order, e.g. when the
+worker died or the response timed out. So each checkout gets its own
+receipt, and the job first looks for an order with that receipt: in the
+PaymentOrder table, where it stores every order before returning, and
+then at Razorpay. A retry never creates a second order.
+
+When no worker has sent a heartbeat recently, because `manage.py
+run_worker` is not running, the checkout request runs the job itself and
+answers with the order right away. If a worker is alive but does not
+claim the job within PAYMENT_ORDER_INLINE_AFTER seconds, the polling
+request runs it instead.
+"""
+import secrets
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import jobs
+
+MAX_ATTEMPTS = 3
+
+
+def inline_after():
+    return getattr(settings, 'PAYMENT_ORDER_INLINE_AFTER', 5)
+
+
+def amount_in_paise(price):
+    amount = int(price * 100)
+    if amount <= 0:
+        raise ValueError(f"Amount in paise is invalid: {amount}")
+    return amount
+
+
+def new_receipt(course_id, user_id):
+    # Razorpay allows up to 40 characters
+    return f'course_{course_id}_{user_id}_{secrets.token_hex(6)}'
+
+
+def queue_order(course, user):
+    return jobs.enqueue(
+        create_razorpay_order,
+        priority=jobs.PRIORITY_HIGH,
+        max_attempts=MAX_ATTEMPTS,
+        course_id=course.id,
+        user_id=user.id,
+        receipt=new_receipt(course.id, user.id),
+    )
+
+
+def _order_details(order):
+    return {
+        'id': order.order_id,
+        'amount': order.amount,
+        'currency': order.currency,
+        'receipt': order.receipt
+    }
+
+
+def create_razorpay_order(course_id, user_id, receipt=None):
+    """
+    Background job: create the Razorpay order for one checkout and return
+    its details, or return the order an earlier attempt created
+    """
+    import razorpay
+    from .models import Course, PaymentOrder
+
+    # Jobs queued before receipts were unique carry none
+    receipt = receipt or f'course_{course_id}_{user_id}'
+    order = PaymentOrder.objects.filter(receipt=receipt).first()
+    if order is not None:
+        return _order_details(order)
+
+    course = Course.objects.only('id', 'title', 'price').get(pk=course_id)
+    client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
+    # An attempt that died after Razorpay answered left the order there only
+    existing = client.order.all(data={'receipt': receipt}).get('items') or []
+    if existing:
+        payment = existing[0]
+        print(f"Reusing Razorpay order {payment['id']} for receipt {receipt}")
+    else:
+        payment = client.order.create(data={
+            'amount': amount_in_paise(course.price),
+            'currency': 'INR',
+            'receipt': receipt,
+            'notes': {
+                'course_id': course_id,
+                'user_id': user_id,
+                'course_title': course.title
+            },
+            'payment_capture': 1  # Auto capture payment
+        })
+        print(f"Razorpay order created for course {course_id}, user {user_id}: {payment['id']}")
+
+    order, _ = PaymentOrder.objects.get_or_create(receipt=receipt, defaults={
+        'order_id': payment['id'],
+        'course_id': course_id,
+        'user_id': user_id,
+        'amount': payment['amount'],
+        'currency': payment['currency'],
+    })
+    return _order_details(order)
+
+
+def order_job(job_id, course_id, user_id):
+    """The order job for this course and user, or None"""
+    from .models import Job
+
+    return Job.objects.filter(
+        pk=job_id,
+        name=jobs.job_name(create_razorpay_order),
+        kwargs__course_id=course_id,
+        kwargs__user_id=user_id,
+    ).first()
+
+
+def run_without_workers(job):
+    """
+    Run the order job in this process if no worker is alive to take it.
+    Returns whether it ran here.
+    """
+    if jobs.workers_alive():
+        return False
+    return jobs.run_inline(job)
+
+
+def run_if_unclaimed(job):
+    """
+    Run the order job in this process if it has waited inline_after()
+    seconds without a worker taking it. Returns whether it ran here.
+    """
+    if job.status != 'queued' or (timezone.now() - job.created_at).total_seconds() < inline_after():
+        return False
+    return jobs.run_inline(job)
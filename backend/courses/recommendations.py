@@ -0,0 +1,109 @@
+"""
+Item-item "students also enrolled in" recommendations.
+
+Treat enrollments as a sparse binary user x course matrix E. The
+co-enrollment counts are then E^T E, and the cosine similarity of two
+courses is shared / sqrt(students_a * students_b). Instead of loading E
+into memory, the product is computed inside the database. A grouped
+self-join of enrollments on user_id runs for one chunk of courses at a
+time. The top-N neighbours of each course are kept in CourseRecommendation,
+so reading them back is a single indexed lookup on (course, rank).
+"""
+import heapq
+import math
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Count, F
+
+ENROLLED_STATUSES = ('active', 'completed')
+TOP_N = 10
+CHUNK_SIZE = 200
+
+
+def _enrollments():
+    Enrollment = apps.get_model('enrollments', 'Enrollment')
+    return Enrollment.objects.filter(status__in=ENROLLED_STATUSES)
+
+
+def co_enrollment_counts(course_ids):
+    """Yield (course_id, neighbour_id, shared_students) for a chunk of courses"""
+    rows = _enrollments().filter(
+        course_id__in=course_ids,
+        user__enrollments__status__in=ENROLLED_STATUSES,
+    ).values(
+        'course_id', neighbour_id=F('user__enrollments__course_id')
+    ).annotate(shared=Count('user_id')).order_by()
+    for row in rows.iterator():
+        if row['course_id'] != row['neighbour_id']:
+            yield row['course_id'], row['neighbour_id'], row['shared']
+
+
+def build_recommendations(top_n=TOP_N, chunk_size=CHUNK_SIZE, min_shared=1):
+    """
+    Recompute the top-N neighbours of every enrolled course, chunk by
+    chunk. Returns the number of recommendation rows written.
+    """
+    from .models import Course, CourseRecommendation
+
+    students = dict(
+        _enrollments().values('course_id').annotate(total=Count('id')).values_list('course_id', 'total')
+    )
+    published = set(Course.objects.filter(is_published=True).values_list('id', flat=True))
+    course_ids = sorted(students)
+
+    # Courses nobody is enrolled in any more keep no stale neighbours
+    CourseRecommendation.objects.exclude(course_id__in=_enrollments().values('course_id')).delete()
+
+    written = 0
+    for start in range(0, len(course_ids), chunk_size):
+        chunk = course_ids[start:start + chunk_size]
+        neighbours = {course_id: [] for course_id in chunk}
+        for course_id, neighbour_id, shared in co_enrollment_counts(chunk):
+            if shared < min_shared or neighbour_id not in published:
+                continue
+            score = shared / math.sqrt(students[course_id] * students[neighbour_id])
+            heap = neighbours[course_id]
+            item = (score, -neighbour_id)
+            if len(heap) < top_n:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+
+        rows = []
+        for course_id, heap in neighbours.items():
+            for rank, (score, negative_id) in enumerate(sorted(heap, reverse=True), start=1):
+                rows.append(CourseRecommendation(
+                    course_id=course_id,
+                    recommended_course_id=-negative_id,
+                    rank=rank,
+                    score=round(score, 6),
+                ))
+
+        with transaction.atomic():
+            CourseRecommendation.objects.filter(course_id__in=chunk).delete()
+            CourseRecommendation.objects.bulk_create(rows)
+        written += len(rows)
+
+    return written
+
+
+def get_related_courses(course, limit=3):
+    """
+    Published courses students of `course` also enrolled in, best match
+    first. Cold-start courses are topped up from the same category.
+    """
+    from .models import Course
+
+    related = list(
+        Course.objects.filter(recommended_by__course=course, is_published=True)
+        .exclude(id=course.id)
+        .order_by('recommended_by__rank')[:limit]
+    )
+    if len(related) < limit:
+        exclude_ids = [course.id] + [related_course.id for related_course in related]
+        related += list(
+            Course.objects.filter(category_id=course.category_id, is_published=True)
+            .exclude(id__in=exclude_ids)[:limit - len(related)]
+        )
+    return related
@@ -0,0 +1,208 @@
+"""
+Full-text search index for courses.
+
+On SQLite the index is an FTS5 table keyed by course ID (its rowid). It holds
+the course title, description, instructor name and category name. Signals in
+courses.models keep it in sync. On any other database, or if the table has
+not been created yet, filter_ranked(), match_filter() and search_course_ids()
+return None and callers fall back to their icontains filters.
+
+Matching and ranking are subqueries of the caller's queryset, so its other
+filters (published, category, price...) apply before anything is ordered or
+sliced, and no match is lost to a global cutoff.
+"""
+import re
+
+from django.db import connection, transaction
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+from django.db.utils import DatabaseError
+
+INDEX_TABLE = 'courses_course_fts'
+
+# bm25() weights, in column order: title, description, instructor, category
+COLUMN_WEIGHTS = (10.0, 1.0, 4.0, 3.0)
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+_SOURCE_SQL = """
+    SELECT c.id,
+           c.title,
+           c.description,
+           TRIM(u.username || ' ' || COALESCE(u.first_name, '') || ' ' || COALESCE(u.last_name, '')),
+           COALESCE(cat.name, '')
+    FROM courses_course c
+    JOIN accounts_user u ON u.id = c.instructor_id
+    LEFT JOIN courses_category cat ON cat.id = c.category_id
+"""
+
+_available = None
+
+
+def is_available():
+    """Whether the FTS5 index exists on the default database"""
+    global _available
+    if connection.vendor != 'sqlite':
+        return False
+    if not _available:
+        # Only a found table is remembered; a missing one is looked for again next time
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+                [INDEX_TABLE]
+            )
+            _available = cursor.fetchone() is not None
+    return _available
+
+
+def create_index(schema_connection=None):
+    conn = schema_connection or connection
+    if conn.vendor != 'sqlite':
+        return False
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {INDEX_TABLE} USING fts5("
+            "title, description, instructor, category, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+    global _available
+    _available = None
+    return True
+
+
+def drop_index(schema_connection=None):
+    conn = schema_connection or connection
+    if conn.vendor != 'sqlite':
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {INDEX_TABLE}")
+    global _available
+    _available = None
+
+
+def rebuild_index(schema_connection=None):
+    """Recreate the index contents from the course tables in one statement"""
+    conn = schema_connection or connection
+    if not create_index(conn):
+        return 0
+    with transaction.atomic(using=conn.alias):
+        with conn.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {INDEX_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {INDEX_TABLE} (rowid, title, description, instructor, category) "
+                + _SOURCE_SQL
+            )
+            cursor.execute(f"SELECT COUNT(*) FROM {INDEX_TABLE}")
+            return cursor.fetchone()[0]
+
+
+def index_courses(where, params):
+    """Re-index every course matched by a WHERE clause over the source query"""
+    if not is_available():
+        return
+    try:
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM {INDEX_TABLE} WHERE rowid IN "
+                    f"(SELECT c.id FROM courses_course c WHERE {where})",
+                    params
+                )
+                cursor.execute(
+                    f"INSERT INTO {INDEX_TABLE} (rowid, title, description, instructor, category) "
+                    + _SOURCE_SQL + f" WHERE {where}",
+                    params
+                )
+    except DatabaseError as e:
+        print(f"Error updating course search index: {str(e)}")
+
+
+def index_course(course_id):
+    index_courses('c.id = %s', [course_id])
+
+
+def index_category(category_id):
+    index_courses('c.category_id = %s', [category_id])
+
+
+def index_instructor(user_id):
+    index_courses('c.instructor_id = %s', [user_id])
+
+
+def remove_course(course_id):
+    if not is_available():
+        return
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {INDEX_TABLE} WHERE rowid = %s", [course_id])
+    except DatabaseError as e:
+        print(f"Error removing course from search index: {str(e)}")
+
+
+def build_match_query(text):
+    """
+    Turn free text into an FTS5 query: every word becomes a quoted prefix
+    term, and the terms are ORed together like the old icontains search.
+    """
+    terms = _TERM_RE.findall(text.lower())
+    return ' OR '.join(f'"{term}"*' for term in terms)
+
+
+def match_filter(text):
+    """
+    A filter restricting a course queryset to matches of `text`, or None
+    when the index is unavailable and the caller should use its own filter.
+    """
+    if not is_available():
+        return None
+    return Q(id__in=search_course_ids(text))
+
+
+def search_course_ids(text):
+    """
+    A subquery of the IDs of every course matching `text`, for id__in
+    filters, or None when the index is unavailable.
+    """
+    if not is_available():
+        return None
+    match = build_match_query(text)
+    if not match:
+        return []
+    return RawSQL(f"SELECT rowid FROM {INDEX_TABLE} WHERE {INDEX_TABLE} MATCH %s", [match])
+
+
+def rank_expression(text):
+    """BM25 score of each matching course, lower is better"""
+    weights = ', '.join(str(weight) for weight in COLUMN_WEIGHTS)
+    return RawSQL(
+        f"SELECT bm25({INDEX_TABLE}, {weights}) FROM {INDEX_TABLE} "
+        f"WHERE {INDEX_TABLE} MATCH %s AND {INDEX_TABLE}.rowid = courses_course.id",
+        [build_match_query(text)],
+        output_field=FloatField()
+    )
+
+
+def substring_filter(text):
+    """The icontains filter used when the index is unavailable"""
+    q_objects = Q()
+    for term in text.split():
+        q_objects |= (
+            Q(title__icontains=term) |
+            Q(description__icontains=term) |
+            Q(instructor__username__icontains=term) |
+            Q(category__name__icontains=term)
+        )
+    return q_objects
+
+
+def filter_ranked(queryset, text):
+    """
+    Restrict a course queryset to search matches, best match first. Returns
+    None when the index is unavailable.
+    """
+    condition = match_filter(text)
+    if condition is None:
+        return None
+    return queryset.filter(condition).annotate(
+        search_rank=rank_expression(text)
+    ).order_by('search_rank', '-created_at', '-id')
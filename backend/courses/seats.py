@@ -0,0 +1,275 @@
+"""
+Seats of courses that cap enrollment with max_students.
+
+Counting a course's enrollments before every insert scans them on each
+request, and it oversells under a rush: two requests can both see the
+last free seat and both insert. Instead each capped course has a
+CourseSeats row with its number of free seats, and a seat is taken with
+one conditional UPDATE:
+
+    UPDATE ... SET seats_left = seats_left - 1
+    WHERE course_id = %s AND seats_left >= 1
+
+Only as many requests as there are seats get a row updated, however many
+run at once, and the row is held for that one statement only.
+
+- A student who finds no free seat joins the waitlist as a 'waitlisted'
+  enrollment.
+- When an active or pending enrollment is dropped, completed or deleted,
+  its seat goes to the earliest waitlisted student, or back to the
+  counter if nobody is waiting.
+- reconcile() recounts the free seats from the enrollments themselves and
+  fills freed seats from the waitlist. It runs when a course's
+  max_students changes and periodically via
+  `manage.py reconcile_course_seats`, which also corrects writes that went
+  around this module (the admin, queryset updates).
+
+A seat leaves the counter before its enrollment is written, and a freed
+seat comes back only after its enrollment stopped holding it. A recount
+running in between would see the seat as free and hand it out twice. So
+reconcile() only ever lowers a counter; the release paths and resize()
+raise it. reconcile(exact=True) also raises it, for repairs while no
+enrollments are being written, e.g. after seats leaked from a crashed
+request.
+
+A max_students of None or 0 means no cap. Such courses have no row, and
+there is always a seat for everyone.
+"""
+from django.apps import apps
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest, Least
+from django.utils import timezone
+
+# Statuses that occupy a seat, as counted against max_students
+HOLDING_STATUSES = ('active', 'pending')
+
+
+def is_capped(max_students):
+    return bool(max_students) and max_students > 0
+
+
+def take(course, count=1):
+    """Take up to `count` free seats of `course` and return how many were taken"""
+    CourseSeats = apps.get_model('courses', 'CourseSeats')
+
+    if not is_capped(course.max_students):
+        return count
+    seats = CourseSeats.objects.filter(course_id=course.pk)
+    reconciled = False
+    while True:
+        if seats.filter(seats_left__gte=count).update(
+            seats_left=F('seats_left') - count, updated_at=timezone.now()
+        ):
+            return count
+        left = seats.values_list('seats_left', flat=True).first()
+        if left is None:
+            if reconciled:
+                # The cap was lifted meanwhile
+                return count
+            # Capped without a row yet, e.g. a cloned course
+            reconcile([course.pk])
+            reconciled = True
+            continue
+        if not left:
+            return 0
+        # Fewer seats than asked for: take the rest, unless they changed meanwhile
+        if seats.filter(seats_left=left).update(seats_left=0, updated_at=timezone.now()):
+            return left
+
+
+def give_back(course_id, count=1):
+    if count:
+        CourseSeats = apps.get_model('courses', 'CourseSeats')
+        CourseSeats.objects.filter(course_id=course_id).update(
+            seats_left=F('seats_left') + count, updated_at=timezone.now()
+        )
+
+
+def _waitlist(course_id):
+    Enrollment = apps.get_model('enrollments', 'Enrollment')
+    return Enrollment.objects.filter(course_id=course_id, status='waitlisted').order_by('enrolled_at', 'id')
+
+
+def _promote(course_id, count):
+    """Activate the `count` earliest waitlisted enrollments and return how many were"""
+    Enrollment = apps.get_model('enrollments', 'Enrollment')
+
+    promoted = 0
+    while promoted < count:
+        pks = list(_waitlist(course_id).values_list('pk', flat=True)[:count - promoted])
+        if not pks:
+            break
+        # Rows another promotion got to first are skipped
+        promoted += Enrollment.objects.filter(pk__in=pks, status='waitlisted').update(
+            status='active', enrolled_at=timezone.now()
+        )
+    if promoted:
+        _students_changed(course_id, promoted)
+    return promoted
+
+
+def release(course_id):
+    """Hand the seat of an enrollment that stopped holding one to the waitlist, or back"""
+    if not _promote(course_id, 1):
+        give_back(course_id)
+
+
+def fill_from_waitlist(course):
+    """Move waitlisted students of `course` into its free seats; returns how many moved"""
+    waiting = _waitlist(course.pk).count()
+    if not waiting:
+        return 0
+    granted = take(course, waiting)
+    promoted = _promote(course.pk, granted)
+    give_back(course.pk, granted - promoted)
+    return promoted
+
+
+def enroll(user, course):
+    """
+    Enroll `user` in `course`, or reactivate their dropped enrollment, if a
+    seat is free, and put them on the waitlist otherwise. Returns the
+    enrollment and 'enrolled', 'reactivated', 'waitlisted' or
+    'already_enrolled' (for any enrollment that is not dropped).
+    """
+    from enrollments.completion import lesson_total
+    Enrollment = apps.get_model('enrollments', 'Enrollment')
+
+    enrollment = Enrollment.objects.filter(user=user, course=course).first()
+    if enrollment is not None and enrollment.status != 'dropped':
+        return enrollment, 'already_enrolled'
+
+    seated = take(course) == 1
+    values = {'status': 'active'} if seated else {'status': 'waitlisted', 'enrolled_at': timezone.now()}
+    try:
+        if enrollment is None:
+            # Counted first, so the transaction starts with its write
+            values['total_lessons'] = lesson_total(course.pk)
+            with transaction.atomic():
+                enrollment = Enrollment.objects.create(user=user, course=course, **values)
+            outcome = 'enrolled'
+        elif Enrollment.objects.filter(pk=enrollment.pk, status='dropped').update(**values):
+            enrollment.refresh_from_db()
+            enrollment._loaded_status = enrollment.status
+            if seated:
+                _students_changed(course.pk, 1)
+            outcome = 'reactivated'
+        else:
+            # Another request reactivated it first
+            enrollment = None
+    except IntegrityError:
+        # Another request enrolled the same user first
+        enrollment = None
+    except Exception:
+        if seated:
+            give_back(course.pk)
+        raise
+    if enrollment is None:
+        if seated:
+            give_back(course.pk)
+        return Enrollment.objects.get(user=user, course=course), 'already_enrolled'
+    return enrollment, outcome if seated else 'waitlisted'
+
+
+def seats_left(course):
+    """Free seats of `course`, or None if it has no cap"""
+    if not is_capped(course.max_students):
+        return None
+    CourseSeats = apps.get_model('courses', 'CourseSeats')
+    left = CourseSeats.objects.filter(course_id=course.pk).values_list('seats_left', flat=True).first()
+    if left is None:
+        reconcile([course.pk])
+        left = CourseSeats.objects.filter(course_id=course.pk).values_list('seats_left', flat=True).first()
+    return left
+
+
+def waitlist_position(enrollment):
+    """1 for the next student to get a seat, or None if `enrollment` is not waitlisted"""
+    if enrollment.status != 'waitlisted':
+        return None
+    return _waitlist(enrollment.course_id).filter(
+        Q(enrolled_at__lt=enrollment.enrolled_at)
+        | Q(enrolled_at=enrollment.enrolled_at, id__lt=enrollment.pk)
+    ).count() + 1
+
+
+def resize(course, previous_max_students):
+    """Apply a change of `course`'s max_students to its free seats, then reconcile"""
+    CourseSeats = apps.get_model('courses', 'CourseSeats')
+
+    if is_capped(previous_max_students) and is_capped(course.max_students):
+        # Shifted by the difference, so seats in flight stay accounted for
+        CourseSeats.objects.filter(course_id=course.pk).update(
+            seats_left=Greatest(
+                F('seats_left') + (course.max_students - previous_max_students), Value(0),
+                output_field=IntegerField(),
+            ),
+            updated_at=timezone.now(),
+        )
+    reconcile([course.pk])
+
+
+def reconcile(course_ids=None, exact=False):
+    """
+    Recount the free seats of the given courses (or all of them) from their
+    enrollments, adding or removing rows where max_students was set or
+    cleared, and move waitlisted students into any seats that are free.
+    A counter is only lowered to the recount, unless `exact`. Returns the
+    number of capped courses.
+    """
+    Course = apps.get_model('courses', 'Course')
+    CourseSeats = apps.get_model('courses', 'CourseSeats')
+    Enrollment = apps.get_model('enrollments', 'Enrollment')
+
+    courses = Course.objects.all()
+    if course_ids is not None:
+        courses = courses.filter(pk__in=course_ids)
+    capped = courses.filter(max_students__gt=0)
+
+    holding = Enrollment.objects.filter(
+        course_id=OuterRef('course_id'), status__in=HOLDING_STATUSES
+    ).order_by().values('course_id').annotate(count=Count('id')).values('count')
+    max_students = Course.objects.filter(pk=OuterRef('course_id')).values('max_students')
+
+    now = timezone.now()
+    with transaction.atomic():
+        CourseSeats.objects.filter(course__in=courses).exclude(course__in=capped).delete()
+        # New rows start at the cap and are lowered to the recount below
+        CourseSeats.objects.bulk_create(
+            [
+                CourseSeats(course_id=course_id, seats_left=max_students, updated_at=now)
+                for course_id, max_students in capped.filter(seats__isnull=True).values_list(
+                    'pk', 'max_students'
+                )
+            ],
+            ignore_conflicts=True,
+        )
+        free = Greatest(
+            Subquery(max_students) - Coalesce(Subquery(holding), Value(0)),
+            Value(0),
+            output_field=IntegerField(),
+        )
+        count = CourseSeats.objects.filter(course__in=capped).update(
+            seats_left=free if exact else Least(F('seats_left'), free, output_field=IntegerField()),
+            reconciled_at=now,
+            updated_at=now,
+        )
+
+    for course in courses.filter(enrollments__status='waitlisted').distinct():
+        if is_capped(course.max_students):
+            fill_from_waitlist(course)
+        else:
+            _promote(course.pk, _waitlist(course.pk).count())
+    return count
+
+
+def _students_changed(course_id, activated):
+    # Queryset updates skip the Enrollment signals
+    from .models import CourseStats
+    from .conditional import touch_catalog
+    from analytics.refresh import schedule_refresh
+
+    CourseStats.add(course_id, active_students=activated)
+    touch_catalog()
+    schedule_refresh(course_id)
@@ -1,7 +1,9 @@
 from rest_framework import serializers
-from .models import Category, Course, Section, Lesson, Review, CourseTag, Module, UserProgress
+from .models import Category, Course, Section, Lesson, Review, CourseTag, Module, UserProgress, get_course_stats
 from enrollments.models import Enrollment, Progress
-from django.contrib.auth.models import User
+from accounts.models import User
+from .loaders import get_loaders, prefetched
+from . import images as course_images
 from django.db import models
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -22,6 +24,13 @@ class ReviewSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'user_username', 'rating', 'comment', 'created_at']
         read_only_fields = ['user']
 
+class PrimingListSerializer(serializers.ListSerializer):
+    """Hand every instance to the child's prime() before rendering any of them"""
+    def to_representation(self, data):
+        iterable = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        self.child.prime(iterable)
+        return super().to_representation(iterable)
+
 class LessonSerializer(serializers.ModelSerializer):
     is_completed = serializers.SerializerMethodField()
 
@@ -32,15 +41,18 @@ class LessonSerializer(serializers.ModelSerializer):
             'content', 'order', 'duration', 'is_published',
             'allow_comments', 'allow_download', 'created_at', 'is_completed'
         ]
+        list_serializer_class = PrimingListSerializer
+
+    def prime(self, lessons):
+        loaders = get_loaders(self.context)
+        if loaders is not None:
+            loaders.lesson_completed.prime(lesson.id for lesson in lessons)
 
     def get_is_completed(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return UserProgress.objects.filter(
-                user=request.user,
-                lesson=obj
-            ).exists()
-        return False
+        loaders = get_loaders(self.context)
+        if loaders is None:
+            return False
+        return loaders.lesson_completed.load(obj.id)
 
 class SectionSerializer(serializers.ModelSerializer):
     completed = serializers.SerializerMethodField()
@@ -56,40 +68,19 @@ class SectionSerializer(serializers.ModelSerializer):
         extra_kwargs = {
             'pdf_file': {'write_only': True}  # Don't include the actual file in responses
         }
+        list_serializer_class = PrimingListSerializer
+    
+    def prime(self, sections):
+        loaders = get_loaders(self.context)
+        if loaders is not None:
+            loaders.section_completed.prime(section.id for section in sections)
     
     def get_completed(self, obj):
-        request = self.context.get('request')
-        if not request or not request.user.is_authenticated:
-            return False
-        
-        # Check if user has completed this section
-        from enrollments.models import Enrollment, Progress
-        
-        try:
-            # Get the user's enrollment for this course
-            enrollment = Enrollment.objects.get(
-                user=request.user,
-                course=obj.module.course,
-                status='active'
-            )
-            
-            # Get lessons in this section
-            lessons = Lesson.objects.filter(section=obj)
-            
-            if not lessons.exists():
-                return False
-            
-            # Check if all lessons are completed
-            completed_count = Progress.objects.filter(
-                enrollment=enrollment,
-                lesson__in=lessons,
-                completed=True
-            ).count()
-            
-            return completed_count == lessons.count()
-            
-        except (Enrollment.DoesNotExist, AttributeError):
+        # Completed once every lesson has progress under an active enrollment
+        loaders = get_loaders(self.context)
+        if loaders is None:
             return False
+        return loaders.section_completed.load(obj.id)
             
     def get_pdf_file_url(self, obj):
         if obj.pdf_file:
@@ -159,6 +150,16 @@ class ModuleSerializer(serializers.ModelSerializer):
         extra_kwargs = {
             'pdf_file': {'write_only': True}  # Don't include the actual file in responses
         }
+        list_serializer_class = PrimingListSerializer
+    
+    def prime(self, modules):
+        # Sections already prefetched can be primed for the whole tree at once
+        loaders = get_loaders(self.context)
+        if loaders is not None:
+            for module in modules:
+                loaders.section_completed.prime(
+                    section.id for section in prefetched(module, 'sections') or []
+                )
     
     def get_pdf_file_url(self, obj):
         if obj.pdf_file:
@@ -172,7 +173,7 @@ class ModuleSerializer(serializers.ModelSerializer):
     
     def get_has_pdf_binary(self, obj):
         # Check if the module has PDF data stored in the database
-        return bool(obj.pdf_binary)
+        return obj.has_pdf
         
     def to_representation(self, instance):
         representation = super().to_representation(instance)
@@ -206,19 +207,40 @@ class CourseSerializer(serializers.ModelSerializer):
     instructor = InstructorSerializer(read_only=True)
     tags = CourseTagSerializer(many=True, read_only=True)
     reviews = ReviewSerializer(many=True, read_only=True)
-    average_rating = serializers.FloatField(read_only=True)
-    total_students = serializers.IntegerField(source='enrollments.count', read_only=True)
+    average_rating = serializers.SerializerMethodField()
+    total_students = serializers.SerializerMethodField()
     thumbnail_url = serializers.SerializerMethodField()
     cover_image_url = serializers.SerializerMethodField()
+    thumbnail_srcset = serializers.SerializerMethodField()
+    cover_image_srcset = serializers.SerializerMethodField()
     modules = ModuleSerializer(many=True, read_only=True)
     progress = serializers.SerializerMethodField()
     is_free = serializers.BooleanField(read_only=True)
 
+    # Nested or per-course computed fields that cost extra queries. Once a
+    # client sends ?fields= or ?expand= they are only rendered on request.
+    EXPANDABLE_FIELDS = ('tags', 'reviews', 'modules', 'progress')
+
+    # Course columns read by fields whose names differ from the model's
+    FIELD_COLUMNS = {
+        'thumbnail_url': ('thumbnail',),
+        'cover_image_url': ('cover_image',),
+        'thumbnail_srcset': ('thumbnail', 'image_variants'),
+        'cover_image_srcset': ('cover_image', 'image_variants'),
+        'instructor': (
+            'instructor', 'instructor__id', 'instructor__username',
+            'instructor__first_name', 'instructor__last_name', 'instructor__email'
+        ),
+        'average_rating': ('stats__id', 'stats__average_rating'),
+        'total_students': ('stats__id', 'stats__active_students'),
+    }
+
     class Meta:
         model = Course
         fields = [
             'id', 'title', 'description', 'instructor', 'thumbnail_url',
-            'cover_image_url', 'price', 'duration_in_weeks', 'difficulty',
+            'cover_image_url', 'thumbnail_srcset', 'cover_image_srcset',
+            'price', 'duration_in_weeks', 'difficulty',
             'is_published', 'created_at', 'updated_at', 'category',
             'difficulty_level', 'estimated_duration', 'language',
             'certificate_available', 'course_objectives', 'target_audience',
@@ -230,6 +252,106 @@ class CourseSerializer(serializers.ModelSerializer):
             'reviews', 'modules', 'progress', 'is_free'
         ]
         read_only_fields = ['instructor', 'created_at', 'updated_at']
+        list_serializer_class = PrimingListSerializer
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        expand = kwargs.pop('expand', None)
+        super().__init__(*args, **kwargs)
+        if fields is None and expand is None:
+            self.selected_fields = self.selection_from_request(self.context.get('request'))
+        else:
+            self.selected_fields = self.select_fields(fields, expand)
+
+    @classmethod
+    def select_fields(cls, fields=None, expand=None):
+        """
+        Resolve ?fields= and ?expand= values into the set of field names to
+        render. Returns None, meaning every field, when neither is given.
+        """
+        if fields is None and expand is None:
+            return None
+
+        def split(value):
+            if isinstance(value, str):
+                value = value.split(',')
+            return {name.strip() for name in value or [] if name.strip()}
+
+        if fields is not None:
+            selected = split(fields) & set(cls.Meta.fields)
+        else:
+            selected = set(cls.Meta.fields) - set(cls.EXPANDABLE_FIELDS)
+        selected |= split(expand) & set(cls.EXPANDABLE_FIELDS)
+        selected.add('id')
+        return frozenset(selected)
+
+    @classmethod
+    def selection_from_request(cls, request):
+        query_params = getattr(request, 'query_params', None)
+        if query_params is None:
+            return None
+        return cls.select_fields(query_params.get('fields'), query_params.get('expand'))
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, selection=None):
+        """
+        Shape a course queryset for the selected fields: only() the columns
+        they read, join what they follow and prefetch the nested lists they
+        render. With no selection every field is loaded.
+        """
+        if selection is None:
+            selection = frozenset(cls.Meta.fields)
+            columns = None
+        else:
+            model_fields = {field.name for field in Course._meta.concrete_fields}
+            columns = {'id'}
+            for name in selection:
+                if name in cls.FIELD_COLUMNS:
+                    columns.update(cls.FIELD_COLUMNS[name])
+                elif name in model_fields:
+                    columns.add(name)
+
+        related = []
+        if 'instructor' in selection:
+            related.append('instructor')
+        if 'average_rating' in selection or 'total_students' in selection:
+            related.append('stats')
+        if related:
+            queryset = queryset.select_related(*related)
+
+        prefetches = []
+        if 'tags' in selection:
+            prefetches.append('tags')
+        if 'reviews' in selection:
+            prefetches.append(models.Prefetch('reviews', queryset=Review.objects.select_related('user')))
+        if 'modules' in selection:
+            prefetches.extend(['modules', 'modules__sections'])
+        if prefetches:
+            queryset = queryset.prefetch_related(*prefetches)
+
+        if columns is not None:
+            queryset = queryset.only(*columns)
+        return queryset
+
+    @property
+    def _readable_fields(self):
+        # Pruned at render time only, so ?fields= never changes what a
+        # write validates
+        for field in super()._readable_fields:
+            if self.selected_fields is None or field.field_name in self.selected_fields:
+                yield field
+
+    def get_average_rating(self, obj):
+        stats = get_course_stats(obj)
+        if stats is not None:
+            return stats.average_rating
+        return obj.reviews.aggregate(avg_rating=models.Avg('rating'))['avg_rating'] or 0
+
+    def get_total_students(self, obj):
+        stats = get_course_stats(obj)
+        if stats is not None:
+            return stats.active_students
+        return obj.enrollments.filter(status='active').count()
 
     def get_thumbnail_url(self, obj):
         if obj.thumbnail:
@@ -241,20 +363,32 @@ class CourseSerializer(serializers.ModelSerializer):
             return obj.cover_image.url
         return None
 
+    def get_thumbnail_srcset(self, obj):
+        return course_images.srcset(obj, 'thumbnail', self.context.get('request'))
+
+    def get_cover_image_srcset(self, obj):
+        return course_images.srcset(obj, 'cover_image', self.context.get('request'))
+
+    def prime(self, courses):
+        loaders = get_loaders(self.context)
+        if loaders is None:
+            return
+        if self.selected_fields is None or 'progress' in self.selected_fields:
+            loaders.course_progress.prime(course.id for course in courses)
+        for course in courses:
+            for module in prefetched(course, 'modules') or []:
+                loaders.section_completed.prime(
+                    section.id for section in prefetched(module, 'sections') or []
+                )
+
     def get_progress(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            total_lessons = Lesson.objects.filter(
-                section__module__course=obj
-            ).count()
-            if total_lessons == 0:
-                return 0
-            completed_lessons = UserProgress.objects.filter(
-                user=request.user,
-                lesson__section__module__course=obj
-            ).count()
-            return round((completed_lessons / total_lessons) * 100, 2)
-        return 0
+        loaders = get_loaders(self.context)
+        if loaders is None:
+            return 0
+        completed_lessons, total_lessons = loaders.course_progress.load(obj.id)
+        if total_lessons == 0:
+            return 0
+        return round((completed_lessons / total_lessons) * 100, 2)
 
     def to_representation(self, instance):
         try:
@@ -301,6 +435,8 @@ class CourseListSerializer(serializers.ModelSerializer):
     category = serializers.CharField(source='category.name')
     thumbnail_url = serializers.SerializerMethodField()
     cover_image_url = serializers.SerializerMethodField()
+    thumbnail_srcset = serializers.SerializerMethodField()
+    cover_image_srcset = serializers.SerializerMethodField()
     average_rating = serializers.SerializerMethodField()
     total_students = serializers.SerializerMethodField()
 
@@ -308,7 +444,8 @@ class CourseListSerializer(serializers.ModelSerializer):
         model = Course
         fields = [
             'id', 'title', 'description', 'price', 'instructor', 
-            'thumbnail', 'thumbnail_url', 'cover_image_url', 'category', 
+            'thumbnail', 'thumbnail_url', 'cover_image_url', 'thumbnail_srcset',
+            'cover_image_srcset', 'category', 
             'difficulty', 'duration_in_weeks', 'created_at', 'average_rating',
             'total_students'
         ]
@@ -329,10 +466,22 @@ class CourseListSerializer(serializers.ModelSerializer):
             return obj.cover_image.url
         return None
 
+    def get_thumbnail_srcset(self, obj):
+        return course_images.srcset(obj, 'thumbnail', self.context.get('request'))
+
+    def get_cover_image_srcset(self, obj):
+        return course_images.srcset(obj, 'cover_image', self.context.get('request'))
+
     def get_average_rating(self, obj):
+        stats = get_course_stats(obj)
+        if stats is not None:
+            return stats.average_rating
         return obj.reviews.aggregate(avg_rating=models.Avg('rating'))['avg_rating'] or 0
 
     def get_total_students(self, obj):
+        stats = get_course_stats(obj)
+        if stats is not None:
+            return stats.active_students
         return obj.enrollments.filter(status='active').count()
 
 class EnrollmentSerializer(serializers.ModelSerializer):
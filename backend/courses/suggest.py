@@ -0,0 +1,175 @@
+"""
+In-process typeahead index over published course titles, instructor names
+and category names.
+
+The index is a sorted array of (key, entry) pairs searched with bisect. Every
+word start of a name gets a key, so "dja" matches "Advanced Django". Short
+prefixes get their top-k answers precomputed at build time, because their
+bisect ranges can span most of the catalog. A version number kept in the
+database (courses/versions.py) is bumped whenever a course or category
+changes. Each process reads that version at most once every
+COURSE_SUGGEST_VERSION_CHECK_INTERVAL seconds, and at once after a bump of
+its own, then rebuilds its copy lazily on the next lookup.
+"""
+import heapq
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import namedtuple
+
+from django.conf import settings
+from django.db.models import Sum
+
+from . import versions
+
+VERSION_NAME = 'courses:suggest'
+
+# Hard caps that keep the index's memory bounded regardless of catalog size
+MAX_KEY_LENGTH = 48
+MAX_KEYS = 200000
+PRECOMPUTED_PREFIX_LENGTH = 3
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+
+_WORD_START_RE = re.compile(r'\b\w', re.UNICODE)
+
+Suggestion = namedtuple('Suggestion', ['kind', 'id', 'text', 'popularity', 'extra'])
+
+
+def bump_version():
+    versions.bump(VERSION_NAME)
+    # This process sees its own changes on the next lookup
+    _state['checked_at'] = None
+
+
+def current_version():
+    return versions.current(VERSION_NAME)[0]
+
+
+def _normalize(text):
+    return ' '.join(text.lower().split())
+
+
+def _keys_for(text):
+    normalized = _normalize(text)
+    for match in _WORD_START_RE.finditer(normalized):
+        yield normalized[match.start():match.start() + MAX_KEY_LENGTH]
+
+
+class SuggestionIndex:
+    def __init__(self, suggestions):
+        pairs = []
+        for position, suggestion in enumerate(suggestions):
+            for key in _keys_for(suggestion.text):
+                pairs.append((key, position))
+                if len(pairs) >= MAX_KEYS:
+                    break
+            if len(pairs) >= MAX_KEYS:
+                break
+        pairs.sort()
+        self.suggestions = suggestions
+        self.keys = [key for key, _ in pairs]
+        self.positions = [position for _, position in pairs]
+        self.precomputed = self._precompute()
+
+    def _precompute(self):
+        buckets = {}
+        for key, position in zip(self.keys, self.positions):
+            for length in range(1, PRECOMPUTED_PREFIX_LENGTH + 1):
+                if len(key) >= length:
+                    buckets.setdefault(key[:length], set()).add(position)
+        return {
+            prefix: self._top(positions, MAX_LIMIT * 2)
+            for prefix, positions in buckets.items()
+        }
+
+    def _top(self, positions, limit):
+        return heapq.nsmallest(
+            limit,
+            positions,
+            key=lambda position: (-self.suggestions[position].popularity, position)
+        )
+
+    def lookup(self, prefix, limit=DEFAULT_LIMIT):
+        prefix = _normalize(prefix)[:MAX_KEY_LENGTH]
+        if not prefix:
+            return []
+        if len(prefix) <= PRECOMPUTED_PREFIX_LENGTH:
+            top = self.precomputed.get(prefix, [])[:limit]
+        else:
+            start = bisect_left(self.keys, prefix)
+            end = bisect_left(self.keys, prefix + '\U0010ffff', start)
+            top = self._top(set(self.positions[start:end]), limit)
+        return [self.suggestions[position] for position in top]
+
+
+def build_suggestions():
+    from .models import Category, Course
+    from accounts.models import User
+
+    courses = Course.objects.filter(is_published=True).values_list(
+        'id', 'title', 'instructor_id', 'instructor__username', 'category__name',
+        'stats__active_students', 'stats__average_rating'
+    )
+    suggestions = []
+    for course_id, title, instructor_id, username, category, students, rating in courses.iterator():
+        suggestions.append(Suggestion(
+            'course', course_id, title, (students or 0) + (rating or 0),
+            {'instructor': username, 'category': category}
+        ))
+
+    instructors = User.objects.filter(courses_taught__is_published=True).annotate(
+        popularity=Sum('courses_taught__stats__active_students')
+    ).values_list('id', 'username', 'first_name', 'last_name', 'popularity')
+    for user_id, username, first_name, last_name, popularity in instructors.iterator():
+        full_name = f"{first_name} {last_name}".strip()
+        for text in filter(None, {username, full_name}):
+            suggestions.append(Suggestion('instructor', user_id, text, popularity or 0, {'username': username}))
+
+    categories = Category.objects.filter(courses__is_published=True).annotate(
+        popularity=Sum('courses__stats__active_students')
+    ).values_list('id', 'name', 'popularity')
+    for category_id, name, popularity in categories.iterator():
+        suggestions.append(Suggestion('category', category_id, name, popularity or 0, {}))
+
+    return suggestions
+
+
+_lock = threading.Lock()
+_state = {'version': None, 'index': None, 'checked_at': None}
+
+
+def check_interval():
+    return getattr(settings, 'COURSE_SUGGEST_VERSION_CHECK_INTERVAL', 5)
+
+
+def get_index():
+    checked_at = _state['checked_at']
+    now = time.monotonic()
+    if _state['index'] is not None and checked_at is not None and now - checked_at < check_interval():
+        return _state['index']
+    version = current_version()
+    _state['checked_at'] = now
+    if _state['version'] != version:
+        with _lock:
+            if _state['version'] != version:
+                _state['index'] = SuggestionIndex(build_suggestions())
+                _state['version'] = version
+    return _state['index']
+
+
+def suggest(prefix, limit=DEFAULT_LIMIT):
+    limit = max(1, min(limit, MAX_LIMIT))
+    results = []
+    seen = set()
+    # Several keys of one name can match, so ask for extra and dedupe
+    for suggestion in get_index().lookup(prefix, limit * 2):
+        marker = (suggestion.kind, suggestion.id)
+        if marker in seen:
+            continue
+        seen.add(marker)
+        results.append(suggestion)
+        if len(results) == limit:
+            break
+    return results
@@ -1,11 +1,31 @@
-from django.test import TestCase
+import hashlib
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
-from .models import Category, Course, Section, Lesson, Enrollment
+from .models import (
+    Category, Course, CourseStats, Module, Section, Lesson, CourseTag, Job, PaymentOrder, Review, UploadSession
+)
+from . import conditional as course_conditional
+from . import delivery as course_delivery
+from . import jobs as course_jobs
+from . import payments as course_payments
+from . import search as course_search
+from . import suggest as course_suggest
+from . import seats as course_seats
+from . import outline_sync as course_outline_sync
+from enrollments.models import Enrollment
 
 class CoursesAPITestCase(TestCase):
     def setUp(self):
@@ -87,4 +107,627 @@ class CoursesAPITestCase(TestCase):
             'category': self.category.id
         }
         response = self.client.post(reverse('course-list'), data)
-        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class CourseFieldSelectionTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.instructor = User.objects.create_user(
+            'teacher', 'teacher@example.com', 'teacherpass', user_type='instructor')
+        self.category = Category.objects.create(name="Programming")
+        self.tag = CourseTag.objects.create(name="python")
+        for index in range(3):
+            self.create_course(f"Course {index}")
+        self.url = reverse('courses:course-list')
+
+    def create_course(self, title):
+        course = Course.objects.create(
+            title=title,
+            description="Course description",
+            instructor=self.instructor,
+            category=self.category,
+            is_published=True
+        )
+        course.tags.add(self.tag)
+        module = Module.objects.create(course=course, title="Module", order=1)
+        Section.objects.create(module=module, title="Section", order=1)
+        return course
+
+    def get_results(self, params, expected_queries):
+        with self.assertNumQueries(expected_queries):
+            response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['results']
+
+    def test_fields_limit_payload_and_queries(self):
+        results = self.get_results({'fields': 'id,title'}, 2)
+        self.assertEqual(len(results), 3)
+        self.assertEqual(set(results[0]), {'id', 'title'})
+
+    def test_fields_limit_selected_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url, {'fields': 'id,title'})
+        course_query = next(
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('SELECT "courses_course"."id"')
+        )
+        self.assertIn('"courses_course"."title"', course_query)
+        self.assertNotIn('"courses_course"."description"', course_query)
+        self.assertNotIn('"courses_course"."price"', course_query)
+
+    def test_related_fields_are_joined(self):
+        results = self.get_results({'fields': 'title,instructor,average_rating,total_students'}, 2)
+        self.assertEqual(results[0]['instructor']['username'], 'teacher')
+        self.assertNotIn('modules', results[0])
+
+    def test_expand_prefetches_nested_lists(self):
+        results = self.get_results({'expand': 'modules'}, 4)
+        self.assertEqual(len(results[0]['modules'][0]['sections']), 1)
+        self.assertIn('description', results[0])
+        self.assertNotIn('reviews', results[0])
+
+        results = self.get_results({'fields': 'id', 'expand': 'tags,reviews'}, 4)
+        self.assertEqual(set(results[0]), {'id', 'tags', 'reviews'})
+
+    def test_expand_query_count_does_not_grow_with_courses(self):
+        for index in range(3, 10):
+            self.create_course(f"Course {index}")
+        results = self.get_results({'expand': 'modules,tags,reviews'}, 6)
+        self.assertEqual(len(results), 10)
+
+
+class ModulePdfDeliveryTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.instructor = User.objects.create_user(
+            'teacher', 'teacher@example.com', 'teacherpass', user_type='instructor')
+        self.course = Course.objects.create(
+            title="PDF Course",
+            description="Course description",
+            instructor=self.instructor,
+            category=Category.objects.create(name="Programming"),
+            is_published=True
+        )
+        self.module = Module.objects.create(course=self.course, title="Module", order=1)
+        self.pdf = b'%PDF-1.4 test document'
+        self.module.set_pdf_data(self.pdf, 'notes.pdf', 'application/pdf')
+        self.module.save()
+        self.url = reverse('courses:module_pdf', args=[self.module.id])
+
+    def test_parse_ranges(self):
+        self.assertEqual(course_delivery.parse_ranges('bytes=0-3', 10), [(0, 3)])
+        self.assertEqual(course_delivery.parse_ranges('bytes=-4', 10), [(6, 9)])
+        self.assertEqual(course_delivery.parse_ranges('bytes=5-', 10), [(5, 9)])
+        self.assertEqual(course_delivery.parse_ranges('bytes=4-6,0-2,3-3', 10), [(0, 6)])
+        self.assertEqual(course_delivery.parse_ranges('bytes=0-1,5-6', 10), [(0, 1), (5, 6)])
+        self.assertEqual(course_delivery.parse_ranges('bytes=20-30', 10), [])
+        self.assertIsNone(course_delivery.parse_ranges('bytes=5-2', 10))
+        self.assertIsNone(course_delivery.parse_ranges('items=0-3', 10))
+        self.assertIsNone(course_delivery.parse_ranges('bytes=abc', 10))
+
+    def test_serves_whole_pdf(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(b''.join(response.streaming_content), self.pdf)
+
+    def test_range_requests(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-3')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response['Content-Range'], f'bytes 0-3/{len(self.pdf)}')
+        self.assertEqual(b''.join(response.streaming_content), self.pdf[:4])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-200')
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.pdf)}')
+
+
+class ChunkedUploadTestCase(TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        settings_override = override_settings(
+            MEDIA_ROOT=temp_dir.name,
+            CHUNKED_UPLOAD_DIR=f'{temp_dir.name}/chunks'
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client = APIClient()
+        self.instructor = User.objects.create_user(
+            'teacher', 'teacher@example.com', 'teacherpass', user_type='instructor')
+        course = Course.objects.create(
+            title="Upload Course",
+            description="Course description",
+            instructor=self.instructor,
+            category=Category.objects.create(name="Programming")
+        )
+        self.module = Module.objects.create(course=course, title="Module", order=1)
+        self.client.force_authenticate(user=self.instructor)
+        self.pdf = b'%PDF-1.4 ' + b'x' * 100
+
+    def open_session(self):
+        response = self.client.post(reverse('courses:upload_session_create'), {
+            'target': 'module',
+            'target_id': self.module.id,
+            'filename': 'notes.pdf',
+            'size': len(self.pdf),
+            'sha256': hashlib.sha256(self.pdf).hexdigest(),
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return reverse('courses:upload_session', args=[response.data['upload_id']])
+
+    def put_chunk(self, url, start, end, checksum=None):
+        chunk = self.pdf[start:end + 1]
+        return self.client.put(
+            url, chunk,
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{end}/{len(self.pdf)}',
+            HTTP_X_CHUNK_SHA256=checksum or hashlib.sha256(chunk).hexdigest()
+        )
+
+    def test_resume_after_bad_chunk(self):
+        url = self.open_session()
+        self.assertEqual(self.put_chunk(url, 0, 49).data['offset'], 50)
+
+        # A corrupt chunk is rejected and the offset stays where it was
+        response = self.put_chunk(url, 50, 108, checksum='0' * 64)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['offset'], 50)
+        self.assertEqual(self.client.get(url).data['offset'], 50)
+
+        # A chunk that does not continue at the offset is refused
+        response = self.put_chunk(url, 60, 108)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+        # Resending the first chunk is a no-op
+        self.assertEqual(self.put_chunk(url, 0, 49).data['offset'], 50)
+        self.assertEqual(self.put_chunk(url, 50, 108).data['offset'], len(self.pdf))
+
+        response = self.client.post(f'{url}finalize/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.module.refresh_from_db()
+        with self.module.pdf_file.open('rb') as stored:
+            self.assertEqual(stored.read(), self.pdf)
+        self.assertEqual(UploadSession.objects.get().status, 'complete')
+
+    def test_finalize_requires_every_byte(self):
+        url = self.open_session()
+        self.put_chunk(url, 0, 49)
+        response = self.client.post(f'{url}finalize/')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['offset'], 50)
+
+
+class OutlineSyncTestCase(TestCase):
+    def setUp(self):
+        instructor = User.objects.create_user(
+            'teacher', 'teacher@example.com', 'teacherpass', user_type='instructor')
+        self.course = Course.objects.create(
+            title="Outline Course",
+            description="Course description",
+            instructor=instructor,
+            category=Category.objects.create(name="Programming")
+        )
+        self.modules = [
+            Module.objects.create(course=self.course, title=f"Module {order}", order=order)
+            for order in (1, 2)
+        ]
+        self.sections = [
+            Section.objects.create(module=self.modules[0], title=f"Section {order}", order=order)
+            for order in (1, 2, 3)
+        ]
+
+    def outline(self):
+        return [
+            (module.title, [section.title for section in module.sections.order_by('order')])
+            for module in self.course.modules.order_by('order')
+        ]
+
+    def test_reorders_without_order_conflicts(self):
+        first, second = self.modules
+        section_1, section_2, section_3 = self.sections
+        course_outline_sync.sync_outline(self.course, [
+            {'id': second.id, 'title': second.title, 'order': 1},
+            {'id': first.id, 'title': first.title, 'order': 2, 'sections': [
+                {'id': section_3.id, 'title': section_3.title, 'order': 1},
+                {'id': section_1.id, 'title': section_1.title, 'order': 2},
+                {'title': 'Section 4', 'order': 3},
+            ]},
+        ])
+        self.assertEqual(self.outline(), [
+            ('Module 2', []),
+            ('Module 1', ['Section 3', 'Section 1', 'Section 4']),
+        ])
+        self.assertFalse(Section.objects.filter(pk=section_2.pk).exists())
+
+    def test_removes_modules_missing_from_outline(self):
+        first, second = self.modules
+        course_outline_sync.sync_outline(self.course, [
+            {'id': second.id, 'title': 'Renamed', 'order': 1},
+        ])
+        self.assertEqual(self.outline(), [('Renamed', [])])
+        self.assertFalse(Section.objects.filter(module_id=first.id).exists())
+
+
+def double_job(value):
+    return value * 2
+
+
+def failing_job(**kwargs):
+    raise ValueError('Job failed')
+
+
+class JobQueueTestCase(TestCase):
+    def test_claim_and_execute(self):
+        low = course_jobs.enqueue(double_job, priority=course_jobs.PRIORITY_LOW, value=1)
+        high = course_jobs.enqueue(double_job, priority=course_jobs.PRIORITY_HIGH, value=21)
+
+        job = course_jobs.claim('worker-1')
+        self.assertEqual(job.pk, high.pk)
+        self.assertEqual((job.status, job.attempts), ('running', 1))
+        self.assertTrue(course_jobs.execute(job, 'worker-1'))
+
+        high.refresh_from_db()
+        self.assertEqual((high.status, high.result), ('done', 42))
+        self.assertEqual(course_jobs.claim('worker-1').pk, low.pk)
+        self.assertIsNone(course_jobs.claim('worker-1'))
+
+    def test_expired_lease_is_claimed_again(self):
+        queued = course_jobs.enqueue(double_job, value=2)
+        job = course_jobs.claim('worker-1')
+        self.assertIsNone(course_jobs.claim('worker-2'))
+
+        Job.objects.filter(pk=queued.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        retaken = course_jobs.claim('worker-2')
+        self.assertEqual((retaken.pk, retaken.attempts), (queued.pk, 2))
+
+        # The first worker lost its lease and cannot record an outcome
+        self.assertFalse(course_jobs.execute(job, 'worker-1'))
+        self.assertTrue(course_jobs.execute(retaken, 'worker-2'))
+        self.assertEqual(Job.objects.get(pk=queued.pk).status, 'done')
+
+    def test_worker_heartbeat(self):
+        self.assertFalse(course_jobs.workers_alive())
+        course_jobs.work('worker-1', threading.Event(), burst=True)
+        self.assertTrue(course_jobs.workers_alive())
+
+        with override_settings(JOB_WORKER_HEARTBEAT_TIMEOUT=0):
+            self.assertFalse(course_jobs.workers_alive())
+
+    def test_retry_with_backoff(self):
+        queued = course_jobs.enqueue(failing_job, max_attempts=2)
+        before = timezone.now()
+        course_jobs.execute(course_jobs.claim('worker-1'), 'worker-1')
+
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('queued', 1))
+        self.assertIn('Job failed', queued.last_error)
+        self.assertGreaterEqual(queued.run_at, before + timedelta(seconds=course_jobs.BACKOFF_BASE))
+        self.assertIsNone(course_jobs.claim('worker-1'))
+
+        Job.objects.filter(pk=queued.pk).update(run_at=timezone.now())
+        course_jobs.execute(course_jobs.claim('worker-1'), 'worker-1')
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('failed', 2))
+
+    def test_backoff_grows_up_to_limit(self):
+        self.assertTrue(10 <= course_jobs.backoff(1) <= 11)
+        self.assertTrue(40 <= course_jobs.backoff(3) <= 44)
+        self.assertLessEqual(course_jobs.backoff(30), course_jobs.BACKOFF_MAX * 1.1)
+
+    def test_keyed_jobs_coalesce_while_queued(self):
+        first = course_jobs.enqueue(double_job, key='double', value=1)
+        self.assertIsNone(course_jobs.enqueue(double_job, key='double', value=1))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Job.objects.create(name=first.name, key='double')
+
+        # Once the job runs, the next trigger queues a new one
+        job = course_jobs.claim('worker-1')
+        second = course_jobs.enqueue(double_job, key='double', value=1)
+        self.assertIsNotNone(second)
+
+        # A failed run whose key is queued again hands its retry over
+        Job.objects.filter(pk=first.pk).update(name=course_jobs.job_name(failing_job))
+        job.name = course_jobs.job_name(failing_job)
+        self.assertTrue(course_jobs.execute(job, 'worker-1'))
+        self.assertEqual(Job.objects.get(pk=first.pk).status, 'failed')
+        self.assertEqual(Job.objects.get(pk=second.pk).status, 'queued')
+
+
+class PaymentOrderTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        instructor = User.objects.create_user(
+            'teacher', 'teacher@example.com', 'teacherpass', user_type='instructor')
+        self.student = User.objects.create_user(
+            'student', 'student@example.com', 'studentpass')
+        self.course = Course.objects.create(
+            title="Paid Course",
+            description="Course description",
+            instructor=instructor,
+            category=Category.objects.create(name="Programming"),
+            price=499,
+            is_published=True
+        )
+        patcher = mock.patch('razorpay.Client')
+        self.razorpay = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.razorpay.order.all.return_value = {'items': []}
+        self.razorpay.order.create.side_effect = lambda data: {
+            'id': 'order_1', 'amount': data['amount'], 'currency': 'INR', 'receipt': data['receipt']
+        }
+
+    def test_retried_job_reuses_stored_order(self):
+        first = course_payments.create_razorpay_order(self.course.id, self.student.id, receipt='r1')
+        second = course_payments.create_razorpay_order(self.course.id, self.student.id, receipt='r1')
+        self.assertEqual(first, second)
+        self.assertEqual(first['amount'], 49900)
+        self.assertEqual(self.razorpay.order.create.call_count, 1)
+        self.assertEqual(PaymentOrder.objects.get().order_id, 'order_1')
+
+    def test_order_created_before_a_crash_is_found_by_receipt(self):
+        self.razorpay.order.all.return_value = {'items': [
+            {'id': 'order_0', 'amount': 49900, 'currency': 'INR', 'receipt': 'r1'}
+        ]}
+        order = course_payments.create_razorpay_order(self.course.id, self.student.id, receipt='r1')
+        self.assertEqual(order['id'], 'order_0')
+        self.razorpay.order.create.assert_not_called()
+        self.assertEqual(PaymentOrder.objects.get(receipt='r1').order_id, 'order_0')
+
+    def test_checkout_without_worker_creates_order_inline(self):
+        self.client.force_authenticate(user=self.student)
+        response = self.client.post(reverse('courses:create_payment_order', args=[self.course.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['id'], 'order_1')
+        self.assertEqual(Job.objects.get().status, 'done')
+
+    @override_settings(PAYMENT_ORDER_INLINE_AFTER=0)
+    def test_status_poll_runs_unclaimed_job(self):
+        # A worker is alive but never gets to the job
+        course_jobs.heartbeat()
+        self.client.force_authenticate(user=self.student)
+        response = self.client.post(reverse('courses:create_payment_order', args=[self.course.id]))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+        response = self.client.get(
+            reverse('courses:payment_order_status', args=[self.course.id, response.data['job_id']])
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['id'], 'order_1')
+        self.assertEqual(Job.objects.get().status, 'done')
+
+
+class CourseSeatsTestCase(TestCase):
+    def setUp(self):
+        instructor = User.objects.create_user(
+            'teacher', 'teacher@example.com', 'teacherpass', user_type='instructor')
+        self.course = Course.objects.create(
+            title="Capped Course",
+            description="Course description",
+            instructor=instructor,
+            category=Category.objects.create(name="Programming"),
+            max_students=2,
+            is_published=True
+        )
+        self.students = [
+            User.objects.create_user(f'student{index}', f'student{index}@example.com', 'studentpass')
+            for index in range(4)
+        ]
+
+    def enroll(self, student):
+        return course_seats.enroll(student, self.course)
+
+    def test_take_until_full_then_waitlist(self):
+        outcomes = [self.enroll(student)[1] for student in self.students[:3]]
+        self.assertEqual(outcomes, ['enrolled', 'enrolled', 'waitlisted'])
+        self.assertEqual(course_seats.seats_left(self.course), 0)
+        self.assertEqual(course_seats.take(self.course), 0)
+
+        waitlisted = Enrollment.objects.get(user=self.students[2])
+        self.assertEqual(course_seats.waitlist_position(waitlisted), 1)
+        self.assertEqual(self.enroll(self.students[0])[1], 'already_enrolled')
+
+    def test_released_seat_goes_to_waitlist(self):
+        first, _ = self.enroll(self.students[0])
+        second, _ = self.enroll(self.students[1])
+        self.enroll(self.students[2])
+
+        first.status = 'dropped'
+        first.save()
+        self.assertEqual(Enrollment.objects.get(user=self.students[2]).status, 'active')
+        self.assertEqual(course_seats.seats_left(self.course), 0)
+
+        second.delete()
+        self.assertEqual(course_seats.seats_left(self.course), 1)
+
+    def test_reconcile_does_not_hand_out_seats_in_flight(self):
+        self.enroll(self.students[0])
+        # A request has taken the last seat but not written its enrollment yet
+        self.assertEqual(course_seats.take(self.course), 1)
+        course_seats.reconcile([self.course.id])
+        self.assertEqual(course_seats.seats_left(self.course), 0)
+
+        # The seat that never got its enrollment is only recovered on request
+        course_seats.reconcile([self.course.id], exact=True)
+        self.assertEqual(course_seats.seats_left(self.course), 1)
+
+        # Enrollments written around the counter lower it
+        Enrollment.objects.bulk_create([Enrollment(user=self.students[3], course=self.course, status='active')])
+        course_seats.reconcile([self.course.id])
+        self.assertEqual(course_seats.seats_left(self.course), 0)
+
+    def test_raising_the_cap_admits_waitlisted_students(self):
+        for student in self.students[:3]:
+            self.enroll(student)
+        self.course.max_students = 4
+        self.course.save()
+        self.assertEqual(Enrollment.objects.get(user=self.students[2]).status, 'active')
+        self.assertEqual(course_seats.seats_left(self.course), 1)
+
+
+class RemoveStudentTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.instructor = User.objects.create_user(
+            'teacher', 'teacher@example.com', 'teacherpass', user_type='instructor')
+        self.student = User.objects.create_user(
+            'student', 'student@example.com', 'studentpass')
+        other = User.objects.create_user(
+            'other', 'other@example.com', 'otherpass')
+        self.course = Course.objects.create(
+            title="Course",
+            description="Course description",
+            instructor=self.instructor,
+            category=Category.objects.create(name="Programming")
+        )
+        Enrollment.objects.create(user=self.student, course=self.course, status='active')
+        Enrollment.objects.create(user=other, course=self.course, status='active')
+
+    def test_remove_student_updates_course_stats(self):
+        self.assertEqual(CourseStats.objects.get(course=self.course).active_students, 2)
+        self.client.force_authenticate(user=self.instructor)
+        response = self.client.delete(reverse('courses:remove-student', args=[self.student.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(Enrollment.objects.get(user=self.student).status, 'dropped')
+        self.assertEqual(CourseStats.objects.get(course=self.course).active_students, 1)
+
+
+class CatalogVersionTestCase(TestCase):
+    def setUp(self):
+        self.student = User.objects.create_user(
+            'student', 'student@example.com', 'studentpass')
+        self.course = Course.objects.create(
+            title="Course",
+            description="Course description",
+            instructor=User.objects.create_user(
+                'teacher', 'teacher@example.com', 'teacherpass', user_type='instructor'),
+            category=Category.objects.create(name="Programming")
+        )
+
+    def assertCatalogTouched(self, touched, write):
+        before = course_conditional.catalog_modified()[0]
+        write()
+        self.assertEqual(course_conditional.catalog_modified()[0] != before, touched)
+
+    def test_enrollment_touches_catalog_on_status_change_only(self):
+        enrollment = Enrollment.objects.create(user=self.student, course=self.course, status='active')
+        enrollment = Enrollment.objects.get(pk=enrollment.pk)
+
+        enrollment.progress_percentage = 50.0
+        self.assertCatalogTouched(False, enrollment.save)
+        enrollment.status = 'dropped'
+        self.assertCatalogTouched(True, enrollment.save)
+        self.assertEqual(CourseStats.objects.get(course=self.course).active_students, 0)
+
+    def test_review_touches_catalog_on_rating_change_only(self):
+        review = Review.objects.create(course=self.course, user=self.student, rating=4, comment="Good")
+        review = Review.objects.get(pk=review.pk)
+
+        review.comment = "Very good"
+        self.assertCatalogTouched(False, review.save)
+        review.rating = 5
+        self.assertCatalogTouched(True, review.save)
+        self.assertCatalogTouched(True, review.delete)
+
+
+class CatalogPaginationTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.instructor = User.objects.create_user(
+            'teacher', 'teacher@example.com', 'teacherpass', user_type='instructor')
+        self.category = Category.objects.create(name="Programming")
+        self.url = reverse('courses:course_list_api')
+        course_search.create_index()
+        self.addCleanup(course_search.drop_index)
+
+    def create_course(self, title, description="Course description"):
+        return Course.objects.create(
+            title=title,
+            description=description,
+            instructor=self.instructor,
+            category=self.category,
+            is_published=True
+        )
+
+    def walk(self, params):
+        ids = []
+        response = self.client.get(self.url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(course['id'] for course in response.data['results'])
+            if not response.data['next']:
+                return ids
+            response = self.client.get(response.data['next'])
+
+    def test_catalog_is_paginated_by_default(self):
+        for index in range(3):
+            self.create_course(f"Course {index}")
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertIsNone(response.data['next'])
+
+    def test_cursor_pages_are_stable_across_inserts(self):
+        created_at = timezone.now()
+        courses = [self.create_course(f"Course {index}") for index in range(4)]
+        # Rows sharing a created_at are told apart by id
+        Course.objects.update(created_at=created_at)
+
+        response = self.client.get(self.url, {'page_size': 2})
+        first_page = [course['id'] for course in response.data['results']]
+        self.assertEqual(first_page, [courses[3].id, courses[2].id])
+
+        # Newer courses land before the cursor and do not shift the next page
+        newer = self.create_course("Newer")
+        response = self.client.get(response.data['next'])
+        self.assertEqual([course['id'] for course in response.data['results']], [courses[1].id, courses[0].id])
+        self.assertIsNone(response.data['next'])
+
+        # Going back returns the same first page, and a fresh walk starts at the newer course
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([course['id'] for course in response.data['results']], first_page)
+        self.assertEqual(self.walk({'page_size': 2}), [newer.id] + [course.id for course in reversed(courses)])
+
+    def test_search_pages_keep_rank_order(self):
+        # The oldest course is the best match, so date order would put it last
+        best = self.create_course("Django Django", "Django")
+        good = self.create_course("Django basics")
+        weak = self.create_course("Web basics", "Uses Django")
+        self.create_course("Cooking")
+
+        self.assertEqual(self.walk({'search': 'django', 'page_size': 1}), [best.id, good.id, weak.id])
+
+
+class CourseSuggestTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        instructor = User.objects.create_user(
+            'teacher', 'teacher@example.com', 'teacherpass', user_type='instructor')
+        category = Category.objects.create(name="Programming")
+        for index in range(course_suggest.MAX_LIMIT + 5):
+            Course.objects.create(
+                title=f"Python {index}",
+                description="Course description",
+                instructor=instructor,
+                category=category,
+                is_published=True
+            )
+        self.url = reverse('courses:course_suggest_api')
+
+    def test_limit_is_capped(self):
+        response = self.client.get(self.url, {'q': 'pyth', 'limit': 1000})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), course_suggest.MAX_LIMIT)
+
+    def test_version_is_checked_once_per_interval(self):
+        course_suggest.get_index()
+        with self.assertNumQueries(0):
+            course_suggest.suggest('pyth')
+
+        # A change made by this process is seen at once
+        Course.objects.filter(title="Python 0").update(title="Django")
+        course_suggest.bump_version()
+        self.assertEqual(course_suggest.suggest('djan')[0].text, "Django")
@@ -0,0 +1,222 @@
+"""
+Resumable, chunked uploads of module PDFs, section PDFs and section files.
+
+A client opens an UploadSession with the file's name and total size.
+It then PUTs the bytes piece by piece; each piece carries its position
+in a Content-Range header and its SHA-256 in X-Chunk-SHA256. Chunks are
+streamed into a temporary file under CHUNKED_UPLOAD_DIR and hashed as
+they arrive, so a request only ever holds one read buffer, whatever the
+chunk or file size. A chunk whose checksum does not match is truncated
+away and can be sent again. After a dropped connection the client reads
+the session's offset and carries on from there. Finalizing hands the
+assembled file to the target's content-addressed file field and removes
+the temporary file.
+"""
+import hashlib
+import os
+import re
+import tempfile
+
+from django.conf import settings
+from django.core.files import File as DjangoFile
+from django.utils import timezone
+
+from . import contentstore
+
+READ_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 16 * 1024 * 1024
+PDF_TARGETS = ('module', 'section')
+
+_CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400, **extra):
+        super().__init__(message)
+        self.status = status
+        self.extra = extra
+
+
+def upload_dir():
+    path = getattr(settings, 'CHUNKED_UPLOAD_DIR', None) or os.path.join(tempfile.gettempdir(), 'chunked_uploads')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def temp_path(session):
+    return os.path.join(upload_dir(), f'{session.id}.part')
+
+
+def max_upload_size():
+    return getattr(settings, 'CHUNKED_UPLOAD_MAX_SIZE', 2 * 1024 * 1024 * 1024)
+
+
+def resolve_target(user, target, target_id):
+    """The module or section an upload attaches to, checked against the course's instructor"""
+    from .models import Module, Section
+
+    if target == 'module':
+        instance = Module.objects.select_related('course').filter(pk=target_id).first()
+        course = instance.course if instance else None
+    elif target in ('section', 'file'):
+        instance = Section.objects.select_related('module__course').filter(pk=target_id).first()
+        course = instance.module.course if instance and instance.module else None
+    else:
+        raise UploadError("target must be one of 'module', 'section' or 'file'")
+
+    if instance is None or course is None:
+        raise UploadError(f'{target.capitalize()} not found', status=404)
+    if course.instructor_id != user.id:
+        raise UploadError('You do not have permission to upload to this course', status=403)
+    return instance
+
+
+def open_session(user, data):
+    from .models import File, UploadSession
+
+    target = data.get('target')
+    filename = os.path.basename(str(data.get('filename') or '')).strip()
+    try:
+        target_id = int(data.get('target_id'))
+        size = int(data.get('size'))
+    except (TypeError, ValueError):
+        raise UploadError('target_id and size must be integers')
+    if not filename:
+        raise UploadError('filename is required')
+    if target in PDF_TARGETS and not filename.lower().endswith('.pdf'):
+        raise UploadError('The uploaded file is not a PDF')
+    if size <= 0 or size > max_upload_size():
+        raise UploadError(f'size must be between 1 and {max_upload_size()} bytes')
+    checksum = str(data.get('sha256') or '').lower()
+    if checksum and not re.fullmatch(r'[0-9a-f]{64}', checksum):
+        raise UploadError('sha256 must be a hex SHA-256 digest')
+
+    file_type = data.get('file_type') or 'pdf'
+    if file_type not in dict(File.FILE_TYPES):
+        raise UploadError(f'Unknown file_type {file_type}')
+
+    resolve_target(user, target, target_id)
+    session = UploadSession.objects.create(
+        user=user,
+        target=target,
+        target_id=target_id,
+        file_type=file_type,
+        filename=filename,
+        size=size,
+        sha256=checksum,
+    )
+    # Reserve the temporary file so chunks can be written at any offset
+    open(temp_path(session), 'wb').close()
+    return session
+
+
+def parse_content_range(header, session):
+    match = _CONTENT_RANGE.match((header or '').strip())
+    if not match:
+        raise UploadError('Content-Range must look like "bytes <start>-<end>/<size>"')
+    start, end, total = (int(value) for value in match.groups())
+    if total != session.size or end < start or end >= total:
+        raise UploadError('Content-Range does not fit the upload', status=416, offset=session.received)
+    if end - start + 1 > MAX_CHUNK_SIZE:
+        raise UploadError(f'Chunks may be at most {MAX_CHUNK_SIZE} bytes', status=413)
+    return start, end - start + 1
+
+
+def write_chunk(session, stream, start, length, checksum):
+    """
+    Append one chunk at `start`, streaming it from `stream` while hashing
+    it. Returns the session's new offset.
+    """
+    from .models import UploadSession
+
+    if session.status != 'open':
+        raise UploadError(f'Upload is {session.status}', status=409)
+    if start + length <= session.received:
+        # A retry of a chunk that already arrived
+        return session.received
+    if start != session.received:
+        raise UploadError('Chunk does not start at the current offset', status=409, offset=session.received)
+    if not checksum:
+        raise UploadError('X-Chunk-SHA256 header is required')
+
+    digest = hashlib.sha256()
+    remaining = length
+    with open(temp_path(session), 'r+b') as part:
+        part.seek(start)
+        while remaining > 0:
+            data = stream.read(min(READ_SIZE, remaining))
+            if not data:
+                break
+            digest.update(data)
+            part.write(data)
+            remaining -= len(data)
+        if remaining or digest.hexdigest() != checksum.lower():
+            # Drop the partial or corrupt chunk so it can be resent as is
+            part.truncate(start)
+            reason = 'Chunk ended early' if remaining else 'Chunk checksum does not match'
+            raise UploadError(reason, status=400, offset=start)
+
+    updated = UploadSession.objects.filter(pk=session.pk, received=start, status='open').update(
+        received=start + length, updated_at=timezone.now()
+    )
+    if not updated:
+        session.refresh_from_db(fields=['received', 'status'])
+        raise UploadError('Upload changed while the chunk was written', status=409, offset=session.received)
+    session.received = start + length
+    return session.received
+
+
+def _attach(session, instance, content):
+    from .models import File
+
+    if session.target == 'module':
+        instance.pdf_file = content
+        instance.pdf_url = None
+        instance.content_type = 'both' if instance.video_url else 'pdf'
+        instance.save()
+        return {'module_id': instance.id, 'url': instance.pdf_file.url}
+    if session.target == 'section':
+        instance.pdf_file = content
+        instance.content_type = 'both' if instance.video_url else 'pdf'
+        instance._pdf_file_changed = True
+        instance.save()
+        return {'section_id': instance.id, 'url': instance.pdf_file.url}
+    file = File.objects.create(
+        section=instance,
+        file=content,
+        file_type=session.file_type,
+        name=session.filename,
+    )
+    return {'section_id': instance.id, 'file_id': file.id, 'url': file.file.url}
+
+
+def finalize(session):
+    """Verify the assembled file and attach it to its module, section or new File"""
+    from .models import UploadSession
+
+    if session.status != 'open':
+        raise UploadError(f'Upload is {session.status}', status=409)
+    if session.received != session.size:
+        raise UploadError('Upload is incomplete', status=409, offset=session.received)
+
+    instance = resolve_target(session.user, session.target, session.target_id)
+    path = temp_path(session)
+    with open(path, 'rb') as assembled:
+        content = DjangoFile(assembled, name=session.filename)
+        if session.sha256:
+            digest, _ = contentstore.hash_file(content)
+            if digest != session.sha256:
+                raise UploadError('File checksum does not match', status=400)
+        result = _attach(session, instance, content)
+
+    UploadSession.objects.filter(pk=session.pk).update(status='complete', updated_at=timezone.now())
+    session.status = 'complete'
+    discard(session)
+    return result
+
+
+def discard(session):
+    try:
+        os.remove(temp_path(session))
+    except FileNotFoundError:
+        pass
@@ -4,6 +4,8 @@ from rest_framework.routers import DefaultRouter
 from . import views
 from .views import (
     CourseListAPIView, 
+    CourseSuggestAPIView,
+    CourseFacetsAPIView,
     CreateCourseAPIView, 
     InstructorCoursesAPIView, 
     CourseStatusUpdateAPIView,
@@ -45,6 +47,8 @@ urlpatterns = [
     # Public API endpoints (no authentication required)
     path('', CourseListAPIView.as_view(), name='course_list_api'),  # Main course listing endpoint
     path('categories/', CategoryListAPIView.as_view(), name='category_list_api'),
+    path('suggest/', CourseSuggestAPIView.as_view(), name='course_suggest_api'),
+    path('facets/', CourseFacetsAPIView.as_view(), name='course_facets_api'),
     
     # Course detail endpoints
     path('<int:pk>/', CourseDetailAPIView.as_view(), name='course_detail_api'),
@@ -62,6 +66,8 @@ urlpatterns = [
     path('instructor/courses/<int:pk>/', InstructorCourseDetailAPIView.as_view(), name='instructor-course-detail-api'),
     path('instructor/courses/<int:course_id>/view/', instructor_course_view, name='instructor-course-view-api'),
     path('instructor/courses/<int:pk>/update_status/', CourseStatusUpdateAPIView.as_view(), name='course-status-update-api'),
+    path('instructor/courses/<int:course_id>/clone/', views.clone_course, name='course-clone-api'),
+    path('instructor/courses/<int:course_id>/enrollments/bulk/', views.bulk_enroll, name='course-bulk-enroll-api'),
     path('instructor/enrolled-students/', views.get_enrolled_students, name='enrolled-students'),
     path('instructor/enrollments/', views.get_course_enrollments, name='course-enrollments'),
     path('instructor/remove-student/<int:student_id>/', views.remove_student, name='remove-student'),
@@ -74,6 +80,10 @@ urlpatterns = [
     path('<int:course_id>/sections/<int:section_id>/complete/', mark_section_complete, name='mark_section_complete'),
     path('<int:course_id>/quizzes/<int:quiz_id>/submit/', submit_quiz_results, name='submit_quiz_results'),
     path('<int:course_id>/sections/<int:section_id>/notes/', save_section_notes, name='save_section_notes'),
+    path('modules/<int:module_id>/pdf/', serve_module_pdf_from_db, name='module_pdf'),
+    path('uploads/', views.UploadSessionCreateAPIView.as_view(), name='upload_session_create'),
+    path('uploads/<uuid:upload_id>/', views.UploadSessionAPIView.as_view(), name='upload_session'),
+    path('uploads/<uuid:upload_id>/finalize/', views.UploadSessionFinalizeAPIView.as_view(), name='upload_session_finalize'),
     
     # Web views (non-API endpoints)
     path('web/', views.CourseListView.as_view(), name='course_list'),
@@ -90,6 +100,7 @@ urlpatterns = [
     # Add router URLs to urlpatterns
     path('', include(router.urls)),
     path('<int:course_id>/create-payment/', views.create_payment_order, name='create_payment_order'),
+    path('<int:course_id>/payment-orders/<int:job_id>/', views.payment_order_status, name='payment_order_status'),
     path('<int:course_id>/direct-payment/', views.direct_payment_order, name='direct_payment_order'),
     path('<int:course_id>/verify-payment/', views.verify_payment, name='verify_payment'),
     path('<int:course_id>/direct-enroll/', views.direct_enroll, name='direct_enroll'),
@@ -0,0 +1,38 @@
+"""
+Version numbers that invalidate caches built from course data.
+
+Each cache has a CacheVersion row. A change bumps the row's version with
+one F() UPDATE, and readers compare the stored version with the one their
+cached data was built for. The row lives in the database, so a bump in
+one web worker, in run_worker or in a management command is seen by
+every other process, whichever cache backend is configured.
+"""
+from django.db.models import F
+from django.utils import timezone
+
+
+def _create(name):
+    from .models import CacheVersion
+
+    CacheVersion.objects.bulk_create(
+        [CacheVersion(name=name, version=1, updated_at=timezone.now())], ignore_conflicts=True
+    )
+
+
+def bump(name):
+    from .models import CacheVersion
+
+    versions = CacheVersion.objects.filter(name=name)
+    if not versions.update(version=F('version') + 1, updated_at=timezone.now()):
+        _create(name)
+
+
+def current(name):
+    """(version, updated_at) of the named cache, created on first use"""
+    from .models import CacheVersion
+
+    row = CacheVersion.objects.filter(name=name).values_list('version', 'updated_at').first()
+    if row is None:
+        _create(name)
+        row = CacheVersion.objects.filter(name=name).values_list('version', 'updated_at').get()
+    return row
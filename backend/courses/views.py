@@ -2,19 +2,21 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.contrib import messages
 from django.db.models import Q, Avg, Count, Prefetch
 from django.conf import settings
-from django.db import models
-from django.http import JsonResponse
+from django.db import IntegrityError, models, transaction
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.utils import timezone
-from .models import Course, Category, Section, Lesson, Review, Module, UserProgress, Quiz, File
+from .models import Course, Category, Section, Lesson, Review, Module, UserProgress, Quiz, File, CourseStats, UploadSession, get_course_stats
 from .forms import CourseForm, SectionForm, LessonForm, ReviewForm
 from accounts.models import User
 from enrollments.models import Enrollment, Progress
+from enrollments import completion as enrollment_completion
+from enrollments import bulk as enrollment_bulk
 from .serializers import (
     CourseSerializer,
     ModuleSerializer,
@@ -29,6 +31,22 @@ from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import NotFound
+from .pagination import CourseCursorPagination
+from . import search as course_search
+from . import suggest as course_suggest
+from . import facets as course_facets
+from . import conditional as course_conditional
+from . import export as course_export
+from .recommendations import get_related_courses
+from . import outline as course_outline
+from . import outline_sync as course_outline_sync
+from . import delivery as course_delivery
+from . import uploads as course_uploads
+from . import payments as course_payments
+from . import cloning as course_cloning
+from . import seats as course_seats
+from analytics.refresh import schedule_refresh
 from django.http import Http404
 from django.contrib.auth import get_user_model
 from rest_framework.views import APIView
@@ -55,6 +73,13 @@ class CourseListView(ListView):
     context_object_name = 'courses'
     paginate_by = 9
     
+    def get(self, request, *args, **kwargs):
+        # Full-catalog exports stream straight from the queryset, unpaginated
+        export_format = course_export.requested_format(request)
+        if export_format:
+            return course_export.catalog_response(self.get_queryset(), export_format)
+        return super().get(request, *args, **kwargs)
+    
     def get_queryset(self):
         queryset = Course.objects.filter(is_published=True)
         category = self.request.GET.get('category')
@@ -63,13 +88,16 @@ class CourseListView(ListView):
         
         if category:
             queryset = queryset.filter(category__id=category)
+        if difficulty:
+            queryset = queryset.filter(difficulty=difficulty)
         if search:
+            ranked = course_search.filter_ranked(queryset, search)
+            if ranked is not None:
+                return ranked
             queryset = queryset.filter(
                 Q(title__icontains=search) | 
                 Q(description__icontains=search)
             )
-        if difficulty:
-            queryset = queryset.filter(difficulty=difficulty)
             
         return queryset
     
@@ -121,13 +149,10 @@ class CourseDetailView(DetailView):
             # Try to get the course with proper relationships
             course = Course.objects.select_related(
                 'instructor', 
-                'category'
+                'category',
+                'stats'
             ).prefetch_related(
-                'modules',
-                'modules__sections',
-                'modules__sections__lessons',
-                'reviews__user',
-                'enrollments'
+                'reviews__user'
             ).get(id=course_id)
             
             # Check if course is published or user is staff/instructor
@@ -161,6 +186,12 @@ class CourseDetailView(DetailView):
                 }, status=500)
             raise
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        if isinstance(self.object, Course):
+            context['related_courses'] = get_related_courses(self.object)
+        return context
+
     def render_to_response(self, context, **response_kwargs):
         """Handle both API and web responses"""
         if self.request.headers.get('Accept') == 'application/json' or self.request.path.startswith('/api/'):
@@ -168,7 +199,8 @@ class CourseDetailView(DetailView):
                 course = self.get_object()
                 if isinstance(course, JsonResponse):  # If get_object returned an error response
                     return course
-                    
+                
+                stats = get_course_stats(course)
                 data = {
                     'id': course.id,
                     'title': course.title,
@@ -191,22 +223,16 @@ class CourseDetailView(DetailView):
                     'created_at': course.created_at.isoformat(),
                     'updated_at': course.updated_at.isoformat(),
                     'modules': [{
-                        'id': module.id,
-                        'title': module.title,
-                        'order': module.order,
+                        'id': module['id'],
+                        'title': module['title'],
+                        'order': module['order'],
                         'sections': [{
-                            'id': section.id,
-                            'title': section.title,
-                            'order': section.order,
-                            'lessons': [{
-                                'id': lesson.id,
-                                'title': lesson.title,
-                                'order': lesson.order,
-                                'content_type': lesson.content_type,
-                                'duration': lesson.duration
-                            } for lesson in section.lessons.all()]
-                        } for section in module.sections.all()]
-                    } for module in course.modules.all()],
+                            'id': section['id'],
+                            'title': section['title'],
+                            'order': section['order'],
+                            'lessons': section['lessons']
+                        } for section in module['sections']]
+                    } for module in course_outline.get_outline(course.id)],
                     'reviews': [{
                         'id': review.id,
                         'user': review.user.username,
@@ -214,9 +240,14 @@ class CourseDetailView(DetailView):
                         'comment': review.comment,
                         'created_at': review.created_at.isoformat()
                     } for review in course.reviews.all()],
-                    'avg_rating': course.reviews.aggregate(Avg('rating'))['rating__avg'] or 0,
-                    'total_students': course.enrollments.filter(status='active').count(),
-                    'is_published': course.is_published
+                    'avg_rating': stats.average_rating if stats else course.reviews.aggregate(Avg('rating'))['rating__avg'] or 0,
+                    'total_students': stats.active_students if stats else course.enrollments.filter(status='active').count(),
+                    'is_published': course.is_published,
+                    'related_courses': [{
+                        'id': related.id,
+                        'title': related.title,
+                        'thumbnail_url': related.thumbnail.url if related.thumbnail else None
+                    } for related in get_related_courses(course)]
                 }
                 
                 if self.request.user.is_authenticated:
@@ -364,13 +395,21 @@ class CourseViewSet(viewsets.ModelViewSet):
         - Instructors see their own courses in instructor views
         - Staff/admin see all courses
         """
-        queryset = Course.objects.prefetch_related(
-            'modules',
-            'modules__sections',
-            'modules__sections__lessons',
-            'tags',
-            'reviews'
-        ).select_related('instructor', 'category')
+        selection = None
+        if self.action in ('list', 'retrieve', 'instructor_courses'):
+            selection = CourseSerializer.selection_from_request(self.request)
+
+        if selection is not None:
+            # Load only what the requested ?fields=/?expand= render
+            queryset = CourseSerializer.setup_eager_loading(Course.objects.all(), selection)
+        else:
+            queryset = Course.objects.prefetch_related(
+                'modules',
+                'modules__sections',
+                'modules__sections__lessons',
+                'tags',
+                'reviews'
+            ).select_related('instructor', 'category', 'stats')
         
         # If it's an instructor accessing their courses
         if self.action == 'instructor_courses':
@@ -502,40 +541,36 @@ class CourseViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Check if already enrolled
-            enrollment = Enrollment.objects.filter(user=user, course=course).first()
-            if enrollment:
-                if enrollment.status == 'active':
+            # Takes a seat if the course is capped, or joins the waitlist once it is full;
+            # progress rows are created on first interaction
+            enrollment, outcome = course_seats.enroll(user, course)
+            if outcome == 'already_enrolled':
+                if enrollment.status == 'waitlisted':
                     return Response(
-                        {'message': 'You are already enrolled in this course'},
+                        {
+                            'message': 'You are already on the waitlist for this course',
+                            'waitlist_position': course_seats.waitlist_position(enrollment)
+                        },
                         status=status.HTTP_400_BAD_REQUEST
                     )
-                elif enrollment.status == 'dropped':
-                    # Reactivate enrollment
-                    enrollment.status = 'active'
-                    enrollment.save()
-                    return Response(
-                        {'message': 'Your enrollment has been reactivated'},
-                        status=status.HTTP_200_OK
-                    )
-            
-            # Create new enrollment
-            enrollment = Enrollment.objects.create(
-                user=user,
-                course=course,
-                status='active'
-            )
-            
-            # Create progress records for all lessons
-            lessons = Lesson.objects.filter(section__course=course)
-            Progress.objects.bulk_create([
-                Progress(
-                    user=user,
-                    lesson=lesson,
-                    enrollment=enrollment,
-                    completed=False
-                ) for lesson in lessons
-            ])
+                return Response(
+                    {'message': 'You are already enrolled in this course'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if outcome == 'waitlisted':
+                return Response(
+                    {
+                        'message': 'This course is full. You have been added to the waitlist',
+                        'status': 'waitlisted',
+                        'waitlist_position': course_seats.waitlist_position(enrollment)
+                    },
+                    status=status.HTTP_202_ACCEPTED
+                )
+            if outcome == 'reactivated':
+                return Response(
+                    {'message': 'Your enrollment has been reactivated'},
+                    status=status.HTTP_200_OK
+                )
             
             return Response(
                 {'message': 'Successfully enrolled in the course'},
@@ -631,7 +666,7 @@ class LessonViewSet(viewsets.ModelViewSet):
 @login_required
 def mark_lesson_complete(request, lesson_id):
     lesson = get_object_or_404(Lesson, id=lesson_id)
-    enrollment = get_object_or_404(Enrollment, user=request.user, course=lesson.section.course)
+    enrollment = get_object_or_404(Enrollment, user=request.user, course=lesson.section.module.course)
     
     # Create or update progress
     progress, created = Progress.objects.get_or_create(
@@ -644,6 +679,8 @@ def mark_lesson_complete(request, lesson_id):
         progress.completed = True
         progress.completed_at = timezone.now()
         progress.save()
+    enrollment_completion.mark_completed(enrollment, enrollment_completion.mask([lesson.ordinal]))
+    schedule_refresh(enrollment.course_id)
     
     return JsonResponse({
         'status': 'success',
@@ -666,17 +703,12 @@ class EnrolledCoursesAPIView(generics.ListAPIView):
         if not self.request.user.is_authenticated:
             return Course.objects.none()
             
-        return Course.objects.filter(
+        queryset = Course.objects.filter(
             enrollments__user=self.request.user,
             enrollments__status='active'
-        ).select_related(
-            'instructor',
-            'category'
-        ).prefetch_related(
-            'modules',
-            'modules__sections',
-            'modules__sections__lessons'
         ).distinct()
+        selection = CourseSerializer.selection_from_request(self.request)
+        return CourseSerializer.setup_eager_loading(queryset, selection)
 
     def list(self, request, *args, **kwargs):
         """Return list of enrolled courses with proper error handling"""
@@ -689,15 +721,18 @@ class EnrolledCoursesAPIView(generics.ListAPIView):
                 }, status=status.HTTP_401_UNAUTHORIZED)
 
             queryset = self.get_queryset()
-            serializer = self.get_serializer(queryset, many=True)
+            courses = {course.id: course for course in queryset}
+            serializer = self.get_serializer(list(courses.values()), many=True)
             courses_data = serializer.data
+            enrollments = {
+                enrollment.course_id: enrollment
+                for enrollment in Enrollment.objects.filter(user=request.user, course_id__in=courses)
+            }
+            course_lessons = enrollment_completion.CourseLessons.for_courses(courses)
 
             # Add enrollment and progress data to each course
             for course_data in courses_data:
-                enrollment = Enrollment.objects.filter(
-                    user=request.user,
-                    course_id=course_data['id']
-                ).first()
+                enrollment = enrollments.get(course_data['id'])
                 
                 if enrollment:
                     course_data['enrollment'] = {
@@ -707,30 +742,16 @@ class EnrolledCoursesAPIView(generics.ListAPIView):
                         'progress_percentage': enrollment.progress_percentage
                     }
                     
-                    # Add progress data
-                    progress_data = Progress.objects.filter(
-                        enrollment=enrollment
-                    ).select_related('lesson').values(
-                        'lesson_id',
-                        'completed',
-                        'completed_at'
-                    )
-                    
-                    # Calculate total lessons
-                    course = queryset.get(id=course_data['id'])
-                    total_lessons = sum(
-                        section.lessons.count()
-                        for module in course.modules.all()
-                        for section in module.sections.all()
-                    )
-                    
+                    # Add progress data from the enrollment's completion bitmap
+                    lessons = course_lessons[course_data['id']]
+                    bits = enrollment_completion.to_bits(enrollment.completion_bitmap)
                     course_data['progress'] = {
-                        'completed_lessons': len([p for p in progress_data if p['completed']]),
-                        'total_lessons': total_lessons,
-                        'lessons': {p['lesson_id']: {
-                            'completed': p['completed'],
-                            'completed_at': p['completed_at']
-                        } for p in progress_data}
+                        'completed_lessons': enrollment.completed_lessons,
+                        'total_lessons': enrollment.total_lessons,
+                        'lessons': {
+                            lesson_id: {'completed': lessons.is_completed(bits, lesson_id)}
+                            for lesson_id in lessons.ordinals
+                        }
                     }
 
             return Response({
@@ -750,17 +771,13 @@ class CourseListAPIView(generics.ListAPIView):
     """API endpoint to list all published courses"""
     serializer_class = CourseListSerializer
     permission_classes = [AllowAny]  # Allow any user to view the course list
-    pagination_class = None
+    pagination_class = CourseCursorPagination  # See COURSE_CATALOG_LEGACY_UNPAGINATED
 
     def get_queryset(self):
         queryset = Course.objects.filter(is_published=True).select_related(
             'instructor',
-            'category'
-        ).prefetch_related(
-            'modules',
-            'modules__sections',
-            'modules__sections__lessons',
-            'enrollments'
+            'category',
+            'stats'
         ).order_by('-created_at')
         
         # Apply filters
@@ -771,26 +788,33 @@ class CourseListAPIView(generics.ListAPIView):
         if category:
             queryset = queryset.filter(category__name__iexact=category)
             
-        if search:
-            search_terms = search.split()
-            q_objects = Q()
-            for term in search_terms:
-                q_objects |= (
-                    Q(title__icontains=term) | 
-                    Q(description__icontains=term) |
-                    Q(instructor__username__icontains=term) |
-                    Q(category__name__icontains=term)
-                )
-            queryset = queryset.filter(q_objects)
-            
         if difficulty:
             queryset = queryset.filter(difficulty=difficulty)
+            
+        if search:
+            # Prefer the ranked full-text index, fall back to substring matching
+            ranked = course_search.filter_ranked(queryset, search)
+            if ranked is not None:
+                return ranked
+            queryset = queryset.filter(course_search.substring_filter(search))
         
         return queryset
 
     def list(self, request, *args, **kwargs):
+        validators = course_conditional.catalog_validators()
+        not_modified = validators.not_modified(request)
+        if not_modified is not None:
+            return not_modified
+        
         try:
             queryset = self.get_queryset()
+            
+            # Cursor pages are returned in the paginated shape, search or not
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                serializer = self.get_serializer(page, many=True)
+                return validators.apply(self.get_paginated_response(serializer.data))
+            
             serializer = self.get_serializer(queryset, many=True)
             
             # If it's a search request, return suggestions
@@ -803,10 +827,12 @@ class CourseListAPIView(generics.ListAPIView):
                         'instructor': course.instructor.username,
                         'category': course.category.name if course.category else None
                     })
-                return Response(suggestions, status=status.HTTP_200_OK)
+                return validators.apply(Response(suggestions, status=status.HTTP_200_OK))
             
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return validators.apply(Response(serializer.data, status=status.HTTP_200_OK))
             
+        except NotFound:
+            raise
         except Exception as e:
             return Response(
                 {
@@ -816,6 +842,49 @@ class CourseListAPIView(generics.ListAPIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+class CourseSuggestAPIView(APIView):
+    """Typeahead suggestions for course titles, instructors and categories"""
+    permission_classes = [AllowAny]
+    
+    def get(self, request):
+        query = request.query_params.get('q') or request.query_params.get('search', '')
+        try:
+            limit = int(request.query_params.get('limit', course_suggest.DEFAULT_LIMIT))
+        except ValueError:
+            limit = course_suggest.DEFAULT_LIMIT
+        limit = max(1, min(limit, course_suggest.MAX_LIMIT))
+        
+        suggestions = []
+        for suggestion in course_suggest.suggest(query, limit):
+            item = {
+                'type': suggestion.kind,
+                'id': suggestion.id,
+                'text': suggestion.text
+            }
+            if suggestion.kind == 'course':
+                item['title'] = suggestion.text
+            item.update(suggestion.extra)
+            suggestions.append(item)
+        
+        return Response(suggestions, status=status.HTTP_200_OK)
+
+class CourseFacetsAPIView(APIView):
+    """Course counts per catalog filter value for the current search and filters"""
+    permission_classes = [AllowAny]
+    
+    def get(self, request):
+        try:
+            return Response(course_facets.get_facets(request.query_params), status=status.HTTP_200_OK)
+        except Exception as e:
+            print(f"Error computing course facets: {str(e)}")
+            return Response(
+                {
+                    'error': 'Failed to fetch course facets',
+                    'message': str(e)
+                },
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
 class CreateCourseAPIView(generics.CreateAPIView):
     """API endpoint to create a new course"""
     serializer_class = CourseSerializer
@@ -1017,8 +1086,13 @@ class CreateCourseAPIView(generics.CreateAPIView):
                         status=status.HTTP_400_BAD_REQUEST
                     )
             
+            # Re-read the course shaped for the fields the response renders
+            course = CourseSerializer.setup_eager_loading(
+                Course.objects.filter(pk=course.pk),
+                CourseSerializer.selection_from_request(request)
+            ).get()
             return Response(
-                serializer.data,
+                self.get_serializer(course).data,
                 status=status.HTTP_201_CREATED
             )
             
@@ -1057,12 +1131,12 @@ class InstructorCoursesAPIView(generics.ListAPIView):
             instructor=self.request.user
         ).select_related(
             'instructor',
-            'category'
+            'category',
+            'stats'
         ).prefetch_related(
             'modules',
             'modules__sections',
-            'modules__sections__lessons',
-            'enrollments'
+            'modules__sections__lessons'
         ).order_by('-created_at')
         
         print(f"Found {queryset.count()} courses for instructor")
@@ -1110,15 +1184,18 @@ class InstructorCoursesAPIView(generics.ListAPIView):
             queryset = self.get_queryset()
             print(f"Found {queryset.count()} courses for instructor")
             
-            serializer = self.get_serializer(queryset, many=True)
+            courses = list(queryset)
+            serializer = self.get_serializer(courses, many=True)
             serialized_data = serializer.data
             print("Successfully serialized courses")
             
             # Process each course to include additional data
+            courses_by_id = {course.id: course for course in courses}
             courses_data = []
             for course in serialized_data:
                 try:
-                    course_obj = queryset.get(id=course['id'])
+                    course_obj = courses_by_id[course['id']]
+                    stats = get_course_stats(course_obj)
                     course_data = {
                         'id': course['id'],
                         'title': course['title'],
@@ -1136,8 +1213,8 @@ class InstructorCoursesAPIView(generics.ListAPIView):
                         },
                         'category': course.get('category'),
                         'difficulty_level': course.get('difficulty', 'beginner'),
-                        'total_students': course_obj.enrollments.filter(status='active').count(),
-                        'total_lessons': sum(
+                        'total_students': stats.active_students if stats else course_obj.enrollments.filter(status='active').count(),
+                        'total_lessons': stats.lesson_count if stats else sum(
                             section.lessons.count() 
                             for module in course_obj.modules.all() 
                             for section in module.sections.all()
@@ -1245,6 +1322,108 @@ class CourseStatusUpdateAPIView(generics.UpdateAPIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, IsInstructorOrAdminUser])
+def clone_course(request, course_id):
+    """
+    Copy a course with its whole module/section/lesson tree as a new draft,
+    e.g. to start a new term. Files are shared with the original.
+    """
+    try:
+        course = get_object_or_404(Course, id=course_id)
+        if not request.user.is_staff and request.user != course.instructor:
+            return Response(
+                {'error': 'You do not have permission to copy this course'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        title = request.data.get('title')
+        title_format = title.replace('{', '{{').replace('}', '}}') if title else '{title} (copy)'
+        course_map = course_cloning.clone_courses(
+            [course.id],
+            instructor=request.user,
+            title_format=title_format,
+            version=request.data.get('version')
+        )
+        clone = Course.objects.get(id=course_map[course.id])
+        print(f"Cloned course {course.id} into {clone.id} for {request.user.username}")
+        
+        return Response({
+            'id': clone.id,
+            'title': clone.title,
+            'version': clone.version,
+            'status': clone.status,
+            'is_published': clone.is_published,
+            'cloned_from': course.id
+        }, status=status.HTTP_201_CREATED)
+        
+    except Http404:
+        return Response({'error': 'Course not found'}, status=status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        print(f"Error cloning course: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, IsInstructorOrAdminUser])
+def bulk_enroll(request, course_id):
+    """
+    Enroll a cohort from a CSV or JSON list of usernames or emails, sent as
+    the request body or as a `file` upload. Once every row is processed,
+    one outcome per row is streamed back as NDJSON, or as CSV with
+    ?report=csv.
+    """
+    try:
+        course = get_object_or_404(Course, id=course_id)
+        if not request.user.is_staff and request.user != course.instructor:
+            return Response(
+                {'error': 'You do not have permission to enroll students in this course'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        if request.content_type.startswith('multipart/form-data'):
+            source = request.FILES.get('file')
+            source_format = source and enrollment_bulk.input_format(source.content_type, source.name)
+        else:
+            # Read straight from the request body, a chunk at a time
+            source = request.stream
+            source_format = enrollment_bulk.input_format(request.content_type)
+        if source is None:
+            return Response({'error': 'No list of students provided'}, status=status.HTTP_400_BAD_REQUEST)
+        if source_format is None:
+            return Response(
+                {'error': 'Send a CSV or JSON list of usernames or emails'},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+            )
+        
+        # Not ?format=, which DRF keeps for its own renderers
+        output_format = request.query_params.get('report', 'ndjson')
+        if output_format not in enrollment_bulk.OUTPUT_FORMATS:
+            output_format = 'ndjson'
+        # Every batch is written before the report goes out, so a client
+        # that disconnects early cannot cut the cohort short
+        print(f"Bulk enrollment into course {course.id} started by {request.user.username}")
+        report = enrollment_bulk.enroll_all(
+            course, enrollment_bulk.read_identifiers(source, source_format)
+        )
+        return StreamingHttpResponse(
+            enrollment_bulk.report_lines(enrollment_bulk.read_report(report), output_format),
+            content_type=enrollment_bulk.OUTPUT_FORMATS[output_format]
+        )
+        
+    except Http404:
+        return Response({'error': 'Course not found'}, status=status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        print(f"Error in bulk enrollment: {str(e)}")
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
 class CategoryListAPIView(generics.ListAPIView):
     """API endpoint to list all categories"""
     queryset = Category.objects.all()
@@ -1267,53 +1446,27 @@ class InstructorCourseDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = CourseSerializer
     permission_classes = [IsAuthenticated]
     
+    def get_serializer_fields(self):
+        # Modules come from the cached outline rather than the serializer
+        selection = CourseSerializer.selection_from_request(self.request)
+        return (selection or frozenset(CourseSerializer.Meta.fields)) - {'modules'}
+
     def get_queryset(self):
         # Only allow access to courses where the logged-in user is the instructor
-        return Course.objects.filter(instructor=self.request.user)
+        queryset = Course.objects.filter(instructor=self.request.user)
+        if self.request.method == 'GET':
+            queryset = CourseSerializer.setup_eager_loading(queryset, self.get_serializer_fields())
+        return queryset
     
     def retrieve(self, request, *args, **kwargs):
         """Override to include modules and sections data"""
         try:
             course = self.get_object()
-            serializer = self.get_serializer(course)
+            serializer = self.get_serializer(course, fields=self.get_serializer_fields())
             data = serializer.data
             
             # Add modules data
-            modules_data = []
-            for module in course.modules.all().order_by('order'):
-                sections_data = []
-                for section in module.sections.all().order_by('order'):
-                    # For PDF files, ensure we provide the full URL
-                    pdf_url = None
-                    if section.pdf_file:
-                        pdf_url = request.build_absolute_uri(section.pdf_file.url)
-                    elif section.pdf_url:
-                        if section.pdf_url.startswith('http'):
-                            pdf_url = section.pdf_url
-                        else:
-                            pdf_url = request.build_absolute_uri(section.pdf_url)
-                    
-                    sections_data.append({
-                        'id': section.id,
-                        'title': section.title,
-                        'description': section.description,
-                        'content_type': section.content_type,
-                        'video_url': section.video_url,
-                        'video_id': section.video_id,
-                        'pdf_url': pdf_url,
-                        'has_pdf_file': bool(section.pdf_file),
-                        'order': section.order
-                    })
-                
-                modules_data.append({
-                    'id': module.id,
-                    'title': module.title,
-                    'description': module.description,
-                    'order': module.order,
-                    'sections': sections_data
-                })
-            
-            data['modules'] = modules_data
+            data['modules'] = course_outline.module_summaries(course_outline.get_outline(course.id), request)
             
             return Response(data)
         except Exception as e:
@@ -1648,6 +1801,14 @@ class CourseContentAPIView(APIView):
     permission_classes = [AllowAny]  # For now, allow anyone to view course content
     
     def get(self, request, pk):
+        validators = course_conditional.course_validators(
+            request, pk, course_conditional.user_section_progress
+        )
+        if validators is not None:
+            not_modified = validators.not_modified(request)
+            if not_modified is not None:
+                return not_modified
+        
         try:
             course = get_object_or_404(Course, id=pk)
             # Check if we should include private data
@@ -1655,31 +1816,22 @@ class CourseContentAPIView(APIView):
                 request.user == course.instructor or request.user.is_staff
             )
             
-            # Get modules
-            modules = course.modules.all().order_by('order')
-            
-            # For each module, check if it has PDF data in the database
-            for module in modules:
-                if module.pdf_binary:
-                    module.has_pdf_binary_field = True  # Add temporary field for serialization
-                else:
-                    module.has_pdf_binary_field = False
+            # Sections count as completed once all their lessons are
+            completed_lesson_ids = frozenset()
+            if request.user.is_authenticated:
+                completed_lesson_ids = frozenset(Progress.objects.filter(
+                    enrollment__user=request.user,
+                    enrollment__course=course,
+                    enrollment__status='active',
+                    completed=True
+                ).values_list('lesson_id', flat=True))
             
             # Serialize modules with sections
-            serialized_modules = ModuleSerializer(
-                modules, many=True, context={'request': request}
-            ).data
-            
-            # For debugging only: Print PDF data status
-            for i, module in enumerate(modules):
-                print(f"Module {module.id}: {module.title}")
-                print(f"  - Has PDF binary: {bool(module.pdf_binary)}")
-                print(f"  - PDF URL: {module.pdf_url}")
-                print(f"  - Content type: {module.content_type}")
-                if i < len(serialized_modules):
-                    print(f"  - Serialized has_pdf_binary: {serialized_modules[i].get('has_pdf_binary')}")
+            serialized_modules = course_outline.content_modules(
+                course_outline.get_outline(course.id), request, completed_lesson_ids
+            )
             
-            return Response({
+            response = Response({
                 'id': course.id,
                 'title': course.title,
                 'description': course.description,
@@ -1690,6 +1842,7 @@ class CourseContentAPIView(APIView):
                 },
                 'modules': serialized_modules
             })
+            return validators.apply(response) if validators is not None else response
         except Exception as e:
             return Response({
                 'error': str(e)
@@ -1851,10 +2004,20 @@ def remove_student(request, student_id):
         )
         
         # Update the status to 'dropped' instead of actually deleting
-        enrollments.update(status='dropped')
+        course_ids = []
+        for pk, course_id in enrollments.values_list('pk', 'course_id'):
+            # Only rows still active are counted, however many requests drop them
+            if Enrollment.objects.filter(pk=pk, status='active').update(status='dropped'):
+                course_ids.append(course_id)
+        # The queryset updates skip the Enrollment signals, so their work is repeated here
+        for course_id in course_ids:
+            CourseStats.add(course_id, active_students=-1)
+            course_seats.release(course_id)
+        if course_ids:
+            course_conditional.touch_catalog()
 
         return Response({
-            'message': f'Successfully removed student from {enrollments.count()} courses'
+            'message': f'Successfully removed student from {len(course_ids)} courses'
         })
     except get_user_model().DoesNotExist:
         return Response(
@@ -1873,18 +2036,23 @@ class CourseDetailAPIView(generics.RetrieveAPIView):
     permission_classes = [permissions.AllowAny]
     lookup_field = 'pk'
 
+    def get_serializer_fields(self):
+        # Modules come from the cached outline rather than the serializer
+        selection = CourseSerializer.selection_from_request(self.request)
+        return (selection or frozenset(CourseSerializer.Meta.fields)) - {'modules'}
+
     def get_queryset(self):
-        return Course.objects.select_related(
-            'instructor',
-            'category'
-        ).prefetch_related(
-            'modules',
-            'modules__sections',
-            'modules__sections__lessons',
-            'reviews'
-        )
+        return CourseSerializer.setup_eager_loading(Course.objects.all(), self.get_serializer_fields())
 
     def retrieve(self, request, *args, **kwargs):
+        validators = course_conditional.course_validators(
+            request, kwargs.get(self.lookup_field), course_conditional.user_lesson_progress
+        )
+        if validators is not None:
+            not_modified = validators.not_modified(request)
+            if not_modified is not None:
+                return not_modified
+        
         try:
             course = self.get_object()
             
@@ -1898,49 +2066,11 @@ class CourseDetailAPIView(generics.RetrieveAPIView):
                     status=status.HTTP_404_NOT_FOUND
                 )
             
-            serializer = self.get_serializer(course)
+            serializer = self.get_serializer(course, fields=self.get_serializer_fields())
             data = serializer.data
             
             # Add modules and their sections to the response
-            modules_data = []
-            for module in course.modules.all().order_by('order'):
-                # Get sections data for this module
-                sections_data = []
-                for section in module.sections.all().order_by('order'):
-                    # For PDF files, ensure we provide the full URL
-                    pdf_url = None
-                    if section.pdf_file:
-                        pdf_url = request.build_absolute_uri(section.pdf_file.url)
-                    elif section.pdf_url:
-                        if section.pdf_url.startswith('http'):
-                            pdf_url = section.pdf_url
-                        else:
-                            pdf_url = request.build_absolute_uri(section.pdf_url)
-                            
-                    section_data = {
-                        'id': section.id,
-                        'title': section.title,
-                        'description': section.description,
-                        'order': section.order,
-                        'content_type': section.content_type,
-                        'video_url': section.video_url,
-                        'video_id': section.video_id,
-                        'pdf_url': pdf_url,
-                        'has_pdf_file': bool(section.pdf_file),
-                    }
-                    sections_data.append(section_data)
-                
-                # Add module data with its sections
-                module_data = {
-                    'id': module.id,
-                    'title': module.title,
-                    'description': module.description,
-                    'order': module.order,
-                    'sections': sections_data
-                }
-                modules_data.append(module_data)
-            
-            # Add modules to course data
+            modules_data = course_outline.module_summaries(course_outline.get_outline(course.id), request)
             data['modules'] = modules_data
             
             # Log what we're returning for debugging
@@ -1948,7 +2078,8 @@ class CourseDetailAPIView(generics.RetrieveAPIView):
             for idx, module in enumerate(modules_data):
                 print(f"  Module {idx+1}: {module['title']} with {len(module['sections'])} sections")
                 
-            return Response(data)
+            response = Response(data)
+            return validators.apply(response) if validators is not None else response
             
         except Course.DoesNotExist:
             return Response(
@@ -2034,35 +2165,36 @@ def mark_section_complete(request, course_id, section_id):
         enrollment = get_object_or_404(Enrollment, user=request.user, course=course, status='active')
         
         # Get lessons in this section
-        lessons = Lesson.objects.filter(section=section)
-        
-        # Mark all lessons as complete
-        for lesson in lessons:
-            progress, created = Progress.objects.get_or_create(
-                enrollment=enrollment,
-                lesson=lesson,
-                defaults={
-                    'completed': True,
-                    'completed_at': timezone.now()
-                }
+        lessons = list(Lesson.objects.filter(
+            section=section, section__module__course=course
+        ).values_list('id', 'ordinal'))
+        
+        with transaction.atomic():
+            # Mark all lessons as complete in one upsert. Lessons completed
+            # before are left out so they keep their completed_at.
+            bits = enrollment_completion.to_bits(enrollment.completion_bitmap)
+            now = timezone.now()
+            Progress.objects.bulk_create(
+                [
+                    Progress(enrollment=enrollment, lesson_id=lesson_id, completed=True, completed_at=now)
+                    for lesson_id, ordinal in lessons
+                    if ordinal is None or not bits >> ordinal & 1
+                ],
+                update_conflicts=True,
+                unique_fields=['enrollment', 'lesson'],
+                update_fields=['completed', 'completed_at', 'last_accessed'],
             )
             
-            if not created and not progress.completed:
-                progress.completed = True
-                progress.completed_at = timezone.now()
-                progress.save()
-        
-        # Update enrollment progress
-        total_lessons = Lesson.objects.filter(section__module__course=course).count()
-        completed_lessons = Progress.objects.filter(
-            enrollment=enrollment,
-            completed=True
-        ).count()
+            # Update enrollment progress; the counters are updated along with the bitmap
+            enrollment_completion.mark_completed(
+                enrollment, enrollment_completion.mask(ordinal for lesson_id, ordinal in lessons)
+            )
+            
+            if enrollment.total_lessons > 0:
+                enrollment.current_section = section
+                enrollment.save()
         
-        if total_lessons > 0:
-            enrollment.progress_percentage = (completed_lessons / total_lessons) * 100
-            enrollment.current_section = section
-            enrollment.save()
+        schedule_refresh(course.id)
         
         return Response({
             'success': True,
@@ -2086,31 +2218,29 @@ def get_course_progress(request, course_id):
         # Check if user is enrolled
         enrollment = get_object_or_404(Enrollment, user=request.user, course=course, status='active')
         
-        # Get all completed lessons for this enrollment
-        completed_progress = Progress.objects.filter(
-            enrollment=enrollment,
-            completed=True
-        )
+        # Completed lessons come from the enrollment's completion bitmap
+        course_lessons = enrollment_completion.CourseLessons.for_course(course.id)
+        bits = enrollment_completion.to_bits(enrollment.completion_bitmap)
         
-        # Create a dictionary of section_id -> completed status
-        sections_completed = {}
-        for progress in completed_progress:
-            if progress.lesson.section:
-                section_id = progress.lesson.section.id
-                if section_id not in sections_completed:
-                    # Check if all lessons in this section are completed
-                    total_lessons = Lesson.objects.filter(section_id=section_id).count()
-                    completed_lessons = completed_progress.filter(lesson__section_id=section_id).count()
-                    sections_completed[section_id] = total_lessons == completed_lessons
+        # Create a dictionary of section_id -> completed status for the sections started
+        sections_completed = {
+            section_id: course_lessons.section_completed(bits, section_id)
+            for section_id, section_mask in course_lessons.section_masks.items()
+            if bits & section_mask
+        }
         
         # Get quiz progress
         quiz_progress = {}
-        for progress in completed_progress:
-            if progress.lesson.content_type == 'quiz' and progress.score is not None:
-                quiz = get_object_or_404(Quiz, lesson=progress.lesson)
-                quiz_progress[quiz.id] = {
-                    'score': progress.score,
-                    'passed': progress.score >= quiz.passing_score
+        for lesson_id, quiz_id, passing_score, score in Progress.objects.filter(
+            enrollment=enrollment,
+            lesson__content_type='quiz',
+            lesson__quiz__isnull=False,
+            score__isnull=False
+        ).values_list('lesson_id', 'lesson__quiz__id', 'lesson__quiz__passing_score', 'score'):
+            if course_lessons.is_completed(bits, lesson_id):
+                quiz_progress[quiz_id] = {
+                    'score': score,
+                    'passed': score >= passing_score
                 }
         
         return Response({
@@ -2159,6 +2289,8 @@ def submit_quiz_results(request, course_id, quiz_id):
             progress.completed_at = timezone.now()
             progress.score = score
             progress.save()
+        enrollment_completion.mark_completed(enrollment, enrollment_completion.mask([lesson.ordinal]))
+        schedule_refresh(enrollment.course_id)
         
         # Check if passed
         passed = score >= quiz.passing_score
@@ -2203,6 +2335,7 @@ def save_section_notes(request, course_id, section_id):
             if not created:
                 progress.notes = notes
                 progress.save()
+            schedule_refresh(course.id)
         
         return Response({
             'success': True,
@@ -2276,45 +2409,8 @@ def instructor_course_view(request, course_id):
             'duration_in_weeks': course.duration_in_weeks,
             'status': course.status,
             'is_published': course.is_published,
-            'modules': []
+            'modules': course_outline.module_summaries(course_outline.get_outline(course.id), request)
         }
-        
-        # Add modules and sections
-        for module in course.modules.all().order_by('order'):
-            module_data = {
-                'id': module.id,
-                'title': module.title,
-                'description': module.description,
-                'order': module.order,
-                'sections': []
-            }
-            
-            # Add sections for this module
-            for section in module.sections.all().order_by('order'):
-                # For PDF files, ensure we provide the full URL
-                pdf_url = None
-                if section.pdf_file:
-                    pdf_url = request.build_absolute_uri(section.pdf_file.url)
-                elif section.pdf_url:
-                    if section.pdf_url.startswith('http'):
-                        pdf_url = section.pdf_url
-                    else:
-                        pdf_url = request.build_absolute_uri(section.pdf_url)
-                
-                section_data = {
-                    'id': section.id,
-                    'title': section.title,
-                    'description': section.description,
-                    'order': section.order,
-                    'content_type': section.content_type,
-                    'video_url': section.video_url,
-                    'video_id': section.video_id,
-                    'pdf_url': pdf_url,
-                    'has_pdf_file': bool(section.pdf_file),
-                }
-                module_data['sections'].append(section_data)
-            
-            course_data['modules'].append(module_data)
             
         return Response(course_data, status=status.HTTP_200_OK)
         
@@ -2503,180 +2599,25 @@ def update_course_with_files(request, course_id):
                 pdf_files[file_key] = file_obj
         
         # Process modules and sections data from JSON
+        outline = None
         modules_json = request.data.get('modules_json')
         if modules_json:
             try:
                 modules_data = json.loads(modules_json)
                 print(f"Processing {len(modules_data)} modules")
-                
-                # Track existing modules to detect deletions
-                existing_module_ids = set(course.modules.values_list('id', flat=True))
-                updated_module_ids = set()
-                
-                for module_data in modules_data:
-                    module_id = module_data.get('id')
-                    
-                    # Create or update the module
-                    if module_id and Module.objects.filter(id=module_id, course=course).exists():
-                        # Update existing module
-                        module = Module.objects.get(id=module_id)
-                        module.title = module_data.get('title', module.title)
-                        module.description = module_data.get('description', module.description)
-                        module.order = module_data.get('order', module.order)
-                        module.save()
-                        updated_module_ids.add(module.id)
-                    else:
-                        # Create new module
-                        module = Module.objects.create(
-                            course=course,
-                            title=module_data.get('title', 'Untitled Module'),
-                            description=module_data.get('description', ''),
-                            order=module_data.get('order', 1)
-                        )
-                        updated_module_ids.add(module.id)
-                    
-                    # Process sections if they exist
-                    if 'sections' in module_data and isinstance(module_data['sections'], list):
-                        # Track existing sections to detect deletions
-                        existing_section_ids = set(module.sections.values_list('id', flat=True))
-                        updated_section_ids = set()
-                        
-                        for section_data in module_data['sections']:
-                            section_id = section_data.get('id')
-                            
-                            # Create or update the section
-                            if section_id and Section.objects.filter(id=section_id, module=module).exists():
-                                # Update existing section
-                                section = Section.objects.get(id=section_id)
-                                section.title = section_data.get('title', section.title)
-                                section.description = section_data.get('description', section.description)
-                                section.order = section_data.get('order', section.order)
-                                section.content_type = section_data.get('content_type', section.content_type)
-                                section.video_url = section_data.get('video_url', section.video_url)
-                                section.video_id = section_data.get('video_id', section.video_id)
-                                
-                                # Process PDF file uploads
-                                pdf_key = section_data.get('pdf_key')
-                                has_new_pdf = section_data.get('has_new_pdf', False)
-                                
-                                if has_new_pdf and pdf_key:
-                                    print(f"Processing new PDF for section {section_id}, key: {pdf_key}")
-                                    
-                                    # Find the matching file using the matching metadata
-                                    matching_pdf_meta = None
-                                    for meta in pdf_uploads:
-                                        if meta.get('pdfKey') == pdf_key:
-                                            matching_pdf_meta = meta
-                                            break
-                                    
-                                    if matching_pdf_meta:
-                                        pdf_index = matching_pdf_meta.get('pdfIndex')
-                                        file_key = f'section_pdf_{pdf_index}'
-                                        
-                                        if file_key in pdf_files:
-                                            print(f"Found file for key {file_key}")
-                                            pdf_file = pdf_files[file_key]
-                                            
-                                            # Clear existing PDF file if any
-                                            if section.pdf_file:
-                                                section.pdf_file.delete(save=False)
-                                                
-                                            # Assign the file
-                                            section.pdf_file = pdf_file
-                                            
-                                            # Set content type based on whether there's a video
-                                            if section.video_url:
-                                                section.content_type = 'both'
-                                            else:
-                                                section.content_type = 'pdf'
-                                                
-                                            # Add tracking flag for file change
-                                            section._pdf_file_changed = True
-                                            
-                                            # Don't set pdf_url directly - let the save method handle it
-                                            print(f"Assigned PDF file {pdf_file.name} to section {section_id}")
-                                    else:
-                                        # Try to find by index
-                                        for i in range(pdf_uploads_count):
-                                            file_key = f'section_pdf_{i}'
-                                            if file_key in pdf_files:
-                                                if section.pdf_file:
-                                                    section.pdf_file.delete(save=False)
-                                                
-                                                section.pdf_file = pdf_files[file_key]
-                                                
-                                                if section.video_url:
-                                                    section.content_type = 'both'
-                                                else:
-                                                    section.content_type = 'pdf'
-                                                    
-                                                # Add tracking flag for file change
-                                                section._pdf_file_changed = True
-                                                
-                                                print(f"Assigned PDF file {pdf_files[file_key].name} to section {section_id} by index")
-                                                break
-                                elif not has_new_pdf:
-                                    # Only update PDF URL if not replacing with a file
-                                    section.pdf_url = section_data.get('pdf_url', section.pdf_url)
-                                
-                                section.save()
-                                # After save, refresh to get updated pdf_url
-                                section.refresh_from_db()
-                                updated_section_ids.add(section.id)
-                            else:
-                                # Create new section
-                                section = Section.objects.create(
-                                    module=module,
-                                    title=section_data.get('title', 'Untitled Section'),
-                                    description=section_data.get('description', ''),
-                                    order=section_data.get('order', 1),
-                                    content_type=section_data.get('content_type', 'video'),
-                                    video_url=section_data.get('video_url', ''),
-                                    video_id=section_data.get('video_id', ''),
-                                    pdf_url=section_data.get('pdf_url', '')
-                                )
-                                
-                                # Process PDF file for new section
-                                pdf_key = section_data.get('pdf_key')
-                                has_new_pdf = section_data.get('has_new_pdf', False)
-                                
-                                if has_new_pdf and pdf_key:
-                                    print(f"Processing new PDF for new section, key: {pdf_key}")
-                                    
-                                    # Find the matching file using the metadata
-                                    matching_pdf_meta = None
-                                    for meta in pdf_uploads:
-                                        if meta.get('pdfKey') == pdf_key:
-                                            matching_pdf_meta = meta
-                                            break
-                                    
-                                    if matching_pdf_meta:
-                                        pdf_index = matching_pdf_meta.get('pdfIndex')
-                                        file_key = f'section_pdf_{pdf_index}'
-                                        
-                                        if file_key in pdf_files:
-                                            pdf_file = pdf_files[file_key]
-                                            section.pdf_file = pdf_file
-                                            print(f"Assigned PDF file {pdf_file.name} to new section")
-                                            section.save()
-                                
-                                updated_section_ids.add(section.id)
-                        
-                        # Delete sections that weren't updated
-                        sections_to_delete = existing_section_ids - updated_section_ids
-                        if sections_to_delete:
-                            Section.objects.filter(id__in=sections_to_delete).delete()
-                
-                # Delete modules that weren't updated
-                modules_to_delete = existing_module_ids - updated_module_ids
-                if modules_to_delete:
-                    Module.objects.filter(id__in=modules_to_delete).delete()
-                
             except json.JSONDecodeError as e:
                 return Response(
                     {'error': f'Invalid JSON in modules_json: {str(e)}'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
+            try:
+                outline = course_outline_sync.sync_outline(course, modules_data, pdf_uploads, pdf_files)
+            except IntegrityError as e:
+                print(f"Conflicting module or section order: {str(e)}")
+                return Response(
+                    {'error': 'Two modules or two sections of a module have the same order'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
         
         # Return the updated course data with complete module and section details
         course_data = {
@@ -2690,43 +2631,11 @@ def update_course_with_files(request, course_id):
             'status': course.status,
             'category': course.category.name if course.category else 'Uncategorized',
             'thumbnail': course.thumbnail.url if course.thumbnail else None,
-            'modules': []
+            'modules': course_outline.module_summaries(
+                outline if outline is not None else course_outline.get_outline(course.id), request
+            )
         }
         
-        # Add modules with their sections
-        for module in course.modules.all().order_by('order'):
-            module_data = {
-                'id': module.id,
-                'title': module.title,
-                'description': module.description,
-                'order': module.order,
-                'sections': []
-            }
-            
-            for section in module.sections.all().order_by('order'):
-                # Create PDF URL from file if available
-                pdf_url = None
-                if section.pdf_file:
-                    request_host = request.build_absolute_uri('/').rstrip('/')
-                    pdf_url = f"{request_host}{section.pdf_file.url}" if section.pdf_file else section.pdf_url
-                else:
-                    pdf_url = section.pdf_url
-                
-                section_data = {
-                    'id': section.id,
-                    'title': section.title,
-                    'description': section.description,
-                    'order': section.order,
-                    'content_type': section.content_type,
-                    'video_url': section.video_url,
-                    'video_id': section.video_id,
-                    'pdf_url': pdf_url,
-                    'has_pdf_file': bool(section.pdf_file)
-                }
-                module_data['sections'].append(section_data)
-            
-            course_data['modules'].append(module_data)
-        
         return Response(course_data, status=status.HTTP_200_OK)
         
     except Exception as e:
@@ -3022,8 +2931,9 @@ def upload_module_pdf(request, module_id):
         if module.pdf_file:
             module.pdf_file.delete(save=False)
             
-        # Save the PDF file to the module
+        # Save the PDF file to the module; save() points pdf_url at the new file
         module.pdf_file = pdf_file
+        module.pdf_url = None
         
         # Update content type
         if module.video_url:
@@ -3056,32 +2966,21 @@ def upload_module_pdf(request, module_id):
 @api_view(['GET'])
 def serve_module_pdf_from_db(request, module_id):
     """
-    Serve a PDF directly from the database.
-    This view retrieves the PDF binary data stored in the Module model
-    and returns it as an HTTP response.
+    Serve a module's PDF from its database blob or its stored file.
+    Byte-range requests are supported, so PDF.js can render the first
+    pages before the whole document has downloaded.
     """
     try:
         module = Module.objects.get(id=module_id)
         
         # Check if the module has PDF data stored
-        if not module.pdf_binary:
+        source = course_delivery.module_pdf_source(module) if module.has_pdf else None
+        if source is None:
             return Response({
                 'error': 'No PDF data found for this module'
             }, status=404)
             
-        # Get the PDF data
-        pdf_data = module.get_pdf_data()
-        if not pdf_data:
-            return Response({
-                'error': 'Failed to retrieve PDF data'
-            }, status=500)
-            
-        # Return the PDF with appropriate content type and filename
-        from django.http import HttpResponse
-        response = HttpResponse(pdf_data, content_type=module.pdf_content_type or 'application/pdf')
-        filename = module.pdf_filename or f'module_{module.id}.pdf'
-        response['Content-Disposition'] = f'inline; filename="{filename}"'
-        return response
+        return course_delivery.serve_pdf(request, source)
         
     except Module.DoesNotExist:
         return Response({
@@ -3103,7 +3002,7 @@ def fix_module_pdf(request, module_id):
         
         # Store original values for reporting
         original_content_type = module.content_type
-        had_pdf_binary = bool(module.pdf_binary)
+        had_pdf_binary = module.has_pdf
         had_pdf_url = bool(module.pdf_url)
         
         # Get the PDF file from media storage
@@ -3121,11 +3020,9 @@ def fix_module_pdf(request, module_id):
                 # If we found PDF files, use the first one
                 if pdf_files:
                     file_path = os.path.join(media_dir, pdf_files[0])
-                    # Read the file into the pdf_binary field
+                    # Read the file into the module's PDF blob
                     with open(file_path, 'rb') as f:
-                        module.pdf_binary = f.read()
-                        module.pdf_filename = pdf_files[0]
-                        module.pdf_content_type = 'application/pdf'
+                        module.set_pdf_data(f.read(), filename=pdf_files[0], content_type='application/pdf')
                     
                     # Set the PDF URL to the media URL
                     pdf_url = f'/media/module_pdfs/{pdf_files[0]}'
@@ -3157,7 +3054,7 @@ def fix_module_pdf(request, module_id):
                     },
                     'pdf_binary': {
                         'before': had_pdf_binary,
-                        'after': bool(module.pdf_binary)
+                        'after': module.has_pdf
                     },
                     'pdf_url': {
                         'before': had_pdf_url,
@@ -3182,6 +3079,91 @@ def fix_module_pdf(request, module_id):
             'error': str(e)
         }, status=500)
 
+def _upload_error_response(error):
+    return Response({'error': str(error), **error.extra}, status=error.status)
+
+def _upload_state(session):
+    return {
+        'upload_id': str(session.id),
+        'filename': session.filename,
+        'size': session.size,
+        'offset': session.received,
+        'status': session.status,
+        'chunk_size': course_uploads.MAX_CHUNK_SIZE,
+    }
+
+class UploadSessionCreateAPIView(APIView):
+    """Open a resumable chunked upload for a module PDF, section PDF or section file"""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        try:
+            session = course_uploads.open_session(request.user, request.data)
+            return Response(_upload_state(session), status=status.HTTP_201_CREATED)
+        except course_uploads.UploadError as e:
+            return _upload_error_response(e)
+        except Exception as e:
+            print(f"Error opening upload session: {str(e)}")
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class UploadSessionAPIView(APIView):
+    """
+    GET reports how many bytes have arrived, so an interrupted client can
+    resume. PUT appends one chunk: the raw body, its position in
+    Content-Range and its SHA-256 in X-Chunk-SHA256. DELETE aborts.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get_session(self, request, upload_id):
+        return get_object_or_404(UploadSession, id=upload_id, user=request.user)
+
+    def get(self, request, upload_id):
+        return Response(_upload_state(self.get_session(request, upload_id)))
+
+    def put(self, request, upload_id):
+        session = self.get_session(request, upload_id)
+        try:
+            start, length = course_uploads.parse_content_range(request.headers.get('Content-Range'), session)
+            if int(request.headers.get('Content-Length') or 0) != length:
+                raise course_uploads.UploadError('Content-Length does not match Content-Range')
+            course_uploads.write_chunk(
+                session, request.stream, start, length, request.headers.get('X-Chunk-SHA256')
+            )
+            return Response(_upload_state(session))
+        except course_uploads.UploadError as e:
+            return _upload_error_response(e)
+        except Exception as e:
+            print(f"Error writing upload chunk: {str(e)}")
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def delete(self, request, upload_id):
+        session = self.get_session(request, upload_id)
+        if session.status == 'open':
+            UploadSession.objects.filter(pk=session.pk).update(status='aborted', updated_at=timezone.now())
+            course_uploads.discard(session)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class UploadSessionFinalizeAPIView(APIView):
+    """Attach a fully received upload to its module, section or a new section file"""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, upload_id):
+        session = get_object_or_404(UploadSession, id=upload_id, user=request.user)
+        try:
+            attached = course_uploads.finalize(session)
+            url = attached.pop('url')
+            return Response({
+                'success': True,
+                **_upload_state(session),
+                **attached,
+                'url': request.build_absolute_uri(url) if url else None,
+            })
+        except course_uploads.UploadError as e:
+            return _upload_error_response(e)
+        except Exception as e:
+            print(f"Error finalizing upload: {str(e)}")
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def enroll_course(request, course_id):
@@ -3197,40 +3179,36 @@ def enroll_course(request, course_id):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Check if already enrolled
-        enrollment = Enrollment.objects.filter(user=user, course=course).first()
-        if enrollment:
-            if enrollment.status == 'active':
+        # Takes a seat if the course is capped, or joins the waitlist once it is full;
+        # progress rows are created on first interaction
+        enrollment, outcome = course_seats.enroll(user, course)
+        if outcome == 'already_enrolled':
+            if enrollment.status == 'waitlisted':
                 return Response(
-                    {'message': 'You are already enrolled in this course'},
+                    {
+                        'message': 'You are already on the waitlist for this course',
+                        'waitlist_position': course_seats.waitlist_position(enrollment)
+                    },
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            elif enrollment.status == 'dropped':
-                # Reactivate enrollment
-                enrollment.status = 'active'
-                enrollment.save()
-                return Response(
-                    {'message': 'Your enrollment has been reactivated'},
-                    status=status.HTTP_200_OK
-                )
-        
-        # Create new enrollment
-        enrollment = Enrollment.objects.create(
-            user=user,
-            course=course,
-            status='active'
-        )
-        
-        # Create progress records for all lessons
-        lessons = Lesson.objects.filter(section__course=course)
-        Progress.objects.bulk_create([
-            Progress(
-                user=user,
-                lesson=lesson,
-                enrollment=enrollment,
-                completed=False
-            ) for lesson in lessons
-        ])
+            return Response(
+                {'message': 'You are already enrolled in this course'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if outcome == 'waitlisted':
+            return Response(
+                {
+                    'message': 'This course is full. You have been added to the waitlist',
+                    'status': 'waitlisted',
+                    'waitlist_position': course_seats.waitlist_position(enrollment)
+                },
+                status=status.HTTP_202_ACCEPTED
+            )
+        if outcome == 'reactivated':
+            return Response(
+                {'message': 'Your enrollment has been reactivated'},
+                status=status.HTTP_200_OK
+            )
         
         return Response(
             {'message': 'Successfully enrolled in the course'},
@@ -3255,7 +3233,7 @@ def create_payment_order(request, course_id):
         try:
             import razorpay
             print("Razorpay module imported successfully")
-            print(f"Razorpay version: {razorpay.__version__}")
+            print(f"Razorpay version: {getattr(razorpay, '__version__', 'unknown')}")
         except ImportError as e:
             print(f"Error importing razorpay module: {str(e)}")
             return Response({
@@ -3266,6 +3244,13 @@ def create_payment_order(request, course_id):
         course = get_object_or_404(Course, id=course_id)
         print(f"Course found: {course.title} (ID: {course.id}, Price: {course.price})")
         
+        # No payment for a course that is already full; the seat itself is taken on verification
+        if course_seats.seats_left(course) == 0:
+            return Response({
+                'error': 'Course is full',
+                'details': 'This course has reached its maximum number of students'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
         # Ensure course price is valid
         if course.price is None or course.price <= 0:
             print(f"Invalid course price: {course.price}")
@@ -3276,9 +3261,7 @@ def create_payment_order(request, course_id):
         
         # Convert price to integer (paise) and ensure it's valid
         try:
-            amount_in_paise = int(course.price * 100)
-            if amount_in_paise <= 0:
-                raise ValueError(f"Amount in paise is invalid: {amount_in_paise}")
+            amount_in_paise = course_payments.amount_in_paise(course.price)
             print(f"Price converted to paise: {amount_in_paise}")
         except (TypeError, ValueError) as e:
             print(f"Error converting price to paise: {str(e)}")
@@ -3288,82 +3271,33 @@ def create_payment_order(request, course_id):
             }, status=status.HTTP_400_BAD_REQUEST)
         
         # Validate Razorpay API keys
-        try:
-            key_id = settings.RAZORPAY_KEY_ID
-            key_secret = settings.RAZORPAY_KEY_SECRET
-            
-            print(f"RAZORPAY_KEY_ID: {'Present' if key_id else 'Missing'}")
-            print(f"RAZORPAY_KEY_SECRET: {'Present' if key_secret else 'Missing'}")
-            
-            if not key_id or not key_secret:
-                return Response({
-                    'error': 'Payment gateway credentials are missing',
-                    'details': 'Razorpay API keys are not configured properly'
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            
-            print(f"Razorpay Key ID: {key_id[:5]}...{key_id[-5:] if len(key_id) > 10 else key_id}")
-            print(f"Razorpay Key Secret length: {len(key_secret)} characters")
-        except Exception as key_error:
-            print(f"Error accessing Razorpay API keys: {str(key_error)}")
+        key_id = getattr(settings, 'RAZORPAY_KEY_ID', None)
+        key_secret = getattr(settings, 'RAZORPAY_KEY_SECRET', None)
+        print(f"RAZORPAY_KEY_ID: {'Present' if key_id else 'Missing'}")
+        print(f"RAZORPAY_KEY_SECRET: {'Present' if key_secret else 'Missing'}")
+        if not key_id or not key_secret:
             return Response({
-                'error': 'Payment configuration error',
-                'details': str(key_error)
+                'error': 'Payment gateway credentials are missing',
+                'details': 'Razorpay API keys are not configured properly'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
-        # Initialize Razorpay client
-        try:
-            client = razorpay.Client(auth=(key_id, key_secret))
-            print("Razorpay client initialized successfully")
-            
-            # Verify that the client is initialized properly by checking an attribute
-            if not hasattr(client, 'order'):
-                raise Exception("Razorpay client missing 'order' attribute")
-                
-        except Exception as client_error:
-            print(f"Razorpay client initialization error: {str(client_error)}")
-            import traceback
-            traceback.print_exc()
-            return Response({
-                'error': 'Payment gateway initialization failed',
-                'details': str(client_error)
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        # The Razorpay call runs on the job queue; the client polls for the order
+        job = course_payments.queue_order(course, request.user)
+        print(f"Queued Razorpay order job {job.id}")
         
-        # Create Razorpay order data
-        order_receipt = f'course_{course_id}_{request.user.id}'
-        data = {
-            'amount': amount_in_paise,
-            'currency': 'INR',
-            'receipt': order_receipt,
-            'notes': {
-                'course_id': course_id,
-                'user_id': request.user.id,
-                'course_title': course.title
-            },
-            'payment_capture': 1  # Auto capture payment
-        }
-        
-        print("Creating Razorpay order with data:", data)
+        # Without a running worker the order is created by this request
+        if course_payments.run_without_workers(job):
+            job.refresh_from_db()
+            if job.status == 'done':
+                return Response(job.result)
         
-        try:
-            payment = client.order.create(data=data)
-            print("Razorpay order created successfully:", payment)
-            
-            return Response({
-                'id': payment['id'],
-                'amount': payment['amount'],
-                'currency': payment['currency'],
-                'receipt': payment['receipt']
-            })
-            
-        except Exception as order_error:
-            print(f"Error creating Razorpay order: {str(order_error)}")
-            print(f"Error type: {type(order_error).__name__}")
-            import traceback
-            traceback.print_exc()
-            return Response({
-                'error': 'Failed to create payment order',
-                'details': str(order_error)
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response({
+            'job_id': job.id,
+            'status': job.status,
+            'status_url': request.build_absolute_uri(
+                reverse('courses:payment_order_status', args=[course.id, job.id])
+            )
+        }, status=status.HTTP_202_ACCEPTED)
             
     except Course.DoesNotExist:
         print("Course not found:", course_id)
@@ -3380,6 +3314,36 @@ def create_payment_order(request, course_id):
             'error': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def payment_order_status(request, course_id, job_id):
+    """
+    Poll a queued Razorpay order: 202 while it is being created, 200 with
+    the order once it exists, 502 if Razorpay kept failing. A job no
+    worker has picked up for a few seconds is run by this request.
+    """
+    job = course_payments.order_job(job_id, course_id, request.user.id)
+    if job is None:
+        return Response({'error': 'Payment order not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    # Without a running worker the order is created by the polling request
+    if course_payments.run_if_unclaimed(job):
+        job.refresh_from_db()
+    
+    if job.status == 'done':
+        return Response(job.result)
+    if job.status == 'failed':
+        error_lines = job.last_error.strip().splitlines()
+        return Response({
+            'error': 'Failed to create payment order',
+            'details': error_lines[-1] if error_lines else ''
+        }, status=status.HTTP_502_BAD_GATEWAY)
+    return Response({
+        'job_id': job.id,
+        'status': job.status,
+        'attempts': job.attempts
+    }, status=status.HTTP_202_ACCEPTED)
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 @csrf_exempt
@@ -3408,11 +3372,15 @@ def verify_payment(request, course_id):
             
             # If verification successful, enroll user in course
             course = get_object_or_404(Course, id=course_id)
-            enrollment = Enrollment.objects.create(
-                user=request.user,
-                course=course,
-                status='active'
-            )
+            enrollment, outcome = course_seats.enroll(request.user, course)
+            if enrollment.status == 'waitlisted':
+                # The last seat went while the payment was in flight
+                return Response({
+                    'status': 'waitlisted',
+                    'message': 'Payment verified. The course is full, so you have been added to the waitlist',
+                    'enrollment_id': enrollment.id,
+                    'waitlist_position': course_seats.waitlist_position(enrollment)
+                }, status=status.HTTP_202_ACCEPTED)
             
             return Response({
                 'status': 'success',
@@ -3446,7 +3414,7 @@ def direct_enroll(request, course_id):
         existing_enrollment = Enrollment.objects.filter(
             user=request.user,
             course=course
-        ).first()
+        ).exclude(status='dropped').first()
         
         if existing_enrollment:
             # If already enrolled, just return success
@@ -3457,41 +3425,17 @@ def direct_enroll(request, course_id):
                 'enrollment_id': existing_enrollment.id
             })
         
-        # Create new enrollment
+        # Create new enrollment, or reactivate a dropped one, if a seat is free
         try:
-            enrollment = Enrollment.objects.create(
-                user=request.user,
-                course=course,
-                status='active'
-            )
-            print(f"New enrollment created with ID: {enrollment.id}")
-            
-            # Create progress records
-            try:
-                # Get all sections in this course
-                sections = Section.objects.filter(module__course=course)
-                print(f"Creating progress records for {sections.count()} sections")
-                
-                # Create progress records in bulk
-                from enrollments.models import Progress
-                progress_records = []
-                
-                for section in sections:
-                    progress_records.append(
-                        Progress(
-                            user=request.user,
-                            section=section,
-                            enrollment=enrollment,
-                            completed=False
-                        )
-                    )
-                
-                if progress_records:
-                    Progress.objects.bulk_create(progress_records)
-                    print(f"Created {len(progress_records)} progress records")
-            except Exception as progress_error:
-                print(f"Error creating progress records: {str(progress_error)}")
-                # Continue even if progress creation fails
+            enrollment, outcome = course_seats.enroll(request.user, course)
+            print(f"Enrollment {enrollment.id}: {outcome}")
+            if enrollment.status == 'waitlisted':
+                return Response({
+                    'status': 'waitlisted',
+                    'message': 'This course is full. You have been added to the waitlist',
+                    'enrollment_id': enrollment.id,
+                    'waitlist_position': course_seats.waitlist_position(enrollment)
+                }, status=status.HTTP_202_ACCEPTED)
             
             return Response({
                 'status': 'success',
@@ -3534,6 +3478,13 @@ def direct_payment_order(request, course_id):
         course = get_object_or_404(Course, id=course_id)
         print(f"Course found: {course.title} (ID: {course.id}, Price: {course.price})")
         
+        # No payment for a course that is already full; the seat itself is taken on verification
+        if course_seats.seats_left(course) == 0:
+            return Response({
+                'error': 'Course is full',
+                'details': 'This course has reached its maximum number of students'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
         # Ensure course price is valid
         if course.price is None or course.price <= 0:
             print(f"Invalid course price: {course.price}")
@@ -127,6 +127,15 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 10,
 }
 
+# /api/courses/ answers in cursor pages. Set to True only for clients that
+# still expect the old unpaginated list; the flag is removed in the next
+# release.
+COURSE_CATALOG_LEGACY_UNPAGINATED = False
+
+# Seconds each process reuses its typeahead index (courses/suggest.py)
+# before checking the database for changes made by other processes
+COURSE_SUGGEST_VERSION_CHECK_INTERVAL = 5
+
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = True  # Only for development
 CORS_ALLOW_CREDENTIALS = True
@@ -201,9 +210,35 @@ MEDIA_ROOT = BASE_DIR / 'media'
 AUTH_USER_MODEL = 'accounts.User'
 
 # File upload settings
-FILE_UPLOAD_MAX_MEMORY_SIZE = 52428800  # 50MB
+# Uploaded files above 5MB are spooled to a temporary file instead of RAM
+FILE_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 52428800  # 50MB
 
+# Resumable chunked uploads (courses/uploads.py): where partial files are
+# assembled, and the largest file a session may declare
+CHUNKED_UPLOAD_DIR = BASE_DIR / 'chunked_uploads'
+CHUNKED_UPLOAD_MAX_SIZE = 2 * 1024 * 1024 * 1024  # 2GB
+
+# Background job queue (courses/jobs.py). Jobs only run while
+# `python manage.py run_worker` is running as a separate process next to
+# the web server. Seconds a worker may hold a job before another worker
+# may retry it:
+JOB_VISIBILITY_TIMEOUT = 300
+# Seconds without a heartbeat after which no worker counts as running, and
+# checkout creates Razorpay orders in the request (courses/payments.py):
+JOB_WORKER_HEARTBEAT_TIMEOUT = 30
+
+# Seconds a Razorpay order job may wait for a running worker before the
+# client's status poll creates the order itself (courses/payments.py)
+PAYMENT_ORDER_INLINE_AFTER = 5
+
+# How file-backed module PDFs are sent: None streams them from Django,
+# 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache/lighttpd) lets the front
+# proxy send the bytes. For nginx, map MEDIA_ROOT as an internal location
+# at COURSE_PDF_ACCEL_PREFIX.
+COURSE_PDF_SENDFILE_MODE = None
+COURSE_PDF_ACCEL_PREFIX = '/protected-media/'
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -0,0 +1,308 @@
+"""
+Enrolling a whole cohort from a CSV or JSON list of usernames and emails.
+
+The list is read lazily from the upload and handled in batches of
+BATCH_SIZE rows. Each batch takes:
+
+- one IN query to resolve its users by username or email,
+- one query for their existing enrollments,
+- one conditional UPDATE taking seats from the course's seat counter
+  (courses/seats.py),
+- one bulk_create(ignore_conflicts=True) for the new enrollments.
+
+Rows past the free seats are added to the waitlist, in list order.
+
+Outcomes are reported from the rows actually inserted: a user whose
+enrollment another request created meanwhile, and whose row
+ignore_conflicts therefore dropped, is reported as already enrolled.
+
+enroll_all() writes every batch before the response starts. The
+outcome of each row goes to a temporary file, which is then streamed
+back as the report. The enrollments therefore never depend on the client
+reading the whole response. Neither the list nor the report is held in
+memory. Only the ids of users already seen in the list are kept, to
+catch duplicates.
+
+Accepted input:
+- CSV with the username or email in the first column, and an optional
+  header row.
+- A JSON array, or newline-delimited JSON, of strings or of objects with
+  a "username" or "email" key.
+
+Bulk inserts skip save() and signals. Student stats, the catalog version
+and analytics are therefore refreshed once per batch here.
+"""
+import codecs
+import csv
+import io
+import json
+import tempfile
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+BATCH_SIZE = 500
+READ_SIZE = 64 * 1024
+
+INPUT_FORMATS = {
+    'text/csv': 'csv',
+    'application/json': 'json',
+    'application/x-ndjson': 'json',
+}
+OUTPUT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+REPORT_COLUMNS = ('row', 'identifier', 'status', 'user_id')
+
+HEADER_NAMES = {'username', 'email', 'user', 'identifier'}
+
+
+def input_format(content_type, filename=''):
+    """'csv' or 'json' for an upload's content type or file name, or None"""
+    found = INPUT_FORMATS.get((content_type or '').split(';')[0].strip().lower())
+    if found is None and filename:
+        found = {'csv': 'csv', 'json': 'json', 'ndjson': 'json', 'jsonl': 'json'}.get(
+            filename.rsplit('.', 1)[-1].lower()
+        )
+    return found
+
+
+def _text_chunks(source):
+    """Decoded text from an uploaded file (chunks()) or any stream (read())"""
+    if hasattr(source, 'chunks'):
+        raw = source.chunks(READ_SIZE)
+    else:
+        raw = iter(lambda: source.read(READ_SIZE), b'')
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    for chunk in raw:
+        text = decoder.decode(chunk.encode() if isinstance(chunk, str) else chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def _lines(chunks):
+    pending = ''
+    for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split('\n')
+        yield from (line + '\n' for line in lines)
+    if pending:
+        yield pending
+
+
+def csv_identifiers(source):
+    """(row number, identifier) for each CSV row; a header row is skipped"""
+    for number, row in enumerate(csv.reader(_lines(_text_chunks(source))), start=1):
+        value = row[0].strip() if row else ''
+        if number == 1 and value.lower() in HEADER_NAMES:
+            continue
+        yield number, value
+
+
+def json_identifiers(source):
+    """
+    (item number, identifier) for each item of a JSON array or of
+    newline-delimited JSON, decoded one item at a time
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    number = 0
+    chunks = _text_chunks(source)
+    exhausted = False
+    while True:
+        buffer = buffer.lstrip(' \t\r\n,[')
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if exhausted:
+                if buffer.strip():
+                    raise ValueError('Malformed JSON in enrollment list')
+                return
+            chunk = next(chunks, None)
+            if chunk is None:
+                exhausted = True
+            else:
+                buffer += chunk
+            continue
+        if end == len(buffer) and not exhausted:
+            # A number or literal may continue in the next chunk
+            chunk = next(chunks, None)
+            if chunk is not None:
+                buffer += chunk
+                continue
+            exhausted = True
+        buffer = buffer[end:]
+        number += 1
+        if isinstance(item, dict):
+            item = item.get('username') or item.get('email') or ''
+        yield number, item.strip() if isinstance(item, str) else ''
+
+
+def read_identifiers(source, source_format):
+    return csv_identifiers(source) if source_format == 'csv' else json_identifiers(source)
+
+
+def _batches(rows, size):
+    batch = []
+    try:
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+    except (ValueError, csv.Error):
+        # Still enroll the rows read before the unreadable part
+        if batch:
+            yield batch
+        raise
+    if batch:
+        yield batch
+
+
+def _resolve(identifiers):
+    """{identifier: user id} for the usernames and emails in `identifiers`, from one query"""
+    User = apps.get_model('accounts', 'User')
+    emails = {value for value in identifiers if '@' in value}
+    usernames = set(identifiers) - emails
+    found = {}
+    for user_id, username, email in User.objects.filter(
+        Q(username__in=usernames) | Q(email__in=emails)
+    ).values_list('id', 'username', 'email'):
+        if username in usernames:
+            found[username] = user_id
+        if email in emails:
+            found[email] = user_id
+    return found
+
+
+def _enroll_batch(course, batch, seen):
+    from courses.models import CourseStats
+    from courses.conditional import touch_catalog
+    from courses.seats import give_back, take
+    from analytics.refresh import schedule_refresh
+    from .completion import lesson_total
+    from .models import Enrollment
+
+    users = _resolve({value for number, value in batch if value})
+    existing = set(Enrollment.objects.filter(
+        course=course, user_id__in=set(users.values())
+    ).values_list('user_id', flat=True))
+
+    outcomes = []
+    new = []
+    for number, value in batch:
+        user_id = users.get(value)
+        if not value:
+            outcome = 'invalid'
+        elif user_id is None:
+            outcome = 'not_found'
+        elif user_id in seen:
+            outcome = 'duplicate'
+        elif user_id in existing:
+            outcome = 'already_enrolled'
+        else:
+            outcome = 'enrolled'
+            new.append(user_id)
+        if user_id is not None:
+            seen.add(user_id)
+        outcomes.append({'row': number, 'identifier': value, 'status': outcome, 'user_id': user_id})
+    if not new:
+        return outcomes
+
+    # Taken outside the transaction, so the seat row is never held for the whole batch
+    seated = set(new[:take(course, len(new))])
+    for outcome in outcomes:
+        if outcome['status'] == 'enrolled' and outcome['user_id'] not in seated:
+            outcome['status'] = 'waitlisted'
+
+    now = timezone.now()
+    total_lessons = lesson_total(course.pk)
+    try:
+        with transaction.atomic():
+            Enrollment.objects.bulk_create(
+                [
+                    Enrollment(
+                        user_id=user_id, course=course, enrolled_at=now, total_lessons=total_lessons,
+                        status='active' if user_id in seated else 'waitlisted',
+                    )
+                    for user_id in new
+                ],
+                ignore_conflicts=True,
+            )
+            # The rows of this batch carry its timestamp; ignore_conflicts dropped the others
+            inserted = set(Enrollment.objects.filter(
+                course=course, user_id__in=new, enrolled_at=now
+            ).values_list('user_id', flat=True))
+    except Exception:
+        give_back(course.pk, len(seated))
+        raise
+    # Seats of users enrolled by someone else meanwhile were not used
+    give_back(course.pk, len(seated - inserted))
+    for outcome in outcomes:
+        if outcome['status'] in ('enrolled', 'waitlisted') and outcome['user_id'] not in inserted:
+            outcome['status'] = 'already_enrolled'
+
+    CourseStats.add(course.pk, active_students=len(seated & inserted))
+    touch_catalog()
+    schedule_refresh(course.pk)
+    return outcomes
+
+
+def enroll_stream(course, identifiers, batch_size=BATCH_SIZE):
+    """Enroll the users named by `identifiers` ((row, username or email) pairs), yielding one outcome per row"""
+    seen = set()
+    try:
+        for batch in _batches(identifiers, batch_size):
+            yield from _enroll_batch(course, batch, seen)
+    except (ValueError, csv.Error):
+        yield {'row': None, 'identifier': '', 'status': 'malformed', 'user_id': None}
+
+
+def enroll_all(course, identifiers, batch_size=BATCH_SIZE):
+    """
+    Enroll the users named by `identifiers` now, and return a temporary
+    file holding one JSON outcome per line for read_report()
+    """
+    report = tempfile.TemporaryFile(mode='w+', encoding='utf-8')
+    try:
+        for outcome in enroll_stream(course, identifiers, batch_size):
+            report.write(json.dumps(outcome) + '\n')
+    except Exception:
+        report.close()
+        raise
+    report.seek(0)
+    return report
+
+
+def read_report(report):
+    """The outcomes stored by enroll_all(), closing the file at the end"""
+    try:
+        for line in report:
+            yield json.loads(line)
+    finally:
+        report.close()
+
+
+def report_lines(outcomes, output_format):
+    """The outcomes as NDJSON or CSV lines, header first for CSV"""
+    if output_format != 'csv':
+        for outcome in outcomes:
+            yield json.dumps(outcome) + '\n'
+        return
+    line = io.StringIO()
+    writer = csv.writer(line)
+    writer.writerow(REPORT_COLUMNS)
+    yield line.getvalue()
+    for outcome in outcomes:
+        line.seek(0)
+        line.truncate()
+        writer.writerow(['' if outcome[column] is None else outcome[column] for column in REPORT_COLUMNS])
+        yield line.getvalue()
@@ -0,0 +1,211 @@
+"""
+Lesson completion kept as one bitmap per enrollment.
+
+Each lesson has an ordinal that is unique within its course and never
+reused (Lesson.ordinal, handed out by Course.allocate_lesson_ordinals).
+Bit n of Enrollment.completion_bitmap is set once the student completes
+the lesson with ordinal n. The bitmap is a little-endian byte string of
+a few dozen bytes even for a large course, so it is read along with the
+enrollment instead of scanning one Progress row per lesson.
+
+- Testing or setting a lesson is a shift and a mask.
+- Counts and percentages are popcounts against the mask of the course's
+  current lessons. Bits left behind by deleted lessons fall outside that
+  mask and are ignored.
+- A section is complete when its mask is a subset of the bitmap.
+
+Enrollment also keeps completed_lessons, total_lessons and
+progress_percentage as plain columns, so listings read the percentage
+without touching lessons at all. Completing lessons bumps the counters
+with F() in the same UPDATE that swaps the bitmap. Adding or removing a
+lesson moves total_lessons and the percentage of every enrollment of the
+course with one F() UPDATE in the same request, so a student can never
+reach 100% while a lesson is left. Only after a removal does a coalesced
+background job recount completed_lessons, as completions of the removed
+lesson stop counting.
+
+Progress rows still hold scores, notes and time spent per lesson.
+"""
+from django.apps import apps
+from django.db.models import Case, ExpressionWrapper, F, FloatField, Value, When
+from django.db.models.functions import Greatest, Least
+from django.db.models.lookups import GreaterThan
+
+SYNC_DELAY = 10
+
+COUNTER_FIELDS = ('completed_lessons', 'total_lessons', 'progress_percentage')
+
+
+def to_bits(bitmap):
+    return int.from_bytes(bytes(bitmap or b''), 'little')
+
+
+def to_bitmap(bits):
+    return bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+
+
+def mask(ordinals):
+    bits = 0
+    for ordinal in ordinals:
+        if ordinal is not None:
+            bits |= 1 << ordinal
+    return bits
+
+
+def lesson_total(course_id):
+    Lesson = apps.get_model('courses', 'Lesson')
+    return Lesson.objects.filter(section__module__course_id=course_id).count()
+
+
+def _percentage(completed, total):
+    """progress_percentage as an SQL expression of completed and total lessons"""
+    return Case(
+        When(GreaterThan(total, 0), then=Least(
+            ExpressionWrapper(completed * 100.0 / total, output_field=FloatField()), Value(100.0)
+        )),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+
+
+class CourseLessons:
+    """The ordinals of one course's lessons, and the mask of each section"""
+
+    def __init__(self, rows=()):
+        self.ordinals = {}
+        self.section_masks = {}
+        self.mask = 0
+        for lesson_id, section_id, ordinal in rows:
+            bit = 1 << ordinal
+            self.ordinals[lesson_id] = ordinal
+            self.section_masks[section_id] = self.section_masks.get(section_id, 0) | bit
+            self.mask |= bit
+
+    @classmethod
+    def for_courses(cls, course_ids):
+        """{course id: CourseLessons} for the given courses, from one query"""
+        Lesson = apps.get_model('courses', 'Lesson')
+        rows = {course_id: [] for course_id in course_ids}
+        for course_id, lesson_id, section_id, ordinal in Lesson.objects.filter(
+            section__module__course_id__in=list(rows), ordinal__isnull=False
+        ).values_list('section__module__course_id', 'id', 'section_id', 'ordinal'):
+            rows[course_id].append((lesson_id, section_id, ordinal))
+        return {course_id: cls(course_rows) for course_id, course_rows in rows.items()}
+
+    @classmethod
+    def for_course(cls, course_id):
+        return cls.for_courses([course_id])[course_id]
+
+    @property
+    def total(self):
+        return len(self.ordinals)
+
+    def lesson_mask(self, lesson_ids):
+        return mask(self.ordinals.get(lesson_id) for lesson_id in lesson_ids)
+
+    def is_completed(self, bits, lesson_id):
+        ordinal = self.ordinals.get(lesson_id)
+        return ordinal is not None and bool(bits >> ordinal & 1)
+
+    def completed_count(self, bits):
+        return (bits & self.mask).bit_count()
+
+    def percentage(self, bits):
+        return self.completed_count(bits) / self.total * 100 if self.total else 0.0
+
+    def section_percentage(self, bits, section_id):
+        section_mask = self.section_masks.get(section_id, 0)
+        return (bits & section_mask).bit_count() / section_mask.bit_count() * 100 if section_mask else 0
+
+    def section_completed(self, bits, section_id):
+        section_mask = self.section_masks.get(section_id, 0)
+        return bool(section_mask) and bits & section_mask == section_mask
+
+
+def mark_completed(enrollment, lesson_mask):
+    """
+    Set the bits of `lesson_mask` in the enrollment's bitmap and return the
+    resulting bits. The write is a compare-and-swap on the stored bitmap,
+    retried if another request changed it meanwhile, so concurrent
+    completions never undo each other. Lessons that were not completed yet
+    are added to the enrollment's counters in the same UPDATE, and the
+    counters on `enrollment` are reloaded.
+    """
+    Enrollment = type(enrollment)
+    stored = bytes(enrollment.completion_bitmap or b'')
+    while True:
+        bits = to_bits(stored) | lesson_mask
+        added = (bits & ~to_bits(stored)).bit_count()
+        if not added:
+            break
+        if Enrollment.objects.filter(pk=enrollment.pk, completion_bitmap=stored).update(
+            completion_bitmap=to_bitmap(bits),
+            completed_lessons=F('completed_lessons') + added,
+            progress_percentage=_percentage(F('completed_lessons') + added, F('total_lessons')),
+        ):
+            enrollment.refresh_from_db(fields=COUNTER_FIELDS)
+            break
+        stored = bytes(Enrollment.objects.filter(pk=enrollment.pk).values_list(
+            'completion_bitmap', flat=True
+        ).get())
+    enrollment.completion_bitmap = to_bitmap(bits)
+    return bits
+
+
+def lessons_changed(course_id, delta):
+    """Add `delta` lessons to the totals and percentages of the course's enrollments"""
+    Enrollment = apps.get_model('enrollments', 'Enrollment')
+
+    if course_id is None:
+        return 0
+    total = Greatest(F('total_lessons') + delta, Value(0))
+    return Enrollment.objects.filter(course_id=course_id).update(
+        total_lessons=total,
+        progress_percentage=_percentage(F('completed_lessons'), total),
+    )
+
+
+def schedule_sync(course_id):
+    from courses import jobs
+
+    if course_id is None:
+        return None
+    return jobs.enqueue(
+        sync_course_lessons,
+        delay=SYNC_DELAY,
+        key=f'enrollments:lessons:{course_id}',
+        course_id=course_id,
+    )
+
+
+def sync_course_lessons(course_id):
+    """
+    Background job: recount every enrollment of the course against its
+    current lessons. Completions of deleted lessons stop counting and
+    total_lessons is set for all enrollments in a single UPDATE. Returns
+    the number of enrollments.
+    """
+    Enrollment = apps.get_model('enrollments', 'Enrollment')
+
+    lessons = CourseLessons.for_course(course_id)
+    enrollments = Enrollment.objects.filter(course_id=course_id)
+    for pk, stored, completed in enrollments.values_list(
+        'pk', 'completion_bitmap', 'completed_lessons'
+    ).iterator():
+        stored = bytes(stored)
+        while lessons.completed_count(to_bits(stored)) != completed:
+            # Only valid while the bitmap is the one that was counted
+            if Enrollment.objects.filter(pk=pk, completion_bitmap=stored).update(
+                completed_lessons=lessons.completed_count(to_bits(stored))
+            ):
+                break
+            row = Enrollment.objects.filter(pk=pk).values_list(
+                'completion_bitmap', 'completed_lessons'
+            ).first()
+            if row is None:
+                break
+            stored, completed = bytes(row[0]), row[1]
+    return enrollments.update(
+        total_lessons=lessons.total,
+        progress_percentage=_percentage(F('completed_lessons'), Value(lessons.total)),
+    )
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:05
+
+from django.db import migrations, models
+
+
+def fill_bitmaps(apps, schema_editor):
+    Enrollment = apps.get_model('enrollments', 'Enrollment')
+    Progress = apps.get_model('enrollments', 'Progress')
+
+    bits = {}
+    for enrollment_id, ordinal in Progress.objects.filter(
+        completed=True, lesson__ordinal__isnull=False
+    ).values_list('enrollment_id', 'lesson__ordinal').iterator():
+        bits[enrollment_id] = bits.get(enrollment_id, 0) | 1 << ordinal
+    Enrollment.objects.bulk_update(
+        [
+            Enrollment(id=enrollment_id, completion_bitmap=value.to_bytes((value.bit_length() + 7) // 8, 'little'))
+            for enrollment_id, value in bits.items()
+        ],
+        ['completion_bitmap'],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0021_lesson_ordinal'),
+        ('enrollments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enrollment',
+            name='completion_bitmap',
+            field=models.BinaryField(default=bytes),
+        ),
+        migrations.RunPython(fill_bitmaps, migrations.RunPython.noop),
+    ]
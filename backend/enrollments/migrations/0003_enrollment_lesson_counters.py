@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:20
+
+from django.db import migrations, models
+
+
+def count_lessons(apps, schema_editor):
+    Enrollment = apps.get_model('enrollments', 'Enrollment')
+    Lesson = apps.get_model('courses', 'Lesson')
+
+    masks = {}
+    totals = {}
+    for course_id, ordinal in Lesson.objects.filter(ordinal__isnull=False).values_list(
+        'section__module__course_id', 'ordinal'
+    ).iterator():
+        masks[course_id] = masks.get(course_id, 0) | 1 << ordinal
+        totals[course_id] = totals.get(course_id, 0) + 1
+
+    enrollments = []
+    for enrollment_id, course_id, bitmap in Enrollment.objects.values_list(
+        'id', 'course_id', 'completion_bitmap'
+    ).iterator():
+        total = totals.get(course_id, 0)
+        completed = (int.from_bytes(bytes(bitmap), 'little') & masks.get(course_id, 0)).bit_count()
+        enrollments.append(Enrollment(
+            id=enrollment_id,
+            completed_lessons=completed,
+            total_lessons=total,
+            progress_percentage=completed * 100.0 / total if total else 0.0,
+        ))
+    Enrollment.objects.bulk_update(
+        enrollments, ['completed_lessons', 'total_lessons', 'progress_percentage'], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enrollments', '0002_enrollment_completion_bitmap'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enrollment',
+            name='completed_lessons',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='total_lessons',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_lessons, migrations.RunPython.noop),
+    ]
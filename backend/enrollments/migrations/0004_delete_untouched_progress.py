@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:40
+
+from django.db import migrations
+
+
+def delete_untouched_progress(apps, schema_editor):
+    Progress = apps.get_model('enrollments', 'Progress')
+
+    # Rows created eagerly at enrollment that were never used; a missing row now means "not started"
+    Progress.objects.filter(
+        completed=False, completed_at__isnull=True, score__isnull=True, time_spent=0, notes=''
+    ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enrollments', '0003_enrollment_lesson_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_untouched_progress, migrations.RunPython.noop),
+    ]
@@ -11,6 +11,7 @@ class Enrollment(models.Model):
         ('completed', 'Completed'),
         ('dropped', 'Dropped'),
         ('pending', 'Pending'),
+        ('waitlisted', 'Waitlisted'),
     )
 
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='enrollments')
@@ -24,6 +25,14 @@ class Enrollment(models.Model):
     notes = models.TextField(blank=True)
     certificate_issued = models.BooleanField(default=False)
     certificate_url = models.URLField(blank=True)
+    # Completed lessons by Lesson.ordinal, see enrollments/completion.py
+    completion_bitmap = models.BinaryField(default=bytes)
+    completed_lessons = models.PositiveIntegerField(default=0)
+    total_lessons = models.PositiveIntegerField(default=0)
+
+    # Written only in place by enrollments.completion, never by a full save()
+    # of an instance that may have been loaded before the last change
+    in_place_fields = ('completion_bitmap', 'completed_lessons', 'total_lessons', 'progress_percentage')
 
     class Meta:
         verbose_name = _('Enrollment')
@@ -34,6 +43,24 @@ class Enrollment(models.Model):
     def __str__(self):
         return f"{self.user.username}'s enrollment in {self.course.title}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Seats are released when a loaded enrollment stops holding one
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and not self.total_lessons and self.course_id:
+            from .completion import lesson_total
+            self.total_lessons = lesson_total(self.course_id)
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.in_place_fields
+            ]
+        super().save(*args, **kwargs)
+
 class Progress(models.Model):
     """Tracks progress of a user through course lessons"""
     enrollment = models.ForeignKey(Enrollment, on_delete=models.CASCADE, related_name='progress')
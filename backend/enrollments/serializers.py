@@ -18,15 +18,7 @@ class EnrollmentSerializer(serializers.ModelSerializer):
         read_only_fields = ['user', 'enrolled_at', 'completed_at', 'status']
     
     def get_progress_percentage(self, obj):
-        total_lessons = Lesson.objects.filter(section__course=obj.course).count()
-        if total_lessons == 0:
-            return 0
-        completed_lessons = Progress.objects.filter(
-            enrollment=obj,
-            lesson__section__course=obj.course,
-            completed_at__isnull=False
-        ).count()
-        return int((completed_lessons / total_lessons) * 100)
+        return int(obj.progress_percentage)
 
 class ProgressSerializer(serializers.ModelSerializer):
     lesson_title = serializers.CharField(source='lesson.title', read_only=True)
@@ -17,7 +17,10 @@ from rest_framework import generics, permissions
 from rest_framework.views import APIView
 
 from .models import Enrollment, Progress
+from . import completion
 from courses.models import Course, Section, Lesson
+from courses import seats as course_seats
+from courses.recommendations import get_related_courses
 from .serializers import EnrollmentSerializer
 
 @api_view(['POST'])
@@ -41,91 +44,49 @@ def enroll_course(request, course_id):
                 'message': 'This course requires manual enrollment by the instructor'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Check max students limit
-        if course.max_students:
-            current_enrollments = Enrollment.objects.filter(
-                course=course,
-                status__in=['active', 'pending']
-            ).count()
-            if current_enrollments >= course.max_students:
-                return Response({
-                    'status': 'error',
-                    'message': 'Course has reached maximum enrollment capacity'
-                }, status=status.HTTP_400_BAD_REQUEST)
+        # A seat is taken from the course's seat counter, without counting its
+        # enrollments; once the course is full the user joins the waitlist.
+        # Progress rows are created on first interaction
+        enrollment, outcome = course_seats.enroll(request.user, course)
+        enrollment_data = {
+            'id': enrollment.id,
+            'course_id': course.id,
+            'course_title': course.title,
+            'enrolled_at': enrollment.enrolled_at,
+            'status': enrollment.status
+        }
         
-        # Check if user is already enrolled
-        existing_enrollment = Enrollment.objects.filter(
-            user=request.user,
-            course=course
-        ).first()
-        
-        if existing_enrollment:
-            if existing_enrollment.status == 'dropped':
-                # Reactivate dropped enrollment
-                existing_enrollment.status = 'active'
-                existing_enrollment.save()
-                return Response({
-                    'status': 'success',
-                    'message': 'Course enrollment reactivated',
-                    'enrollment': {
-                        'id': existing_enrollment.id,
-                        'course_id': course.id,
-                        'course_title': course.title,
-                        'enrolled_at': existing_enrollment.enrolled_at,
-                        'status': existing_enrollment.status
-                    }
-                }, status=status.HTTP_200_OK)
-            elif existing_enrollment.status == 'completed':
+        if outcome == 'already_enrolled':
+            if enrollment.status == 'completed':
                 return Response({
                     'status': 'error',
                     'message': 'You have already completed this course'
                 }, status=status.HTTP_400_BAD_REQUEST)
-            else:
-                return Response({
-                    'status': 'error',
-                    'message': 'You are already enrolled in this course',
-                    'enrollment': {
-                        'id': existing_enrollment.id,
-                        'course_id': course.id,
-                        'course_title': course.title,
-                        'enrolled_at': existing_enrollment.enrolled_at,
-                        'status': existing_enrollment.status
-                    }
-                }, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Create new enrollment
-        enrollment = Enrollment.objects.create(
-            user=request.user,
-            course=course,
-            status='active',
-            enrolled_at=timezone.now()
-        )
-        
-        # Create progress records for each lesson
-        sections = course.sections.prefetch_related('lessons').all()
-        progress_records = []
+            return Response({
+                'status': 'error',
+                'message': 'You are already enrolled in this course',
+                'enrollment': enrollment_data
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        for section in sections:
-            for lesson in section.lessons.all():
-                progress_records.append(Progress(
-                    enrollment=enrollment,
-                    lesson=lesson,
-                    completed=False
-                ))
+        if outcome == 'waitlisted':
+            return Response({
+                'status': 'waitlisted',
+                'message': 'Course has reached maximum enrollment capacity. You have been added to the waitlist',
+                'enrollment': enrollment_data,
+                'waitlist_position': course_seats.waitlist_position(enrollment)
+            }, status=status.HTTP_202_ACCEPTED)
         
-        if progress_records:
-            Progress.objects.bulk_create(progress_records)
+        if outcome == 'reactivated':
+            return Response({
+                'status': 'success',
+                'message': 'Course enrollment reactivated',
+                'enrollment': enrollment_data
+            }, status=status.HTTP_200_OK)
         
         return Response({
             'status': 'success',
             'message': 'Successfully enrolled in course',
-            'enrollment': {
-                'id': enrollment.id,
-                'course_id': course.id,
-                'course_title': course.title,
-                'enrolled_at': enrollment.enrolled_at,
-                'status': enrollment.status
-            }
+            'enrollment': enrollment_data
         }, status=status.HTTP_201_CREATED)
         
     except Course.DoesNotExist:
@@ -175,31 +136,23 @@ def mark_lesson_complete(request, lesson_id):
     """Mark a lesson as complete"""
     try:
         lesson = get_object_or_404(Lesson, id=lesson_id)
-        course = lesson.section.course
+        course = lesson.section.module.course
         
         # Check if user is enrolled
         enrollment = get_object_or_404(Enrollment, user=request.user, course=course, status='active')
         
-        # Mark lesson as complete
-        progress = enrollment.progress.get(lesson=lesson)
-        progress.completed = True
-        progress.completed_at = timezone.now()
-        progress.save()
-        
-        # Check if all lessons are completed
-        total_lessons = course.sections.aggregate(
-            total=models.Count('lessons')
-        )['total']
-        
-        completed_lessons = enrollment.progress.filter(
-            completed=True
-        ).count()
+        # Mark lesson as complete, creating its progress row on first interaction
+        Progress.objects.update_or_create(
+            enrollment=enrollment,
+            lesson=lesson,
+            defaults={'completed': True, 'completed_at': timezone.now()}
+        )
         
-        # Update enrollment progress percentage
-        enrollment.progress_percentage = (completed_lessons / total_lessons) * 100
+        # Update the completion counters and progress percentage
+        completion.mark_completed(enrollment, completion.mask([lesson.ordinal]))
         
         # If all lessons are completed, mark the course as completed
-        if completed_lessons == total_lessons:
+        if enrollment.total_lessons and enrollment.completed_lessons >= enrollment.total_lessons:
             enrollment.status = 'completed'
             enrollment.completed_at = timezone.now()
         
@@ -251,20 +204,13 @@ def get_course_progress(request, course_id):
             status='active'
         )
         
-        # Calculate progress for each section
-        section_progress = {}
-        for section in course.sections.all():
-            total_lessons = section.lessons.count()
-            if total_lessons == 0:
-                section_progress[section.id] = 0
-                continue
-            
-            completed_lessons = enrollment.progress.filter(
-                lesson__section=section,
-                completed=True
-            ).count()
-            
-            section_progress[section.id] = (completed_lessons / total_lessons) * 100
+        # Calculate progress for each section from the completion bitmap
+        course_lessons = completion.CourseLessons.for_course(course.id)
+        bits = completion.to_bits(enrollment.completion_bitmap)
+        section_progress = {
+            section_id: course_lessons.section_percentage(bits, section_id)
+            for section_id in Section.objects.filter(module__course=course).values_list('id', flat=True)
+        }
         
         return Response({
             'overall_progress': enrollment.progress_percentage,
@@ -335,29 +281,19 @@ class CourseProgressView(LoginRequiredMixin, DetailView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        enrollment = self.get_object()
+        enrollment = self.object
         course = enrollment.course
         
         context['course'] = course
-        context['modules'] = course.sections.all()
-        
-        # Calculate progress for each section
-        section_progress = {}
-        for section in Section.objects.filter(module__course=course):
-            total_lessons = Lesson.objects.filter(section=section).count()
-            if total_lessons == 0:
-                section_progress[section.id] = 0
-                continue
-                
-            completed_lessons = Progress.objects.filter(
-                enrollment=enrollment,
-                lesson__section=section,
-                completed=True
-            ).count()
-            
-            section_progress[section.id] = (completed_lessons / total_lessons) * 100
-            
-        context['section_progress'] = section_progress
+        context['modules'] = course.modules.all()
+        
+        # Progress of each section from the completion bitmap and the section masks
+        lessons = completion.CourseLessons.for_course(course.id)
+        bits = completion.to_bits(enrollment.completion_bitmap)
+        context['section_progress'] = {
+            section_id: lessons.section_percentage(bits, section_id)
+            for section_id in Section.objects.filter(module__course=course).values_list('id', flat=True)
+        }
         return context
 
 class CourseCompletionView(LoginRequiredMixin, DetailView):
@@ -377,11 +313,8 @@ class CourseCompletionView(LoginRequiredMixin, DetailView):
         enrollment = get_object_or_404(Enrollment, user=user, course=course)
         context['enrollment'] = enrollment
         
-        # Suggest related courses
-        context['related_courses'] = Course.objects.filter(
-            category=course.category,
-            is_published=True
-        ).exclude(id=course.id)[:3]
+        # Suggest courses its students also took, or others from the category
+        context['related_courses'] = get_related_courses(course, limit=3)
         
         return context
 
@@ -450,15 +383,10 @@ class EnrollmentDetailView(LoginRequiredMixin, DetailView):
         enrollment = self.get_object()
         context['course'] = enrollment.course
         # Get progress data
-        total_lessons = Lesson.objects.filter(section__module__course=enrollment.course).count()
-        completed_lessons = Progress.objects.filter(
-            enrollment=enrollment, 
-            completed=True
-        ).count()
         context['progress'] = {
-            'completed_lessons': completed_lessons,
-            'total_lessons': total_lessons,
-            'percentage': (completed_lessons / total_lessons * 100) if total_lessons > 0 else 0
+            'completed_lessons': enrollment.completed_lessons,
+            'total_lessons': enrollment.total_lessons,
+            'percentage': enrollment.progress_percentage
         }
         return context
 
@@ -482,31 +410,17 @@ class EnrollmentCreateView(LoginRequiredMixin, DetailView):
     def post(self, request, *args, **kwargs):
         course = self.get_object()
         
-        # Check if already enrolled
-        existing_enrollment = Enrollment.objects.filter(
-            user=request.user,
-            course=course
-        ).first()
-        
-        if existing_enrollment:
-            if existing_enrollment.status == 'dropped':
-                # Reactivate enrollment
-                existing_enrollment.status = 'active'
-                existing_enrollment.save()
-                messages.success(request, f"Your enrollment in {course.title} has been reactivated.")
-            else:
-                messages.info(request, f"You are already enrolled in {course.title}.")
-            return redirect('enrollments:enrollment_detail', pk=existing_enrollment.pk)
-        
-        # Create new enrollment
-        enrollment = Enrollment.objects.create(
-            user=request.user,
-            course=course,
-            status='active',
-            enrolled_at=timezone.now()
-        )
-        
-        messages.success(request, f"You have successfully enrolled in {course.title}.")
+        # Takes a seat, or joins the waitlist if the course is full
+        enrollment, outcome = course_seats.enroll(request.user, course)
+        if outcome == 'waitlisted':
+            position = course_seats.waitlist_position(enrollment)
+            messages.info(request, f"{course.title} is full. You are number {position} on the waitlist.")
+        elif outcome == 'reactivated':
+            messages.success(request, f"Your enrollment in {course.title} has been reactivated.")
+        elif outcome == 'already_enrolled':
+            messages.info(request, f"You are already enrolled in {course.title}.")
+        else:
+            messages.success(request, f"You have successfully enrolled in {course.title}.")
         return redirect('enrollments:enrollment_detail', pk=enrollment.pk)
 
 class EnrollmentCancelView(LoginRequiredMixin, DetailView):
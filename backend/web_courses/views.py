@@ -3,6 +3,7 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.core.exceptions import ObjectDoesNotExist
 from courses.models import Course
+from courses import seats as course_seats
 from enrollments.models import Enrollment
 from django.conf import settings
 import logging
@@ -99,28 +100,23 @@ def enroll_course(request, course_id):
     try:
         course = get_object_or_404(Course, id=course_id)
         
-        # Check if already enrolled
-        existing_enrollment = Enrollment.objects.filter(
-            user=request.user,
-            course=course
-        ).first()
+        # Takes a seat if the course is capped, or joins the waitlist once it is full
+        enrollment, outcome = course_seats.enroll(request.user, course)
         
-        if existing_enrollment:
-            if existing_enrollment.status == 'active':
+        if outcome == 'already_enrolled':
+            if enrollment.status == 'active':
                 messages.info(request, "You are already enrolled in this course.")
-            elif existing_enrollment.status == 'dropped':
-                existing_enrollment.status = 'active'
-                existing_enrollment.save()
-                messages.success(request, "Successfully re-enrolled in the course.")
+            elif enrollment.status == 'waitlisted':
+                position = course_seats.waitlist_position(enrollment)
+                messages.info(request, f"You are already number {position} on the waitlist for this course.")
             else:
                 messages.error(request, "Unable to enroll in this course.")
+        elif outcome == 'waitlisted':
+            position = course_seats.waitlist_position(enrollment)
+            messages.info(request, f"This course is full. You are number {position} on the waitlist.")
+        elif outcome == 'reactivated':
+            messages.success(request, "Successfully re-enrolled in the course.")
         else:
-            # Create new enrollment
-            Enrollment.objects.create(
-                user=request.user,
-                course=course,
-                status='active'
-            )
             messages.success(request, "Successfully enrolled in the course.")
             
         return redirect('web_courses:course_detail', course_id=course_id)
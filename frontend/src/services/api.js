@@ -780,7 +780,7 @@ export const courseAPI = {
       
       console.log('Request URL:', url);
       
-      const response = await api.get(url);
+      let response = await api.get(url);
       console.log('All courses response:', response);
       
       let courses = [];
@@ -791,6 +791,11 @@ export const courseAPI = {
         courses = response.courses;
       } else if (response?.results) {
         courses = response.results;
+        // The catalog comes in cursor pages; follow them to the end
+        while (response.next) {
+          response = await api.get(response.next);
+          courses = courses.concat(response?.results || []);
+        }
       }
       
       // Process image URLs
@@ -1343,9 +1348,16 @@ export const courseAPI = {
       const requestUrl = `courses/${courseId}/create-payment/`;
       console.log("Payment order request URL:", requestUrl);
       
-      const response = await api.post(requestUrl);
+      let response = await api.post(requestUrl);
       
-      if (!response || !response.data) {
+      // The order is created in the background; poll until it exists
+      const statusUrl = `courses/${courseId}/payment-orders/${response?.data?.job_id}/`;
+      for (let attempt = 0; response?.status === 202 && attempt < 60; attempt++) {
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+        response = await api.get(statusUrl);
+      }
+      
+      if (!response || !response.data || !response.data.id) {
         throw new Error("Invalid response from payment order API");
       }
       